@@ -12,6 +12,9 @@
 """conftest"""
 
 import os
+import re
+import json
+import logging
 import uuid
 import shutil
 import tempfile
@@ -19,14 +22,63 @@ import time
 from subprocess import run
 import pytest
 from virt.microvm import MicroVM
+from virt.warm_pool import WarmPool
+from virt import fleet
 from monitor.monitor_thread import MonitorThread
 from utils.config import CONFIG
+from utils.artifacts import ArtifactCache
+from utils.utils_qmp import QMP_LATENCY
+from utils.utils_stats import LatencyRecorder
+from utils.utils_wait import VM_LIFECYCLE
+from utils.utils_perf import write_results
+from utils.session import CONSOLE_WAIT
+from utils.serial_capture import SerialCapture
+from utils.console_ring import CONSOLE_RINGS
 
 TIMESTAMP = time.strftime('%Y%m%d_%H%M%S', time.localtime(time.time()))
 SESSION_PATH = os.path.join(CONFIG.test_dir, TIMESTAMP)
+if CONFIG.worker_count > 1:
+    SESSION_PATH += "_gw%d" % CONFIG.worker_index
 CONFIG.test_session_root_path = SESSION_PATH
 if not os.path.exists(CONFIG.test_session_root_path):
     os.makedirs(CONFIG.test_session_root_path)
+QMP_LATENCY_FILE = os.path.join(SESSION_PATH, "qmp_latency.json")
+QMP_LATENCY_SUMMARY = {"tests": dict(), "session": dict()}
+QMP_LATENCY_SESSION = dict()
+VM_LIFECYCLE_FILE = os.path.join(SESSION_PATH, "vm_lifecycle.json")
+WARM_POOL_FILE = os.path.join(SESSION_PATH, "warm_pool.json")
+CONSOLE_WAIT_FILE = os.path.join(SESSION_PATH, "console_wait.json")
+FAILURES_PATH = os.path.join(SESSION_PATH, "failures")
+
+
+def _dump_qmp_latency():
+    """Write qmp latency summaries to the session directory"""
+    QMP_LATENCY_SUMMARY["session"] = {
+        cmd: histogram.summary() for cmd, histogram in
+        sorted(LatencyRecorder.merge_by_operation(QMP_LATENCY_SESSION).items())}
+    with open(QMP_LATENCY_FILE, "w") as latency_file:
+        json.dump(QMP_LATENCY_SUMMARY, latency_file, indent=2)
+
+
+def _dump_vm_lifecycle():
+    """Write time to ready and time to exit of vms to the session directory"""
+    histograms = VM_LIFECYCLE.reset()
+    summary = {"vms": VM_LIFECYCLE.summary(histograms),
+               "session": {stage: histogram.summary() for stage, histogram in
+                           sorted(LatencyRecorder.merge_by_operation(histograms).items())}}
+    with open(VM_LIFECYCLE_FILE, "w") as lifecycle_file:
+        json.dump(summary, lifecycle_file, indent=2)
+
+
+def _dump_console_wait():
+    """Write the time calls waited for the serial console to the session directory"""
+    histograms = CONSOLE_WAIT.reset()
+    summary = {"vms": CONSOLE_WAIT.summary(histograms),
+               "session": {func: histogram.summary() for func, histogram in
+                           sorted(LatencyRecorder.merge_by_operation(histograms).items())}}
+    with open(CONSOLE_WAIT_FILE, "w") as wait_file:
+        json.dump(summary, wait_file, indent=2)
+
 
 @pytest.fixture(autouse=True, scope='session')
 def test_session_root_path():
@@ -36,21 +88,68 @@ def test_session_root_path():
     delete_test_session = CONFIG.delete_test_session
     monitor_thread = MonitorThread()
     monitor_thread.start()
-    if "stratovirt" in CONFIG.vmtype:
+    # vms write their own rootfs clone, unless ROOTFS_COW is disabled.
+    # Parallel workers share the rootfs, none of them owns its backup.
+    backup_rootfs = "stratovirt" in CONFIG.vmtype and not CONFIG.rootfs_cow \
+        and os.path.exists(CONFIG.stratovirt_rootfs) and CONFIG.worker_count == 1
+    if backup_rootfs:
         _cmd = "cp %s %s.bak" % (CONFIG.stratovirt_rootfs, CONFIG.stratovirt_rootfs)
         run(_cmd, shell=True, check=True)
 
     yield CONFIG.test_session_root_path
 
-    if "stratovirt" in CONFIG.vmtype:
+    if backup_rootfs:
         _cmd = "cp %s.bak %s" % (CONFIG.stratovirt_rootfs, CONFIG.stratovirt_rootfs)
         run(_cmd, shell=True, check=True)
+    _dump_qmp_latency()
+    _dump_vm_lifecycle()
+    _dump_console_wait()
+    SerialCapture.close_all()
     monitor_thread.stop()
     monitor_thread.join()
     if delete_test_session and created_test_session_root_path:
         shutil.rmtree(CONFIG.test_session_root_path)
 
 
+@pytest.fixture(autouse=True)
+def qmp_latency(request):
+    """Record the qmp command latency of each test, per vm and command"""
+    QMP_LATENCY.reset()
+    yield
+    histograms = QMP_LATENCY.reset()
+    if not histograms:
+        return
+    QMP_LATENCY_SUMMARY["tests"][request.node.nodeid] = QMP_LATENCY.summary(histograms)
+    for key, histogram in histograms.items():
+        if key not in QMP_LATENCY_SESSION:
+            QMP_LATENCY_SESSION[key] = histogram
+        else:
+            QMP_LATENCY_SESSION[key].merge(histogram)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    """Keep the report of each phase on the test item, for console_ring_dump"""
+    # pylint: disable=unused-argument
+    outcome = yield
+    report = outcome.get_result()
+    setattr(item, "rep_" + report.when, report)
+
+
+@pytest.fixture(autouse=True)
+def console_ring_dump(request):
+    """Dump the console history of the vms of a failed test to the failures directory"""
+    begin = time.time()
+    yield
+    failed = any(getattr(request.node, "rep_" + when, None) is not None and
+                 getattr(request.node, "rep_" + when).failed for when in ("setup", "call"))
+    if failed:
+        case = re.sub(r"[^\w.-]+", "_", request.node.nodeid)
+        paths = CONSOLE_RINGS.dump(os.path.join(FAILURES_PATH, case), begin)
+        logging.debug("console history of %s: %s", request.node.nodeid, paths)
+    CONSOLE_RINGS.prune()
+
+
 @pytest.fixture
 def test_session_tmp_path(test_session_root_path):
     """Generate a temporary directory on Setup. Remove on teardown."""
@@ -82,45 +181,29 @@ def init_microvm_with_json(root_path, vm_config_json, vmtag):
     return testvm
 
 
-def _gcc_compile(src_file, output_file):
-    """Build a source file with gcc."""
-    compile_cmd = 'gcc {} -o {} -O3'.format(
-        src_file,
-        output_file
-    )
-    run(
-        compile_cmd,
-        shell=True,
-        check=True
-    )
+@pytest.fixture(scope='session')
+def artifact_cache():
+    """Build all helper tools in parallel, on first use in a session"""
+    cache = ArtifactCache()
+    cache.prebuild()
+    yield cache
+    cache.stop()
 
 
 @pytest.fixture()
-def nc_vsock_path(test_session_root_path):
-    """Wget nc-vsock.c and build a nc-vsock app."""
+def nc_vsock_path(artifact_cache):
+    """Get a built nc-vsock app."""
     # pylint: disable=redefined-outer-name
     # The pytest.fixture triggers a pylint rule.
-    path = os.path.realpath(os.path.dirname(__file__))
-    nc_path = "{}/{}".format(
-        path,
-        "nc-vsock.c"
-    )
-    if not os.path.exists(nc_path):
-        run(
-            "wget https://gitee.com/EulerRobot/nc-vsock/raw/master/nc-vsock.c -O %s"
-            % nc_path,
-            shell=True,
-            check=True
-        )
-    nc_vsock_bin_path = os.path.join(
-        test_session_root_path,
-        'nc-vsock'
-    )
-    _gcc_compile(
-        'nc-vsock.c',
-        nc_vsock_bin_path
-    )
-    yield nc_vsock_bin_path
+    yield artifact_cache.get("nc-vsock")
+
+
+@pytest.fixture()
+def psyscall_path(artifact_cache):
+    """Get a built psyscall app."""
+    # pylint: disable=redefined-outer-name
+    # The pytest.fixture triggers a pylint rule.
+    yield artifact_cache.get("psyscall")
 
 
 @pytest.fixture()
@@ -133,6 +216,43 @@ def microvm(test_session_root_path):
     testvm.kill()
 
 
+@pytest.fixture(scope='session')
+def warm_pool(test_session_root_path):
+    """Launch microvms in background for the launched_* fixtures"""
+    # pylint: disable=redefined-outer-name
+    # The pytest.fixture triggers a pylint rule.
+    pool = WarmPool(test_session_root_path)
+    pool.start()
+    yield pool
+    pool.stop()
+    report = pool.report()
+    logging.info("warm pool: %d hits, %d misses, %d failures, %.1fs of launch saved",
+                 report["hits"], report["misses"], report["failures"],
+                 report["saved_seconds"])
+    with open(WARM_POOL_FILE, "w") as pool_file:
+        json.dump(report, pool_file, indent=2)
+
+
+@pytest.fixture()
+def launched_microvm(warm_pool):
+    """Get a launched microvm, as microvm after launch()"""
+    # pylint: disable=redefined-outer-name
+    # The pytest.fixture triggers a pylint rule.
+    testvm = warm_pool.acquire("rootfs")
+    yield testvm
+    warm_pool.release(testvm)
+
+
+@pytest.fixture()
+def launched_microvm_with_initrd(warm_pool):
+    """Get a launched microvm booted from initrd"""
+    # pylint: disable=redefined-outer-name
+    # The pytest.fixture triggers a pylint rule.
+    testvm = warm_pool.acquire("initrd")
+    yield testvm
+    warm_pool.release(testvm)
+
+
 @pytest.fixture()
 def microvm_with_tcp(test_session_root_path):
     """Init a microvm"""
@@ -144,8 +264,8 @@ def microvm_with_tcp(test_session_root_path):
 
 
 @pytest.fixture()
-def microvms(test_session_root_path):
-    """Init multi microvms"""
+def microvms(request, test_session_root_path):
+    """Init multi microvms, stopped together on teardown"""
     # pylint: disable=redefined-outer-name
     # The pytest.fixture triggers a pylint rule.
     micro_vms = []
@@ -156,8 +276,8 @@ def microvms(test_session_root_path):
         micro_vms.append(tempvm)
 
     yield micro_vms
-    for tempvm in micro_vms:
-        tempvm.kill()
+    report = fleet.teardown(micro_vms)
+    write_results("teardown", request.node.nodeid, report)
 
 
 @pytest.fixture()
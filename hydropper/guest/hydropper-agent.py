@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""
+hydropper guest agent
+
+Serve hydropper requests over vsock: run commands, read, write and stat
+files. Every message is a 4 bytes big endian length followed by a json
+object. Binary data is base64 encoded. See utils/guest_agent.py for the
+host side.
+"""
+
+import os
+import sys
+import json
+import stat
+import time
+import base64
+import socket
+import struct
+import argparse
+import selectors
+import threading
+import subprocess
+
+VERSION = 1
+DEFAULT_PORT = 10250
+VMADDR_CID_ANY = 0xffffffff
+HEADER = struct.Struct(">I")
+MAX_FRAME = 64 * 1024 * 1024
+CHUNK = 64 * 1024
+
+
+def recv_exact(sock, size):
+    """Read size bytes, None if the peer closed first"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data.extend(chunk)
+    return bytes(data)
+
+
+def recv_frame(sock):
+    """Read one message, None if the peer closed"""
+    header = recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    size = HEADER.unpack(header)[0]
+    if size > MAX_FRAME:
+        raise ValueError("frame of %d bytes is too large" % size)
+    body = recv_exact(sock, size)
+    if body is None:
+        return None
+    return json.loads(body.decode("utf-8"))
+
+
+def send_frame(sock, msg):
+    """Write one message"""
+    body = json.dumps(msg).encode("utf-8")
+    sock.sendall(HEADER.pack(len(body)) + body)
+
+
+def _encode(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def do_exec(sock, req):
+    """
+    Run cmd in a shell, stream its stdout and stderr, then its status.
+    The command is killed at its timeout, even once its streams are
+    closed, or if the stream can not be sent.
+    """
+    proc = subprocess.Popen(req["cmd"], shell=True, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    streams = {proc.stdout.fileno(): "stdout", proc.stderr.fileno(): "stderr"}
+    deadline = None if req.get("timeout") is None else time.monotonic() + req["timeout"]
+    timed_out = False
+    try:
+        with selectors.DefaultSelector() as selector:
+            for fileno in streams:
+                selector.register(fileno, selectors.EVENT_READ)
+            while selector.get_map():
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                events = selector.select(remaining)
+                if not events:
+                    proc.kill()
+                    timed_out = True
+                    break
+                for key, _ in events:
+                    data = os.read(key.fd, CHUNK)
+                    if not data:
+                        selector.unregister(key.fd)
+                        continue
+                    send_frame(sock, {"id": req["id"], "stream": streams[key.fd],
+                                      "data": _encode(data)})
+        remaining = None if deadline is None else max(0, deadline - time.monotonic())
+        try:
+            status = proc.wait(remaining)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            timed_out = True
+            status = proc.wait()
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+    return {"status": status, "timeout": timed_out}
+
+
+def do_read(_, req):
+    """Read a file, such as a sysfs or procfs one"""
+    with open(req["path"], "rb") as fobj:
+        return {"data": _encode(fobj.read())}
+
+
+def do_write(_, req):
+    """Write or append data to a file"""
+    data = base64.b64decode(req["data"])
+    with open(req["path"], "ab" if req.get("append") else "wb") as fobj:
+        fobj.write(data)
+    if req.get("mode") is not None:
+        os.chmod(req["path"], req["mode"])
+    return {"size": len(data)}
+
+
+def do_stat(_, req):
+    """Stat a path, without following a symlink"""
+    info = os.lstat(req["path"])
+    kinds = ((stat.S_ISREG, "file"), (stat.S_ISDIR, "dir"), (stat.S_ISLNK, "link"),
+             (stat.S_ISCHR, "char"), (stat.S_ISBLK, "block"), (stat.S_ISFIFO, "fifo"),
+             (stat.S_ISSOCK, "socket"))
+    kind = next((name for test, name in kinds if test(info.st_mode)), "unknown")
+    return {"stat": {"type": kind, "mode": stat.S_IMODE(info.st_mode), "size": info.st_size,
+                     "uid": info.st_uid, "gid": info.st_gid, "mtime": info.st_mtime}}
+
+
+def do_ping(_, __):
+    """Tell the agent is alive"""
+    return {"version": VERSION}
+
+
+HANDLERS = {"exec": do_exec, "read": do_read, "write": do_write, "stat": do_stat,
+            "ping": do_ping}
+
+
+def serve(sock):
+    """Answer the requests of one connection, one after another"""
+    with sock:
+        while True:
+            try:
+                req = recv_frame(sock)
+            except (OSError, ValueError):
+                return
+            if req is None:
+                return
+            handler = HANDLERS.get(req.get("op"))
+            try:
+                if handler is None:
+                    raise ValueError("unknown op %r" % req.get("op"))
+                resp = handler(sock, req)
+            except OSError as err:
+                resp = {"error": str(err), "errno": err.errno}
+            # any failure is answered, the agent keeps serving
+            # pylint: disable=broad-except
+            except Exception as err:
+                resp = {"error": "%s: %s" % (type(err).__name__, err)}
+            resp["id"] = req.get("id")
+            try:
+                send_frame(sock, resp)
+            except OSError:
+                return
+
+
+def main():
+    """Listen on the vsock port, or on a unix socket to test the agent on the host"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="vsock port")
+    parser.add_argument("--unix", help="listen on this unix socket instead of vsock")
+    args = parser.parse_args()
+    if args.unix:
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(args.unix)
+    else:
+        listener = socket.socket(socket.AF_VSOCK, socket.SOCK_STREAM)
+        listener.bind((VMADDR_CID_ANY, args.port))
+    listener.listen(16)
+    while True:
+        conn, _ = listener.accept()
+        threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+#!/bin/sh
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+#
+# Tell hydropper the guest has booted: connect to the host (cid 2) over
+# vsock, on the port given by hydropper.ready_port in the kernel cmdline.
+
+port=$(sed -n 's/.*hydropper\.ready_port=\([0-9]*\).*/\1/p' /proc/cmdline)
+[ -n "$port" ] || exit 0
+
+if command -v socat >/dev/null 2>&1; then
+    echo ready | socat - VSOCK-CONNECT:2:"$port"
+else
+    echo ready | nc-vsock 2 "$port"
+fi
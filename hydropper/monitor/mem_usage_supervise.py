@@ -56,12 +56,14 @@ class MemorySupervisor(monitor_info.MonitorInfo):
             self.supervise()
             time.sleep(self.monitor_cycle)
 
-    def supervise(self):
+    def get_memory_usage(self):
         """
-        Check memory usage exceeded or not(overwrite to the monitorinfo)
+        Get the memory used by the vmm itself, guest memory regions excluded
+
+        Returns:
+            Resident KiB, None if the process can not be read
         """
         pmap_cmd = "pmap -xq {}".format(self._pid)
-        mem_total = 0
         try:
             pmap_out = run(
                 pmap_cmd, 
@@ -70,7 +72,7 @@ class MemorySupervisor(monitor_info.MonitorInfo):
                 stdout=PIPE
             ).stdout.decode('utf-8').split("\n")
         except CalledProcessError:
-            return False
+            return None
         # delte useless lines which doesn't contain memory related information
         pmap_out = pmap_out[1:-1]
         pmap_out_delta = []
@@ -80,7 +82,15 @@ class MemorySupervisor(monitor_info.MonitorInfo):
                 # this is the guest's memory region
                 continue
             pmap_out_delta.append(pmap_out_i)
-        mem_total = sum(int(pmap_out_delta[i][2]) for i in range(len(pmap_out_delta)))
+        return sum(int(pmap_out_delta[i][2]) for i in range(len(pmap_out_delta)))
+
+    def supervise(self):
+        """
+        Check memory usage exceeded or not(overwrite to the monitorinfo)
+        """
+        mem_total = self.get_memory_usage()
+        if mem_total is None:
+            return False
 
         if self.isDotter:
             logging.debug("mem_total:%s" % mem_total)
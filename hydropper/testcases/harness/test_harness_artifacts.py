@@ -0,0 +1,62 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test the helper tool cache"""
+
+import os
+from subprocess import run
+from utils.artifacts import Artifact
+from utils.artifacts import ArtifactCache
+
+
+def _count(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r") as count_file:
+        return len(count_file.read().splitlines())
+
+
+def test_harness_artifact_cache(test_session_tmp_path):
+    """
+    Test building tools once:
+
+    1) Prebuild two tools in parallel, comfirm they run.
+    2) Get them from a new cache on the same directory, comfirm nothing
+    is fetched or built again.
+    3) Change the build command, comfirm only the build runs again.
+    """
+    root = os.path.join(test_session_tmp_path, "cache")
+    fetches = os.path.join(test_session_tmp_path, "fetches")
+    builds = os.path.join(test_session_tmp_path, "builds")
+
+    def _artifacts(build_flags=""):
+        return {name: Artifact(name,
+                               fetch="echo %s >> %s && printf '#!/bin/sh\\necho %s' > {src}/tool.sh"
+                               % (name, fetches, name),
+                               build="echo %s >> %s && cp tool.sh {out} && chmod +x {out}%s"
+                               % (name, builds, build_flags))
+                for name in ("tool_a", "tool_b")}
+
+    cache = ArtifactCache(root, _artifacts())
+    cache.prebuild()
+    paths = {name: cache.get(name) for name in ("tool_a", "tool_b")}
+    cache.stop()
+    for name, path in paths.items():
+        assert run(path, check=True, capture_output=True).stdout.decode().strip() == name
+    assert (_count(fetches), _count(builds)) == (2, 2)
+
+    cache = ArtifactCache(root, _artifacts())
+    assert cache.get("tool_a") == paths["tool_a"]
+    assert (_count(fetches), _count(builds)) == (2, 2)
+
+    cache = ArtifactCache(root, _artifacts(" && true"))
+    assert cache.get("tool_a") != paths["tool_a"]
+    assert (_count(fetches), _count(builds)) == (2, 3)
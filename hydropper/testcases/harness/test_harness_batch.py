@@ -0,0 +1,63 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test running guest commands in batches"""
+
+import subprocess
+import pytest
+from utils import utils_batch
+from utils.exception import BatchError
+
+
+def _shell(scripts):
+    """Run a script in a local shell like a session, echoing it first"""
+    def _run(script):
+        scripts.append(script)
+        result = subprocess.run(["sh", "-c", script], stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, check=False)
+        return script + "\n" + result.stdout.decode()
+    return _run
+
+
+def test_harness_batch():
+    """
+    Test running a batch of commands in a shell:
+
+    1) Comfirm every command gets its own status and output, with or
+    without a trailing newline, and the echo of the script is ignored.
+    2) Comfirm a command does not change the shell of the next ones.
+    3) Comfirm a long batch is split in scripts below MAX_SCRIPT_LEN.
+    4) Comfirm BatchError is raised if the output is cut.
+    """
+    scripts = list()
+    cmds = ["echo one; echo two", "printf abc", "false", "exit 3",
+            "cd /; echo err >&2", "pwd", "true"]
+    results = utils_batch.run_batch(_shell(scripts), cmds)
+    assert len(scripts) == 1
+    assert results[0] == (0, "one\ntwo\n")
+    assert results[1] == (0, "abc")
+    assert results[2] == (1, "")
+    assert results[3] == (3, "")
+    assert results[4] == (0, "err\n")
+    assert results[5][1] != "/\n"
+    assert results[6] == (0, "")
+
+    scripts = list()
+    cmds = ["echo %d" % index for index in range(100)]
+    results = utils_batch.run_batch(_shell(scripts), cmds)
+    assert len(scripts) > 1
+    assert all(len(script) <= utils_batch.MAX_SCRIPT_LEN for script in scripts)
+    assert results == [(0, "%d\n" % index) for index in range(100)]
+
+    with pytest.raises(BatchError):
+        utils_batch.run_batch(lambda script: _shell([])(script)[:-20], ["echo one", "echo two"])
+    with pytest.raises(ValueError):
+        utils_batch.run_batch(_shell([]), ["echo one\necho two"])
@@ -0,0 +1,102 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test sharing a console between threads"""
+
+import threading
+import time
+import pytest
+from utils.exception import ConsoleBusyError
+from utils.session import CONSOLE_WAIT
+from utils.session import ConsoleManager
+
+
+class FakeConsole():
+    """A console running one command at a time, like a serial shell"""
+
+    status_test_command = "echo $?"
+
+    def __init__(self):
+        self.running = 0
+        self.overlaps = 0
+        self.commands = list()
+
+    def cmd_status_output(self, cmd, delay=0.01):
+        """Run cmd, it fails if another command is running"""
+        self.running += 1
+        if self.running > 1:
+            self.overlaps += 1
+        time.sleep(delay)
+        self.commands.append(cmd)
+        self.running -= 1
+        return 0, cmd
+
+
+def test_harness_console_queue():
+    """
+    Test threads sharing one console:
+
+    1) Comfirm calls of many threads all run, one at a time.
+    2) Comfirm the calls are served in the order they are made.
+    3) Comfirm ConsoleBusyError is raised when the wait exceeds the timeout.
+    4) Comfirm the wait of every call is recorded.
+    """
+    console = FakeConsole()
+    manager = ConsoleManager("fake", queue_timeout=10)
+    manager.config_console(console)
+    CONSOLE_WAIT.reset()
+
+    threads = [threading.Thread(target=manager.get_func,
+                                args=("cmd_status_output", "cmd%d" % index))
+               for index in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert console.overlaps == 0
+    assert sorted(console.commands) == sorted("cmd%d" % index for index in range(16))
+
+    # queue callers one by one behind a long command
+    console.commands = list()
+    blocker = threading.Thread(target=manager.get_func,
+                               args=("cmd_status_output", "blocker"), kwargs={"delay": 0.3})
+    blocker.start()
+    while not manager.console_lock.locked():
+        time.sleep(0.001)
+    waiters = list()
+    for index in range(8):
+        waiter = threading.Thread(target=manager.get_func,
+                                  args=("cmd_status_output", "cmd%d" % index))
+        waiter.start()
+        waiters.append(waiter)
+        while manager.console_lock.waiting() < index + 1:
+            time.sleep(0.001)
+    blocker.join()
+    for waiter in waiters:
+        waiter.join()
+    assert console.commands == ["blocker"] + ["cmd%d" % index for index in range(8)]
+
+    manager.queue_timeout = 0.05
+    blocker = threading.Thread(target=manager.get_func,
+                               args=("cmd_status_output", "blocker"), kwargs={"delay": 0.3})
+    blocker.start()
+    while not manager.console_lock.locked():
+        time.sleep(0.001)
+    with pytest.raises(ConsoleBusyError):
+        manager.get_func("cmd_status_output", "late")
+    blocker.join()
+    assert manager.console_lock.waiting() == 0
+    assert "late" not in console.commands
+
+    summary = CONSOLE_WAIT.summary(CONSOLE_WAIT.reset())["fake"]["cmd_status_output"]
+    assert summary["count"] == 16 + 9 + 2
+    assert summary["errors"] == 1
+    assert summary["max"] >= 0.05
@@ -0,0 +1,131 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test the console engines against a fake serial console"""
+
+import os
+import sys
+import time
+import uuid
+import logging
+import shutil
+import pytest
+import aexpect
+from aexpect.exceptions import ShellTimeoutError
+from aexpect.exceptions import ShellProcessTerminatedError
+from utils.config import CONFIG
+from utils.console import NativeConsole
+from utils.console_server import FakeConsoleServer
+from utils.utils_perf import write_results
+from utils.utils_stats import sample_summary
+
+PROMPT = r"[\#\$]"
+BENCH_COMMANDS = 50
+# stands in for "nc -U" where nc is not installed
+BRIDGE = """import os, sys, socket, select
+sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+sock.connect(sys.argv[1])
+while True:
+    ready = select.select([0, sock], [], [])[0]
+    data = os.read(0, 4096) if 0 in ready else sock.recv(4096)
+    if not data:
+        break
+    if 0 in ready:
+        sock.sendall(data)
+    else:
+        os.write(1, data)
+"""
+
+
+def _sock_path(name):
+    return os.path.join(CONFIG.test_session_root_path, "%s_%s.sock" % (name, uuid.uuid4().hex[:8]))
+
+
+def _aexpect_console(address):
+    """The aexpect engine, a shell session over a unix socket client"""
+    if shutil.which("nc"):
+        command = "nc -U %s" % address
+    else:
+        bridge = os.path.join(CONFIG.test_session_root_path, "console_bridge.py")
+        with open(bridge, "w") as bridge_file:
+            bridge_file.write(BRIDGE)
+        command = "%s -u %s %s" % (sys.executable, bridge, address)
+    return aexpect.ShellSession(command, auto_close=False, prompt=PROMPT,
+                                status_test_command="echo $?")
+
+
+def test_harness_native_console():
+    """
+    Test the native console engine:
+
+    1) Comfirm cmd_output and cmd_status_output strip the echo and the
+    prompt, and return the status of the command.
+    2) Comfirm output sent byte by byte, with "\\r\\n" and utf-8
+    characters split, is read whole and logged by line.
+    3) Comfirm a prompt sent byte by byte is read whole, and output
+    ending with "$" before a pause does not end the command.
+    4) Comfirm ShellTimeoutError is raised when the prompt is late, and
+    ShellProcessTerminatedError when the vm closes the console.
+    """
+    lines = list()
+    with FakeConsoleServer(_sock_path("console")) as fake:
+        console = NativeConsole(fake.address, prompt=PROMPT, output_func=lines.append)
+        try:
+            assert console.cmd_output("echo hello") == "hello\n"
+            assert console.cmd_status_output("echo one; echo two; exit 3") == (3, "one\ntwo\n")
+            assert console.cmd_status("true") == 0
+            fake.trickle = True
+            assert console.cmd_output("printf 'caf\\303\\251\\nend\\n'") == "café\nend\n"
+            assert console.cmd_output("echo next") == "next\n"
+            fake.trickle = False
+            assert "café" in lines and "end" in lines
+            assert console.cmd_output("printf 'cost $'; sleep 0.3; echo 5") == "cost $5\n"
+            assert console.cmd_output("echo next") == "next\n"
+            with pytest.raises(ShellTimeoutError):
+                console.cmd_output("sleep 0.5", timeout=0.1)
+            # the late prompt is drained before the next command
+            time.sleep(0.5)
+            assert console.cmd_output("echo again") == "again\n"
+            fake.close_clients()
+            with pytest.raises(ShellProcessTerminatedError):
+                console.cmd_output("echo gone", timeout=2)
+            assert not console.is_alive()
+        finally:
+            console.close()
+
+
+def test_harness_console_engine_latency():
+    """
+    Compare the per command latency of the console engines:
+
+    1) Run BENCH_COMMANDS cmd_status_output by the aexpect engine, then
+    by the native one, on the same fake console.
+    2) Report the latencies to console_engine.json in the session
+    directory, and comfirm the native engine is faster at the median.
+    """
+    results = dict()
+    with FakeConsoleServer(_sock_path("console")) as fake:
+        for engine, create in (("aexpect", _aexpect_console), ("native", NativeConsole)):
+            console = create(fake.address)
+            try:
+                console.cmd_output("true")
+                latencies = list()
+                for index in range(BENCH_COMMANDS):
+                    begin = time.time()
+                    status, output = console.cmd_status_output("echo %d" % index)
+                    latencies.append(time.time() - begin)
+                    assert (status, output.strip()) == (0, str(index))
+                results[engine] = sample_summary(latencies)
+            finally:
+                console.close()
+    logging.debug("console engine latency: %s", results)
+    write_results("console_engine", "cmd_status_output", results)
+    assert results["native"]["p50"] < results["aexpect"]["p50"]
@@ -0,0 +1,66 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test the console history of vms"""
+
+import os
+import time
+from utils.console_ring import ConsoleRing
+from utils.console_ring import ConsoleRings
+from utils.console_ring import LINE_OVERHEAD
+
+
+def test_harness_console_ring(tmp_path):
+    """
+    Test the console ring of a vm:
+
+    1) Comfirm the memory used stays below the ring size, the oldest
+    lines are evicted and counted.
+    2) Comfirm the history is searched by regex and time range.
+    3) Comfirm only the rings active since a time are dumped, with
+    timestamps, and the rings of vms shut down are pruned.
+    """
+    ring = ConsoleRing("vm_a", size=100 * (10 + LINE_OVERHEAD))
+    for index in range(1000):
+        ring.append("line %05d" % index)
+    assert ring.used <= ring.size
+    assert len(ring) == 100
+    assert ring.evicted == 900
+    assert ring.history()[0][1] == "line 00900"
+
+    middle = time.time()
+    time.sleep(0.01)
+    ring.append("kernel: BUG: soft lockup")
+    ring.append("login: ")
+    assert [line for _, line in ring.history(r"BUG|panic")] == ["kernel: BUG: soft lockup"]
+    assert [line for _, line in ring.history(since=middle)] == \
+        ["kernel: BUG: soft lockup", "login: "]
+    assert all(line.startswith("line") for _, line in ring.history(until=middle))
+
+    rings = ConsoleRings()
+    idle = ConsoleRing("vm_idle")
+    idle.append("booted")
+    rings.track(ring)
+    rings.track(idle)
+    time.sleep(0.01)
+    begin = time.time()
+    ring.append("test output")
+    paths = rings.dump(str(tmp_path / "case"), begin)
+    assert [os.path.basename(path) for path in paths] == ["vm_a_console.log"]
+    with open(paths[0], "r") as dump_file:
+        lines = dump_file.read().splitlines()
+    assert lines[0] == "[hydropper: %d older lines evicted]" % ring.evicted
+    assert lines[-1].endswith(" test output")
+    assert len(lines) == len(ring) + 1
+
+    ring.stopped = True
+    rings.prune()
+    assert list(rings.rings.values()) == [idle]
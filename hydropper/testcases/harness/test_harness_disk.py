@@ -0,0 +1,45 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test cloning disk images for vms"""
+
+import os
+from utils.utils_disk import clone_image
+
+MIB = 1024 * 1024
+
+
+def test_harness_clone_image(test_session_tmp_path):
+    """
+    Test a rootfs clone:
+
+    1) Create a sparse image with data at its start, middle and end.
+    2) Clone it, comfirm the content is the same and the holes are kept.
+    3) Write the clone, comfirm the image is not changed.
+    """
+    image = os.path.join(test_session_tmp_path, "rootfs.img")
+    clone = os.path.join(test_session_tmp_path, "clone.img")
+    with open(image, "wb") as image_file:
+        for offset in (0, 32 * MIB, 64 * MIB - 4096):
+            image_file.seek(offset)
+            image_file.write(os.urandom(4096))
+
+    how = clone_image(image, clone)
+    assert how in ("reflink", "sparse")
+    with open(image, "rb") as image_file, open(clone, "rb") as clone_file:
+        assert image_file.read() == clone_file.read()
+    assert os.path.getsize(clone) == 64 * MIB
+    assert os.stat(clone).st_blocks * 512 < 16 * MIB
+
+    with open(clone, "r+b") as clone_file:
+        clone_file.write(b"\0" * 4096)
+    with open(image, "rb") as image_file:
+        assert image_file.read(4096) != b"\0" * 4096
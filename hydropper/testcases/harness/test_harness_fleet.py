@@ -0,0 +1,97 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test the concurrent teardown of a fleet of vms"""
+
+import os
+import sys
+import time
+import uuid
+import subprocess
+import pytest
+from virt import fleet
+from virt.basevm import BaseVM
+from utils.config import CONFIG
+from utils.utils_process import ProcessTracker
+from utils.exception import VMLifeError
+from utils.qmp_server import FakeQMPServer
+
+VMS = 10
+# A vm process that exits on SIGTERM, or ignores it when asked
+FAKE_VM = """import signal, sys, time
+if sys.argv[1] == "ignore":
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+print("up", flush=True)
+time.sleep(60)
+"""
+
+
+def _fake_vm(sigterm):
+    """A BaseVM running a fake process, with no monitor connected"""
+    name = "fake_%s" % uuid.uuid4().hex[:8]
+    testvm = BaseVM(CONFIG.test_session_root_path, name, str(uuid.uuid4()), "fake",
+                    config=CONFIG.get_default_microvm_vmconfig())
+    # pylint: disable=protected-access
+    testvm._popen = subprocess.Popen([sys.executable, "-c", FAKE_VM, sigterm],
+                                     stdout=subprocess.PIPE)
+    testvm._popen.stdout.readline()
+    testvm.process = ProcessTracker(testvm._popen.pid)
+    testvm._launched = True
+    return testvm
+
+
+def test_harness_fleet_teardown():
+    """
+    Test stopping vms together in a bounded time:
+
+    1) Start fake vms, half of them ignore SIGTERM.
+    2) Tear them down with 0.5s for quit and for SIGTERM.
+    3) Comfirm half stopped by SIGTERM, half by SIGKILL, none is running,
+    and the teardown took about one escalation, not one per vm.
+    """
+    vms = [_fake_vm("ignore" if index % 2 else "exit") for index in range(VMS)]
+    begin = time.time()
+    report = fleet.teardown(vms, quit_timeout=0.5, term_timeout=0.5)
+    elapsed = time.time() - begin
+    assert report["term"] == VMS // 2
+    assert report["kill"] == VMS // 2
+    assert report["seconds"]["count"] == VMS
+    assert not any(testvm.is_running() for testvm in vms)
+    assert elapsed < 3, "teardown took %.3fs" % elapsed
+
+
+def test_harness_fleet_teardown_error():
+    """Comfirm a vm failing to stop is destroyed and its error raised"""
+    testvm = _fake_vm("exit")
+
+    def _fail(*_args, **_kwargs):
+        raise VMLifeError("terminate failed")
+    testvm.terminate = _fail
+    with pytest.raises(VMLifeError, match="terminate failed"):
+        fleet.teardown([testvm], quit_timeout=0.5, term_timeout=0.5)
+    assert not testvm.is_running()
+
+
+@pytest.mark.parametrize("qmp_async", [False, True])
+def test_harness_terminate_hung_monitor(qmp_async):
+    """Comfirm a vm whose monitor never answers quit is stopped by SIGTERM in bounded time"""
+    address = os.path.join(CONFIG.test_session_root_path, "hung_%s.sock" % uuid.uuid4().hex[:8])
+    with FakeQMPServer(address) as server:
+        server.set_delay(30, "quit")
+        testvm = _fake_vm("exit")
+        testvm.mon_sock = server.address
+        testvm.qmp_async = qmp_async
+        testvm.post_launch_qmp()
+        begin = time.time()
+        assert testvm.terminate(quit_timeout=0.5, term_timeout=0.5) in ("term", "kill")
+        elapsed = time.time() - begin
+        assert not testvm.is_running()
+        assert elapsed < 2, "terminate took %.3fs" % elapsed
@@ -0,0 +1,110 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test the guest agent and its client"""
+
+import os
+import sys
+import time
+import subprocess
+import pytest
+from utils.guest_agent import GuestAgent
+from utils.exception import GuestAgentError
+
+AGENT = os.path.join(os.path.dirname(__file__), "..", "..", "guest", "hydropper-agent.py")
+
+
+@pytest.fixture
+def agent(tmp_path):
+    """Run the agent on a unix socket and connect to it"""
+    sock_path = str(tmp_path / "agent.sock")
+    proc = subprocess.Popen([sys.executable, AGENT, "--unix", sock_path])
+    client = GuestAgent(sock_path, name="harness", timeout=10)
+    try:
+        client.connect(10)
+        yield client
+    finally:
+        client.close()
+        proc.kill()
+        proc.wait()
+
+
+def _check_killed_on_send_failure(agent, tmp_path):
+    """Drop the connection while a command streams, the agent kills it"""
+    # pylint: disable=redefined-outer-name
+    pid_path = tmp_path / "exec.pid"
+    client = GuestAgent(agent.address, name="harness_drop", timeout=10)
+    client.connect(10)
+
+    def _drop(_stream, _data):
+        raise ValueError("drop the connection")
+    with pytest.raises(GuestAgentError):
+        client.execute("echo $$ > %s; exec yes" % pid_path, on_output=_drop)
+    pid = int(pid_path.read_text())
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail("command %d still runs after its connection dropped" % pid)
+
+
+def test_harness_guest_agent(agent, tmp_path):
+    """
+    Test the guest agent on the host, over a unix socket:
+
+    1) Comfirm exec returns the status, stdout and stderr of a command
+    and streams its output while it runs.
+    2) Comfirm a command is killed at its timeout, also once it closed
+    its output, and when its output can not be sent.
+    3) Comfirm files are written, read and stat, and a missing file
+    raises OSError with its errno.
+    4) Comfirm the connection still works after a failed request.
+    """
+    # pylint: disable=redefined-outer-name
+    assert agent.ping() == 1
+    status, stdout, stderr = agent.execute("echo out; echo err >&2; exit 3")
+    assert (status, stdout, stderr) == (3, b"out\n", b"err\n")
+    assert agent.cmd_status_output("cat /proc/self/status | grep -c Pid")[0] == 0
+
+    chunks = list()
+    agent.execute("echo one; sleep 0.2; echo two",
+                  on_output=lambda stream, data: chunks.append((time.time(), data)))
+    assert b"".join(data for _, data in chunks) == b"one\ntwo\n"
+    assert len(chunks) == 2 and chunks[1][0] - chunks[0][0] >= 0.1
+
+    begin = time.time()
+    status, _, _ = agent.execute("sleep 10", timeout=0.3)
+    assert status < 0
+    assert time.time() - begin < 5
+    begin = time.time()
+    status, _, _ = agent.execute("exec >/dev/null 2>&1; sleep 8", timeout=1)
+    assert status < 0
+    assert time.time() - begin < 5
+    _check_killed_on_send_failure(agent, tmp_path)
+
+    path = str(tmp_path / "file")
+    assert agent.write_file(path, b"\x00\xffdata", mode=0o640) == 6
+    assert agent.write_file(path, "more", append=True) == 4
+    assert agent.read_file(path) == b"\x00\xffdatamore"
+    info = agent.stat(path)
+    assert (info["type"], info["mode"], info["size"]) == ("file", 0o640, 10)
+    assert agent.stat(str(tmp_path))["type"] == "dir"
+    assert "Pid:" in agent.read_text("/proc/self/status")
+    with pytest.raises(OSError) as err:
+        agent.read_file(str(tmp_path / "missing"))
+    assert err.value.errno == 2
+    with pytest.raises(GuestAgentError):
+        agent.request("reboot")
+    assert agent.ping() == 1
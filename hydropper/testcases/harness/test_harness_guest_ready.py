@@ -0,0 +1,61 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test the guest ready listener with a local vsock notifier"""
+
+import time
+import uuid
+import socket
+import pytest
+from virt.basevm import BaseVM
+from utils.config import CONFIG
+from utils.guest_ready import GuestReadyListener
+
+# cid of the host itself, needs the vsock_loopback module
+VMADDR_CID_LOCAL = 1
+
+
+def test_harness_guest_ready():
+    """
+    Test the ready notification of a guest:
+
+    1) Start a listener and connect to it like the guest notifier.
+    2) Comfirm wait() returns the notification time for the local cid.
+    3) Comfirm a notification before `since` is ignored.
+    """
+    listener = GuestReadyListener(port=20240)
+    if not listener.start():
+        pytest.skip("vsock is unavailable")
+    try:
+        since = time.time()
+        notifier = socket.socket(socket.AF_VSOCK, socket.SOCK_STREAM)
+        notifier.settimeout(2)
+        try:
+            notifier.connect((VMADDR_CID_LOCAL, listener.port))
+        except OSError as err:
+            pytest.skip("vsock loopback is unavailable: %s" % err)
+        finally:
+            notifier.close()
+        ready = listener.wait(VMADDR_CID_LOCAL, since, 5)
+        assert ready is not None and ready >= since
+        assert listener.wait(VMADDR_CID_LOCAL, time.time(), 0.1) is None
+    finally:
+        listener.stop()
+
+
+def test_harness_guest_ready_needs_boot_args():
+    """Comfirm a vm waits for serial login if its config has no boot_args to pass the port"""
+    testvm = BaseVM(CONFIG.test_session_root_path, "fake_ready", str(uuid.uuid4()), "fake",
+                    config=CONFIG.get_default_microvm_vmconfig())
+    # pylint: disable=protected-access
+    assert testvm._has_boot_args()
+    del testvm.configdict["boot-source"]["boot_args"]
+    assert not testvm._has_boot_args()
@@ -0,0 +1,75 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test the process tracker with a daemonizing process"""
+
+import os
+import sys
+import uuid
+import signal
+import subprocess
+import pytest
+from utils.config import CONFIG
+from utils.utils_process import ProcessTracker
+
+# Double fork and write a pidfile, like stratovirt -daemonize -pidfile
+FAKE_DAEMON = """import os, sys, time
+if os.fork():
+    sys.exit(0)
+os.setsid()
+if os.fork():
+    sys.exit(0)
+with open(sys.argv[sys.argv.index("-pidfile") + 1], "w") as pidf:
+    pidf.write(str(os.getpid()))
+time.sleep(60)
+"""
+
+
+@pytest.fixture
+def fake_daemon():
+    """Start a fake daemon, yield (bin_path, vmid, pidfile)"""
+    bin_path = os.path.join(CONFIG.test_session_root_path, "fake_daemon.py")
+    with open(bin_path, "w") as bin_file:
+        bin_file.write(FAKE_DAEMON)
+    vmid = str(uuid.uuid4())
+    pidfile = os.path.join(CONFIG.test_session_root_path, vmid + ".pid")
+    subprocess.run([sys.executable, bin_path, "-uuid", vmid, "-pidfile", pidfile], check=True)
+    yield bin_path, vmid, pidfile
+    with open(pidfile, "r") as pidf:
+        try:
+            os.kill(int(pidf.read()), signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    os.remove(pidfile)
+
+
+def test_harness_process_tracker(fake_daemon):
+    """
+    Test tracking a daemonized process:
+
+    1) Find it by its command line and by its pidfile, comfirm both are
+    the same process.
+    2) Kill it, comfirm is_running() is false after wait().
+    """
+    bin_path, vmid, pidfile = fake_daemon
+    by_cmdline = ProcessTracker.from_cmdline(bin_path, vmid)
+    by_pidfile = ProcessTracker.from_pidfile(pidfile)
+    try:
+        assert by_cmdline.pid == by_pidfile.pid
+        assert by_cmdline.is_running()
+        by_pidfile.send_signal(signal.SIGKILL)
+        assert by_cmdline.wait(5)
+        assert not by_cmdline.is_running()
+        assert not by_pidfile.is_running()
+        assert ProcessTracker.from_cmdline(bin_path, str(uuid.uuid4())) is None
+    finally:
+        by_cmdline.close()
+        by_pidfile.close()
@@ -0,0 +1,282 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Benchmark the qmp paths of the harness against a fake monitor"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import pytest
+from virt.basevm import BaseVM
+from utils.config import CONFIG
+from utils.qmp_client import AsyncQMPClient
+from utils.qmp_hub import QMPHub
+from utils.qmp_server import FakeQMPServer
+from utils.utils_qmp import QMPStreamBuffer
+from utils.exception import QMPTimeoutError
+
+COMMANDS = 2000
+STORM_EVENTS = 10000
+HUB_VMS = 20
+BENCH_FILE = os.path.join(CONFIG.test_session_root_path, "qmp_harness_bench.json")
+
+
+def _report(case, count, elapsed, **extra):
+    """Log a throughput result and append it to the session bench file"""
+    result = {"count": count, "seconds": elapsed, "per_second": count / elapsed}
+    result.update(extra)
+    logging.debug("%s: %s", case, result)
+    results = dict()
+    if os.path.exists(BENCH_FILE):
+        with open(BENCH_FILE, "r") as bench_file:
+            results = json.load(bench_file)
+    results[case] = result
+    with open(BENCH_FILE, "w") as bench_file:
+        json.dump(results, bench_file, indent=2)
+    return result
+
+
+def _sock_path(name):
+    return os.path.join(CONFIG.test_session_root_path, "%s_%s.sock" % (name, uuid.uuid4().hex[:8]))
+
+
+def _transport(address):
+    return "tcp" if isinstance(address, tuple) else "unix"
+
+
+def _basevm(address, qmp_async=False, qmp_hub=None):
+    """A BaseVM attached to a monitor, no hypervisor is launched"""
+    name = "fake_%s" % uuid.uuid4().hex[:8]
+    testvm = BaseVM(CONFIG.test_session_root_path, name, str(uuid.uuid4()), "fake",
+                    config=CONFIG.get_default_microvm_vmconfig(), mon_sock=address)
+    testvm.qmp_async = qmp_async
+    testvm.qmp_hub = qmp_hub
+    testvm.post_launch_qmp()
+    return testvm
+
+
+@pytest.fixture(params=["unix", "tcp"])
+def fake_qmp(request):
+    """A fake monitor listening on a unix socket or a tcp port"""
+    address = _sock_path("qmp") if request.param == "unix" else ("127.0.0.1", 0)
+    with FakeQMPServer(address) as server:
+        yield server
+
+
+def test_harness_qmp_stream_buffer():
+    """
+    Test the framing of the qmp stream:
+
+    1) Comfirm a message split across reads is queued once it is whole.
+    2) Comfirm several messages in one read are queued in order.
+    3) Comfirm malformed lines raise ValueError once, every other complete
+    message is queued at once and only once.
+    """
+    reader = QMPStreamBuffer()
+    assert reader.feed(b'{"return"') == 0
+    assert reader.feed(b': {}}\r') == 0
+    assert reader.pending_bytes() == len(b'{"return": {}}\r')
+    assert reader.feed(b'\n') == 1
+    assert reader.pop() == {"return": {}} and reader.pending_bytes() == 0
+
+    assert reader.feed(b'{"event": "STOP"}\n\n{"event": "RESUME"}\n{"id": 1, "ret') == 2
+    assert [reader.pop()["event"], reader.pop()["event"]] == ["STOP", "RESUME"]
+    assert reader.feed(b'urn": {}}\n') == 1
+    assert reader.pop() == {"id": 1, "return": {}}
+
+    with pytest.raises(ValueError):
+        reader.feed(b'{"id": 2}\n{bad\n{"id": 3}\n{worse\n{"id": 4')
+    assert [reader.pop()["id"], reader.pop()["id"]] == [2, 3]
+    assert reader.pop() is None
+    assert reader.feed(b'}\n') == 1
+    assert reader.pop() == {"id": 4}
+    assert reader.pop() is None and reader.pending_bytes() == 0
+
+
+def test_harness_fake_qmp_protocol(fake_qmp):
+    """
+    Check the fake monitor answers like StratoVirt:
+
+    1) Commands before qmp_capabilities are refused.
+    2) stop/cont change the status and send STOP/RESUME.
+    3) Hotplug a disk, unplug it and get DEVICE_DELETED.
+    4) quit replies then sends SHUTDOWN.
+    """
+    client = AsyncQMPClient(fake_qmp.address, name="fake_protocol")
+    client.connect_sync(negotiate=False)
+    assert client.command("query-status")["error"]["class"] == "CommandNotFound"
+    assert "return" in client.command("qmp_capabilities")
+    assert "return" in client.command("stop")
+    assert client.get_event("STOP", timeout=5)
+    assert client.command("query-status")["return"]["status"] == "paused"
+    assert "error" in client.command("stop")
+    assert "return" in client.command("cont")
+    assert client.get_event("RESUME", timeout=5)
+    resps = client.pipeline([("blockdev-add", {"node-name": "drive-1", "file": {"driver": "file",
+                                                                                "filename": "/dev/null"}}),
+                             ("device_add", {"id": "drive-1", "driver": "virtio-blk-mmio",
+                                             "drive": "drive-1"}),
+                             ("device_del", {"id": "drive-1"})])
+    assert all("return" in resp for resp in resps)
+    assert client.get_event("DEVICE_DELETED", timeout=5)["data"]["device"] == "drive-1"
+    assert client.command("query-cpus", cmd_id="cpus-1")["id"] == "cpus-1"
+    assert "return" in client.command("quit")
+    event = client.get_event("SHUTDOWN", timeout=5)
+    assert event["data"] == {"guest": False, "reason": "host-qmp-quit"}
+    client.close_sync()
+
+
+def test_harness_qmp_async_timeout(fake_qmp):
+    """Comfirm a command given up at its timeout is forgotten and its late reply dropped"""
+    client = AsyncQMPClient(fake_qmp.address, name="fake_timeout")
+    client.connect_sync()
+    try:
+        fake_qmp.set_delay(0.5, "query-status")
+        with pytest.raises(QMPTimeoutError):
+            client.command("query-status", timeout=0.1)
+        # pylint: disable=protected-access
+        assert not client._pending
+        time.sleep(0.6)
+        assert len(client.command("query-cpus", timeout=5)["return"]) == 4
+        assert not client._abandoned
+    finally:
+        client.close_sync()
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_harness_qmp_hub_events(threaded):
+    """Comfirm a vm on a hub gets events emitted while it waits, with or without a hub thread"""
+    with FakeQMPServer(_sock_path("hub_events")) as server:
+        hub = QMPHub()
+        if threaded:
+            hub.start()
+        testvm = _basevm(server.address, qmp_hub=hub)
+        try:
+            data = {"guest": False, "reason": "host-qmp-quit"}
+            timer = threading.Timer(0.3, server.emit, ("SHUTDOWN", data))
+            timer.start()
+            begin = time.time()
+            assert testvm.event_wait("SHUTDOWN", timeout=3, match={"data": data})
+            assert time.time() - begin < 2
+            timer.join()
+            server.emit("STOP")
+            assert testvm.get_events(wait=3.0, only_event=True)["event"] == "STOP"
+        finally:
+            testvm.close_sock()
+            hub.stop()
+
+
+@pytest.mark.performance
+def test_harness_qmp_sync_throughput(fake_qmp):
+    """Commands per second of the BaseVM socket path, one by one and pipelined"""
+    testvm = _basevm(fake_qmp.address)
+    try:
+        begin = time.time()
+        for _ in range(COMMANDS):
+            assert "return" in testvm.qmp_command("query-status")
+        _report("sync_serial_%s" % _transport(fake_qmp.address), COMMANDS, time.time() - begin)
+
+        begin = time.time()
+        resps = testvm.qmp_pipeline([("query-status", None)] * COMMANDS)
+        _report("sync_pipeline_%s" % _transport(fake_qmp.address), COMMANDS, time.time() - begin)
+        assert len(resps) == COMMANDS
+    finally:
+        testvm.close_sock()
+
+
+@pytest.mark.performance
+def test_harness_qmp_async_throughput(fake_qmp):
+    """Commands per second of the asyncio client, one by one and pipelined"""
+    testvm = _basevm(fake_qmp.address, qmp_async=True)
+    try:
+        begin = time.time()
+        for _ in range(COMMANDS):
+            assert "return" in testvm.qmp_command("query-status")
+        _report("async_serial_%s" % _transport(fake_qmp.address), COMMANDS, time.time() - begin)
+
+        begin = time.time()
+        resps = testvm.qmp_pipeline([("query-status", None)] * COMMANDS)
+        _report("async_pipeline_%s" % _transport(fake_qmp.address), COMMANDS, time.time() - begin)
+        assert len(resps) == COMMANDS
+    finally:
+        testvm.close_sock()
+
+
+@pytest.mark.performance
+def test_harness_qmp_hub_throughput():
+    """Broadcast commands per second of a QMPHub driving many monitors"""
+    servers = [FakeQMPServer(_sock_path("hub")) for _ in range(HUB_VMS)]
+    hub = QMPHub()
+    try:
+        for index, server in enumerate(servers):
+            server.start()
+            hub.register("fake_hub_%d" % index, server.address).wait_ready()
+        rounds = COMMANDS // HUB_VMS
+        begin = time.time()
+        for _ in range(rounds):
+            resps = hub.broadcast("query-status", timeout=10)
+            assert len(resps) == HUB_VMS
+        _report("hub_broadcast", rounds * HUB_VMS, time.time() - begin, vms=HUB_VMS)
+    finally:
+        hub.stop()
+        for server in servers:
+            server.stop()
+
+
+def _storm(server):
+    server.inject_events("BALLOON_CHANGED", STORM_EVENTS, data=lambda index: {"actual": index})
+    server.emit("STOP")
+
+
+@pytest.mark.performance
+@pytest.mark.parametrize("path", ["sync", "async", "hub"])
+def test_harness_qmp_event_storm(path):
+    """
+    Event throughput of each qmp path:
+
+    1) Inject an event storm, then a STOP event, from another thread.
+    2) Wait for STOP and comfirm every event was read, the per name
+    queue stays bounded.
+    """
+    with FakeQMPServer(_sock_path("storm")) as server:
+        hub = None
+        if path == "hub":
+            hub = QMPHub()
+            hub.start()
+            handle = hub.register("fake_storm", server.address)
+            handle.wait_ready()
+            events = handle.events
+        else:
+            testvm = _basevm(server.address, qmp_async=(path == "async"))
+            events = testvm.qmp_events
+        try:
+            begin = time.time()
+            storm = threading.Thread(target=_storm, args=(server,))
+            storm.start()
+            if hub is None:
+                testvm.event_wait("STOP", timeout=60)
+            else:
+                events.wait("STOP", timeout=60)
+            elapsed = time.time() - begin
+            storm.join()
+            stats = events.stats()
+            _report("event_storm_%s" % path, STORM_EVENTS + 1, elapsed,
+                    dropped=stats["dropped"])
+            assert stats["received"] == STORM_EVENTS + 1
+            assert stats["queued"] <= events.maxlen
+        finally:
+            if hub is None:
+                testvm.close_sock()
+            else:
+                hub.stop()
@@ -0,0 +1,45 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test the partition of host resources between xdist workers"""
+
+from utils.config import xdist_worker
+from utils.resources import VSOCKS
+from utils.resources import worker_slice
+
+
+def test_harness_worker_slices(monkeypatch):
+    """
+    Test the resources of workers:
+
+    1) Comfirm the worker is read from the xdist environment.
+    2) Comfirm the slices of 8 workers are disjoint and cover all values.
+    3) Comfirm find_contextid() gives no cid twice until it is released.
+    """
+    monkeypatch.setenv("PYTEST_XDIST_WORKER", "gw3")
+    monkeypatch.setenv("PYTEST_XDIST_WORKER_COUNT", "8")
+    assert xdist_worker() == (3, 8)
+    monkeypatch.delenv("PYTEST_XDIST_WORKER")
+    assert xdist_worker() == (0, 1)
+
+    values = range(10, 250)
+    slices = [worker_slice(values, index, 8) for index in range(8)]
+    assert sorted(sum(slices, [])) == list(values)
+    assert all(not set(slices[0]) & set(other) for other in slices[1:])
+
+    cids = [VSOCKS.find_contextid() for _ in range(100)]
+    try:
+        assert len(set(cids)) == len(cids)
+        assert all(cid >= 3 for cid in cids)
+    finally:
+        for cid in cids:
+            VSOCKS.release_contextid(cid)
+    assert not VSOCKS.used_cids & set(cids)
@@ -0,0 +1,82 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test the asynchronous console capture"""
+
+import os
+import gzip
+import time
+import threading
+from utils.serial_capture import SerialCapture
+
+
+def test_harness_serial_capture(tmp_path):
+    """
+    Test capturing console output:
+
+    1) Comfirm lines are written raw in order, and all are on disk after
+    flush() and close().
+    2) Comfirm write() does not wait for a slow disk, lines over the
+    buffer are dropped, counted, and noted in the file.
+    3) Comfirm the file is rotated at max_bytes and rotated files are
+    gzipped, keeping backup_count of them.
+    """
+    path = str(tmp_path / "vm_serial.log")
+    capture = SerialCapture(path, buffer_size=1024 * 1024, max_bytes=0)
+    for index in range(1000):
+        capture.write("line %d \033[1;31mred\033[0m" % index)
+    assert capture.flush(5)
+    with open(path, "rb") as log_file:
+        lines = log_file.read().decode().splitlines()
+    assert lines == ["line %d \033[1;31mred\033[0m" % index for index in range(1000)]
+    capture.close()
+    capture.write("after close")
+    assert capture.stats["lines"] == 1000
+
+    # a disk blocked until release is set
+    path = str(tmp_path / "slow_serial.log")
+    capture = SerialCapture(path, buffer_size=1000, max_bytes=0)
+    release = threading.Event()
+    # pylint: disable=protected-access
+    write = capture._write
+    capture._write = lambda data: (release.wait(), write(data))
+    begin = time.time()
+    for index in range(1000):
+        capture.write("%08d" % index)
+    assert time.time() - begin < 1
+    release.set()
+    capture.close()
+    stats = capture.stats
+    assert stats["dropped_lines"] > 0
+    assert stats["lines"] + stats["dropped_lines"] == 1000
+    with open(path, "r") as log_file:
+        content = log_file.read()
+    assert "%d lines of console output dropped" % stats["dropped_lines"] in content
+
+    path = str(tmp_path / "rotate_serial.log")
+    capture = SerialCapture(path, buffer_size=1024 * 1024, max_bytes=4096,
+                            backup_count=2, compress=True)
+    for index in range(200):
+        capture.write("%0100d" % index)
+        if index % 20 == 0:
+            capture.flush(5)
+    capture.close()
+    assert capture.stats["rotations"] >= 3
+    assert not os.path.exists(path + ".3.gz")
+    lines = list()
+    for backup in (path + ".2.gz", path + ".1.gz"):
+        with gzip.open(backup, "rt") as backup_file:
+            lines.extend(backup_file.read().splitlines())
+    if os.path.exists(path):
+        with open(path, "r") as log_file:
+            lines.extend(log_file.read().splitlines())
+    numbers = [int(line) for line in lines]
+    assert numbers == list(range(numbers[0], 200))
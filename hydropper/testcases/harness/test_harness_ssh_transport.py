@@ -0,0 +1,139 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test the ssh master transport"""
+
+import os
+import sys
+import json
+import shutil
+import pytest
+from utils import ssh_transport
+from utils.ssh_transport import SSHTransport
+from utils.ssh_transport import session_key
+from utils.exception import SSHError
+
+# Stands in for ssh and scp: logs its arguments, keeps the control path
+# as the master and runs commands with the host sh
+FAKE_SSH = r'''#!%s
+import os
+import sys
+import json
+import shutil
+import subprocess
+
+args = sys.argv[1:]
+with open(os.environ["FAKE_SSH_LOG"], "a") as log:
+    log.write(json.dumps([os.path.basename(sys.argv[0])] + args) + "\n")
+options = dict(args[index + 1].split("=", 1) for index, arg in enumerate(args) if arg == "-o")
+control = options["ControlPath"]
+if os.path.basename(sys.argv[0]) == "scp":
+    if not os.path.exists(control):
+        sys.exit(1)
+    shutil.copy(args[-2], args[-1].split(":", 1)[1])
+    sys.exit(0)
+if "-O" in args:
+    operation = args[args.index("-O") + 1]
+    if not os.path.exists(control):
+        sys.exit(255)
+    if operation == "exit":
+        os.remove(control)
+    sys.exit(0)
+if "-N" in args:
+    open(control, "w").close()
+    sys.exit(0)
+if not os.path.exists(control):
+    sys.exit(255)
+sys.exit(subprocess.call(["sh", "-c", args[-1]]))
+'''
+
+
+@pytest.fixture
+def fake_ssh(tmp_path, monkeypatch):
+    """Put fake ssh and scp in use, return the file of their calls"""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for name in ("ssh", "scp"):
+        path = bin_dir / name
+        path.write_text(FAKE_SSH % sys.executable)
+        path.chmod(0o755)
+    log_path = tmp_path / "calls.log"
+    log_path.write_text("")
+    monkeypatch.setenv("FAKE_SSH_LOG", str(log_path))
+    monkeypatch.setattr(ssh_transport, "SSH_BIN", str(bin_dir / "ssh"))
+    monkeypatch.setattr(ssh_transport, "SCP_BIN", str(bin_dir / "scp"))
+    return log_path
+
+
+def _calls(log_path):
+    return [json.loads(line) for line in log_path.read_text().splitlines()]
+
+
+@pytest.mark.skipif(shutil.which("ssh-keygen") is None, reason="ssh-keygen is not installed")
+def test_harness_session_key(tmp_path):
+    """Comfirm the session key is generated once and reused"""
+    key_path, pubkey = session_key(str(tmp_path / "keys"))
+    assert pubkey.startswith("ssh-ed25519 ")
+    assert os.stat(key_path).st_mode & 0o077 == 0
+    mtime = os.stat(key_path).st_mtime_ns
+    assert session_key(str(tmp_path / "keys")) == (key_path, pubkey)
+    assert os.stat(key_path).st_mtime_ns == mtime
+
+
+def test_harness_ssh_transport(fake_ssh, tmp_path):  # pylint: disable=redefined-outer-name
+    """Comfirm commands and copies go over one master started once"""
+    known_hosts = str(tmp_path / "known_hosts")
+    transport = SSHTransport("192.168.0.2", "root", str(tmp_path / "id"),
+                             str(tmp_path / "ssh.ctl"), known_hosts=known_hosts)
+    transport.start()
+    transport.start()
+    assert transport.run("echo hello; exit 3") == (3, "hello\n")
+    src = tmp_path / "src.txt"
+    src.write_text("blob")
+    transport.scp(str(src), str(tmp_path / "dst.txt"))
+    assert (tmp_path / "dst.txt").read_text() == "blob"
+    command = transport.shell_command()
+    transport.stop()
+    assert not os.path.exists(str(tmp_path / "ssh.ctl"))
+
+    calls = _calls(fake_ssh)
+    masters = [call for call in calls if "-N" in call]
+    assert len(masters) == 1
+    assert "ControlMaster=yes" in masters[0] and "ControlPersist=yes" in masters[0]
+    for call in calls:
+        assert "ControlPath=%s" % (tmp_path / "ssh.ctl") in call
+        assert "UserKnownHostsFile=%s" % known_hosts in call
+        assert "StrictHostKeyChecking=yes" in call
+        assert "BatchMode=yes" in call
+    assert calls[-1][-3:] == ["-O", "exit", "root@192.168.0.2"]
+    assert "ControlPath=%s" % (tmp_path / "ssh.ctl") in command and "-tt" in command
+
+
+def test_harness_ssh_transport_no_host_keys(fake_ssh, tmp_path):  # pylint: disable=redefined-outer-name
+    """Comfirm host keys are not checked without known_hosts"""
+    transport = SSHTransport("192.168.0.2", "root", str(tmp_path / "id"),
+                             str(tmp_path / "ssh.ctl"))
+    transport.start()
+    transport.stop()
+    for call in _calls(fake_ssh):
+        assert "UserKnownHostsFile=/dev/null" in call
+        assert "StrictHostKeyChecking=no" in call
+
+
+@pytest.mark.skipif(shutil.which("ssh") is None, reason="ssh is not installed")
+def test_harness_ssh_transport_refused(tmp_path):
+    """Comfirm a master failing to log in raises SSHError"""
+    transport = SSHTransport("127.0.0.1", "root", str(tmp_path / "id"),
+                             str(tmp_path / "ssh.ctl"), port=1)
+    with pytest.raises(SSHError):
+        transport.start(timeout=10)
+    assert not transport.started
+    transport.stop()
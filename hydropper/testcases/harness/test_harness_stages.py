@@ -0,0 +1,47 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test the staged bring-up runner"""
+
+import time
+import pytest
+from utils.utils_common import run_stages
+
+
+def test_harness_run_stages():
+    """
+    Test running dependent stages like the vm bring-up:
+
+    1) Comfirm independent stages overlap and a stage starts after the
+    stages it needs.
+    2) Comfirm a failed stage is raised, its dependents are skipped and
+    the other stages still run.
+    """
+    def _sleep():
+        time.sleep(0.2)
+
+    stages = {"serial": (_sleep, ()), "qmp": (_sleep, ()),
+              "network": (_sleep, ("serial",)), "ssh": (_sleep, ("network",))}
+    begin = time.time()
+    times = run_stages(stages)
+    assert time.time() - begin < 0.75
+    assert times["qmp"][0] < times["serial"][1]
+    assert times["network"][0] >= times["serial"][1]
+    assert times["ssh"][0] >= times["network"][1]
+
+    def _fail():
+        raise RuntimeError("login failed")
+
+    stages["serial"] = (_fail, ())
+    times = dict()
+    with pytest.raises(RuntimeError):
+        run_stages(stages, times)
+    assert list(times) == ["qmp"]
@@ -0,0 +1,82 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test the event driven waits of the harness"""
+
+import os
+import time
+import socket
+import threading
+import subprocess
+from utils import utils_wait
+from utils.config import CONFIG
+from utils.utils_wait import wait_path_exists
+from utils.utils_wait import wait_process_exit
+
+DELAY = 0.3
+# The waits must wake up well before the old 200ms / 1s polling would
+SLACK = 0.15
+
+
+def test_harness_wait_path_exists():
+    """
+    Test waiting for a socket:
+
+    1) Bind a unix socket after DELAY from another thread.
+    2) Comfirm the wait returns soon after it is created.
+    3) Comfirm the wait times out for a missing socket.
+    """
+    sock_path = os.path.join(CONFIG.test_session_root_path, "wait_%d.sock" % os.getpid())
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    def _bind():
+        time.sleep(DELAY)
+        sock.bind(sock_path)
+
+    binder = threading.Thread(target=_bind)
+    begin = time.time()
+    binder.start()
+    try:
+        assert wait_path_exists(sock_path, 5)
+        assert time.time() - begin < DELAY + SLACK
+        assert not wait_path_exists(sock_path + ".none", DELAY)
+    finally:
+        binder.join()
+        sock.close()
+        os.remove(sock_path)
+
+
+def test_harness_wait_process_exit():
+    """
+    Test waiting for a daemonized process, which is not our child:
+
+    1) Start a process in background from a shell, like -daemonize does.
+    2) Comfirm the wait returns soon after it exits.
+    """
+    pid = int(subprocess.check_output("sleep %s >/dev/null 2>&1 & echo $!" % DELAY,
+                                      shell=True))
+    begin = time.time()
+    assert wait_process_exit(pid, 5)
+    assert time.time() - begin < DELAY + SLACK
+
+
+def test_harness_wait_zombie_without_pidfd(monkeypatch):
+    """Comfirm the /proc fallback sees an unreaped child as exited"""
+    def _no_pidfd(_pid):
+        raise OSError("pidfd is disabled")
+    monkeypatch.setattr(utils_wait, "pidfd_open", _no_pidfd)
+    proc = subprocess.Popen(["sleep", str(DELAY)])
+    try:
+        begin = time.time()
+        assert wait_process_exit(proc.pid, 5)
+        assert time.time() - begin < DELAY + 1
+    finally:
+        proc.wait()
@@ -19,7 +19,6 @@ from subprocess import PIPE
 from subprocess import getstatusoutput
 import pytest
 import utils.exception
-import utils.utils_common
 from utils.config import CONFIG
 
 def _get_corefilesize(vm_pid, dump_guestcore):
@@ -171,7 +170,7 @@ def test_microvm_with_dump_guestcore(microvm, dump_guestcore):
     platform.machine() != "x86_64",
     reason="psyscall tools fail to run on aarch64."
 )
-def test_microvm_with_seccomp(microvm, with_seccomp):
+def test_microvm_with_seccomp(microvm, with_seccomp, psyscall_path):
     """
     Test microvm with seccomp:
 
@@ -188,25 +187,11 @@ def test_microvm_with_seccomp(microvm, with_seccomp):
     test_vm.launch()
     vm_pid = test_vm.pid
 
-    # Get psyscall
-    try:
-        path = os.path.realpath(os.path.dirname(__file__))
-        psyscall_path = "{}/{}".format(path, "psyscall")
-        run(
-            "git clone https://gitee.com/EulerRobot/psyscall.git %s"
-            % psyscall_path,
-            shell=True,
-            check=True
-            )
-        run("cd %s && make" % psyscall_path, shell=True, check=True)
-
-        # bad syscall
-        _cmd = "%s/psyscall %s dup2 3 4" % (psyscall_path, vm_pid)
-        logging.debug("execute command %s", _cmd)
-        status, output = getstatusoutput(_cmd)
-        logging.debug("bad syscall output: %s", output)
-        assert status == 0
-        if with_seccomp:
-            test_vm.wait_pid_exit()
-    finally:
-        utils.utils_common.remove_existing_dir(psyscall_path)
+    # bad syscall
+    _cmd = "%s %s dup2 3 4" % (psyscall_path, vm_pid)
+    logging.debug("execute command %s", _cmd)
+    status, output = getstatusoutput(_cmd)
+    logging.debug("bad syscall output: %s", output)
+    assert status == 0
+    if with_seccomp:
+        test_vm.wait_pid_exit()
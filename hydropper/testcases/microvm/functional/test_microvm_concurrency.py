@@ -14,6 +14,7 @@
 import logging
 import threading
 import pytest
+from utils.qmp_hub import QMPHub
 
 @pytest.mark.system
 def test_microvm_concurrency(microvms):
@@ -48,3 +49,35 @@ def test_microvm_concurrency(microvms):
 
     for testthr in test_ths:
         testthr.join()
+
+
+@pytest.mark.system
+def test_microvm_concurrency_qmp_hub(microvms):
+    """
+    Drive the monitors of multi microvms from one thread:
+
+    1) Launch each VM with its monitor registered in one QMPHub.
+    2) Send query-cpus to all VMs at once from the main thread and
+    comfirm each VM has 4 vcpus.
+    3) Log the qmp latency of each VM.
+    4) Stop each VM and comfirm the quit command stopped it, before
+    SIGTERM or SIGKILL.
+    """
+    hub = QMPHub()
+    try:
+        for testvm in microvms:
+            testvm.basic_config(vcpu_count=4, vnetnums=0, qmp_hub=hub)
+            testvm.launch()
+
+        for _ in range(10):
+            resps = hub.broadcast("query-cpus", timeout=30)
+            assert len(resps) == len(microvms)
+            for resp in resps.values():
+                assert len(resp.get("return", [])) == 4
+        for name, stats in hub.latency_report().items():
+            logging.debug("vm %s qmp latency: %s", name, stats)
+
+        for testvm in microvms:
+            assert testvm.terminate() == "quit"
+    finally:
+        hub.stop()
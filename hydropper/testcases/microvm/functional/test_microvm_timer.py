@@ -16,7 +16,7 @@ from subprocess import PIPE
 import pytest
 
 @pytest.mark.acceptance
-def test_microvm_time(microvm):
+def test_microvm_time(launched_microvm):
     """
     Test microvm time:
 
@@ -24,8 +24,7 @@ def test_microvm_time(microvm):
     2) Get guest date and host date
     3) Compare them
     """
-    test_vm = microvm
-    test_vm.launch()
+    test_vm = launched_microvm
     _, guest_date = test_vm.serial_cmd("date +%s")
     host_date = run("date +%s", shell=True, check=True,
                     stdout=PIPE).stdout.decode('utf-8')
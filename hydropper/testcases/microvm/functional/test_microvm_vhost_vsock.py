@@ -67,14 +67,9 @@ def _write_from_host_to_guest(nc_vsock_path, cid):
 
 def _get_recv_data_from_guest(microvm):
     _cmd = "cat %s" % NC_VSOCK_SRV_OUT
-    try:
-        ssh_session = microvm.create_ssh_session()
-        _, output = ssh_session.cmd_status_output(_cmd)
-        logging.debug("recv data from guest is %s", output.strip())
-        return output.strip()
-    finally:
-        if ssh_session is not None:
-            ssh_session.close()
+    _, output = microvm.ssh_cmd(_cmd)
+    logging.debug("recv data from guest is %s", output.strip())
+    return output.strip()
 
 @pytest.mark.acceptance
 def test_microvm_virtio_vsock(microvm, nc_vsock_path, test_session_root_path):
@@ -94,13 +89,11 @@ def test_microvm_virtio_vsock(microvm, nc_vsock_path, test_session_root_path):
     vm_blob_path = "/tmp/nc-vsock/test.blob"
 
     #  set up a tmpfs drive on the guest, then we can copy the blob file there.
-    session = test_vm.create_ssh_session()
     cmd = "mkdir -p /tmp/nc-vsock"
     cmd += " && mount -t tmpfs tmpfs -o size={} /tmp/nc-vsock".format(
         BLOB_SIZE + 1024*1024
     )
-    status, _ = session.cmd_status_output(cmd)
-    session.close()
+    status, _ = test_vm.ssh_cmd(cmd)
     assert status == 0
 
     # copy nc-vsock tool and the blob file to the guest.
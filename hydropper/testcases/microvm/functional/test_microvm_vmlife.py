@@ -38,26 +38,23 @@ def test_microvm_start(microvm, vcpu_count, memsize, vnetnums):
 
 @pytest.mark.system
 @pytest.mark.parametrize("destroy_value", [9, 15])
-def test_microvm_destroy(microvm, destroy_value):
+def test_microvm_destroy(launched_microvm, destroy_value):
     """Test a normal microvm destroy(kill -9)"""
-    test_vm = microvm
-    test_vm.launch()
+    test_vm = launched_microvm
     test_vm.destroy(signal=destroy_value)
 
 
 @pytest.mark.system
-def test_microvm_inshutdown(microvm):
+def test_microvm_inshutdown(launched_microvm):
     """Test a normal microvm inshutdown"""
-    test_vm = microvm
-    test_vm.launch()
+    test_vm = launched_microvm
     test_vm.inshutdown()
 
 
 @pytest.mark.acceptance
-def test_microvm_pause_resume(microvm):
+def test_microvm_pause_resume(launched_microvm):
     """Test a normal microvm pause"""
-    test_vm = microvm
-    test_vm.launch()
+    test_vm = launched_microvm
     resp = test_vm.query_status()
     utils_qmp.assert_qmp(resp, "return/status", "running")
     test_vm.stop()
@@ -73,10 +70,9 @@ def test_microvm_pause_resume(microvm):
 
 
 @pytest.mark.system
-def test_microvm_pause_resume_abnormal(microvm):
+def test_microvm_pause_resume_abnormal(launched_microvm):
     """Abnormal test for microvm pause/resume"""
-    test_vm = microvm
-    test_vm.launch()
+    test_vm = launched_microvm
     resp = test_vm.cont()
     utils_qmp.assert_qmp(resp, "error/class", "GenericError")
     with pytest.raises(QMPTimeoutError):
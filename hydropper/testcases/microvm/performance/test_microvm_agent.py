@@ -0,0 +1,72 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test guest agent commands against serial commands"""
+
+import time
+import logging
+import pytest
+from utils.exception import GuestAgentError
+from utils.utils_perf import write_results
+from utils.utils_stats import sample_summary
+
+AGENT_BENCH_COUNT = 100
+AGENT_BENCH_CMDS = {"true": "true", "uname": "uname -r", "meminfo": "cat /proc/meminfo"}
+
+
+def _bench(run, cmd):
+    """Run cmd AGENT_BENCH_COUNT times, return the latencies and the last output"""
+    latencies = list()
+    output = None
+    for _ in range(AGENT_BENCH_COUNT):
+        begin = time.time()
+        status, output = run(cmd)
+        latencies.append(time.time() - begin)
+        assert status == 0
+    return latencies, output
+
+
+@pytest.mark.performance
+@pytest.mark.parametrize("name", sorted(AGENT_BENCH_CMDS))
+def test_microvm_agent_cmd(microvm, name):
+    """
+    Test commands per second of the guest agent and the serial console:
+
+    1) Launch a vm with a vsock device for the guest agent.
+    2) Run the same command AGENT_BENCH_COUNT times by serial_cmd, then
+    by agent_cmd, and report commands per second and latencies of both
+    to guest_agent.json in the session directory.
+    3) Comfirm both paths return the same output.
+    """
+    test_vm = microvm
+    test_vm.use_agent = True
+    test_vm.launch()
+    try:
+        test_vm.guest_agent.ping()
+    except GuestAgentError as err:
+        pytest.skip("guest agent is not installed in the image: %s" % err)
+
+    cmd = AGENT_BENCH_CMDS[name]
+    results = dict()
+    outputs = dict()
+    for path, run in (("serial", test_vm.serial_cmd), ("agent", test_vm.agent_cmd)):
+        begin = time.time()
+        latencies, outputs[path] = _bench(run, cmd)
+        elapsed = time.time() - begin
+        results[path] = {"cmds_per_second": AGENT_BENCH_COUNT / elapsed,
+                         "latency": sample_summary(latencies)}
+    results["speedup"] = results["agent"]["cmds_per_second"] / results["serial"]["cmds_per_second"]
+    logging.debug("%s by serial and agent: %s", cmd, results)
+    write_results("guest_agent", name, results)
+
+    if name != "meminfo":
+        assert outputs["agent"].strip() == outputs["serial"].strip()
+    test_vm.shutdown()
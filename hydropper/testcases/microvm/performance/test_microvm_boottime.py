@@ -0,0 +1,109 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test microvm boot time"""
+
+import re
+import time
+import uuid
+import logging
+import pytest
+from virt.microvm import MicroVM
+from utils.config import CONFIG
+from utils.utils_perf import PerfBaseline
+from utils.utils_perf import write_results
+from utils.utils_stats import sample_summary
+
+MIB = 1024 * 1024
+# Seconds since launch() started the vm process:
+#   process_start: console socket is created
+#   kernel_entry: guest kernel starts, host time at login minus guest uptime
+#   init: kernel runs init, from its dmesg timestamp
+#   login: serial login succeeded, READY_MODE=serial
+#   guest_ready: the guest notifier connected, READY_MODE=vsock
+#   ready: launch() returned, network and ssh included
+BOOT_STAGES = ("process_start", "kernel_entry", "init", "login", "guest_ready", "ready")
+INIT_PATTERN = re.compile(r"\[\s*(\d+\.\d+)\].*Run \S+ as init process")
+
+
+def _boot_sample(test_vm):
+    """Launch a vm and get the time of each boot stage"""
+    test_vm.launch()
+    ready = time.time() - test_vm.launch_time
+
+    before = time.time()
+    _, output = test_vm.serial_cmd("cat /proc/uptime")
+    after = time.time()
+    uptime = float(output.split()[0])
+    kernel_entry = (before + after) / 2 - uptime - test_vm.launch_time
+
+    _, output = test_vm.serial_cmd("dmesg | grep 'as init process'")
+    match = INIT_PATTERN.search(output)
+    assert match, "no init message in dmesg: %s" % output
+
+    sample = {"process_start": test_vm.lifecycle["console_ready"],
+              "kernel_entry": kernel_entry,
+              "init": kernel_entry + float(match.group(1)),
+              "ready": ready}
+    # a vm ready by vsock does no serial login at launch
+    if test_vm.lifecycle.get("login_ready") is not None:
+        sample["login"] = test_vm.lifecycle["login_ready"]
+    else:
+        sample["guest_ready"] = test_vm.lifecycle["guest_ready"]
+    return sample
+
+
+@pytest.mark.performance
+@pytest.mark.parametrize("boot", ["rootfs", "initrd"])
+@pytest.mark.parametrize("vcpus, memsize", [(1, 256 * MIB), (4, 1024 * MIB)])
+@pytest.mark.parametrize("vnetnums", [0, 1])
+def test_microvm_boottime(test_session_root_path, boot, vcpus, memsize, vnetnums):
+    """
+    Test microvm boot time:
+
+    1) Launch BOOTTIME_SAMPLES vms one by one with the configuration, with
+    the boottime binary if it is set.
+    2) Get the time of process start, kernel entry, init, login (or guest
+    ready with READY_MODE=vsock) and ready of each vm, then shut it down.
+    3) Report mean/stdev/percentiles of each stage to boottime.json in
+    the session directory.
+    4) Comfirm no stage mean is above the stored baseline with
+    BOOTTIME_TOLERANCE, or store them as the baseline if UPDATE_BASELINE.
+
+    Note: rootfs boots with the boottime template, initrd with the initrd one.
+    """
+    # pylint: disable=redefined-outer-name
+    case = "%s_%dvcpu_%dmib_%dnet" % (boot, vcpus, memsize // MIB, vnetnums)
+    bin_path = CONFIG.stratovirt_microvm_boottime_bin or CONFIG.stratovirt_microvm_bin
+    vmconfig = CONFIG.get_microvm_by_tag("boottime" if boot == "rootfs" else "initrd")
+    samples = {stage: list() for stage in BOOT_STAGES}
+    for index in range(CONFIG.boottime_samples):
+        test_vm = MicroVM(test_session_root_path, "microvm_boottime", str(uuid.uuid4()),
+                          bin_path=bin_path, vmconfig=vmconfig, vcpus=vcpus, memsize=memsize)
+        test_vm.basic_config(vnetnums=vnetnums)
+        try:
+            sample = _boot_sample(test_vm)
+        finally:
+            test_vm.kill()
+        logging.debug("%s boot %d: %s", case, index, sample)
+        for stage, seconds in sample.items():
+            samples[stage].append(seconds)
+
+    results = {stage: sample_summary(samples[stage]) for stage in BOOT_STAGES if samples[stage]}
+    logging.debug("%s boot time: %s", case, results)
+    write_results("boottime", case, results)
+
+    baseline = PerfBaseline(CONFIG.boottime_baseline, CONFIG.boottime_tolerance)
+    if CONFIG.perf_update_baseline:
+        baseline.update(case, results)
+        return
+    regressions = baseline.check(case, results)
+    assert not regressions, "boot time regression: %s" % regressions
@@ -0,0 +1,127 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test microvm lifecycle churn"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+import pytest
+from virt.microvm import MicroVM
+from utils import utils_qmp
+from utils.config import CONFIG
+from utils.resources import NETWORKS
+from utils.resources import VSOCKS
+from utils.utils_perf import write_results
+from utils.utils_process import scan_cmdlines
+from utils.utils_stats import sample_summary
+
+MIB = 1024 * 1024
+CHURN_NAME = "microvm_churn"
+CHURN_PHASES = ("create", "boot", "query", "destroy")
+
+
+def _host_resources(root_path):
+    """Resources a churn vm can leak, as sets to compare before and after"""
+    return {"taps": set(name for name in os.listdir("/sys/class/net")
+                        if name.startswith(NETWORKS.tap_prefix)),
+            "sockets": set(name for name in os.listdir(root_path)
+                           if name.startswith(CHURN_NAME) and name.endswith(".sock")),
+            "pids": set(pid for pid, args in scan_cmdlines(CONFIG.stratovirt_microvm_bin).items()
+                        if any(CHURN_NAME in arg for arg in args)),
+            "cids": set(VSOCKS.used_cids),
+            "fds": set(os.listdir("/proc/self/fd"))}
+
+
+def _cycle(root_path, vnetnums, timings):
+    """One lifecycle of a vm, the time of each phase is added to timings"""
+    begin = time.time()
+    test_vm = MicroVM(root_path, CHURN_NAME, str(uuid.uuid4()),
+                      vmconfig=CONFIG.get_microvm_by_tag("initrd"), vcpus=1, memsize=256 * MIB)
+    test_vm.basic_config(vnetnums=vnetnums)
+    timings["create"].append(time.time() - begin)
+    try:
+        begin = time.time()
+        test_vm.launch()
+        timings["boot"].append(time.time() - begin)
+
+        begin = time.time()
+        resp = test_vm.query_status()
+        utils_qmp.assert_qmp(resp, "return/status", "running")
+        timings["query"].append(time.time() - begin)
+    finally:
+        begin = time.time()
+        test_vm.destroy()
+        for tap in test_vm.taps:
+            NETWORKS.clean_tap(tap["name"])
+        test_vm.release_host_resources(clean_taps=False)
+        timings["destroy"].append(time.time() - begin)
+
+
+@pytest.mark.performance
+@pytest.mark.parametrize("vnetnums", [0, 1])
+def test_microvm_churn(test_session_root_path, vnetnums):
+    """
+    Test microvm lifecycle churn:
+
+    1) Run one cycle to warm up, then CHURN_CONCURRENCY threads for
+    CHURN_DURATION seconds, each one repeating: create a vm, boot it,
+    query-status, destroy it and clean its taps.
+    2) Report lifecycles per second and the latency of each phase to
+    churn.json in the session directory.
+    3) Comfirm no cycle failed and no tap, socket, vm process, vsock cid
+    or harness fd is left over.
+    """
+    # pylint: disable=redefined-outer-name
+    case = "initrd_%dnet_%dthreads" % (vnetnums, CONFIG.churn_concurrency)
+    timings = {phase: list() for phase in CHURN_PHASES}
+    errors = list()
+    # a first cycle opens what stays open for all vms, such as their log file
+    _cycle(test_session_root_path, vnetnums, {phase: list() for phase in CHURN_PHASES})
+    before = _host_resources(test_session_root_path)
+    deadline = time.time() + CONFIG.churn_duration
+
+    def _churn():
+        while time.time() < deadline:
+            try:
+                _cycle(test_session_root_path, vnetnums, timings)
+            # count the failure and go on churning
+            # pylint: disable=broad-except
+            except Exception as err:
+                logging.warning("churn cycle failed: %s", err)
+                errors.append(err)
+
+    begin = time.time()
+    threads = [threading.Thread(target=_churn, name="churn-%d" % index)
+               for index in range(CONFIG.churn_concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - begin
+
+    after = _host_resources(test_session_root_path)
+    leaks = {kind: sorted(str(item) for item in after[kind] - before[kind]) for kind in before}
+    cycles = len(timings["destroy"])
+    results = {"cycles": cycles,
+               "failures": len(errors),
+               "seconds": elapsed,
+               "lifecycles_per_second": (cycles - len(errors)) / elapsed,
+               "leaks": leaks}
+    results.update({phase: sample_summary(timings[phase])
+                    for phase in CHURN_PHASES if timings[phase]})
+    logging.debug("%s churn: %s", case, results)
+    write_results("churn", case, results)
+
+    assert not errors, "%d of %d churn cycles failed: %s" % (len(errors), cycles, errors[0])
+    assert not any(leaks.values()), "churn leaked resources: %s" % leaks
@@ -0,0 +1,111 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Test how many microvms fit on the host"""
+
+import time
+import uuid
+import logging
+import pytest
+from virt import fleet
+from virt.microvm import MicroVM
+from monitor.mem_usage_supervise import MemorySupervisor
+from utils.config import CONFIG
+from utils.utils_perf import CpuUsage
+from utils.utils_perf import host_meminfo
+from utils.utils_perf import process_rss
+from utils.utils_perf import write_results
+from utils.utils_stats import sample_summary
+
+MIB = 1024 * 1024
+DENSITY_VCPUS = 1
+DENSITY_MEMSIZE = 256 * MIB
+
+
+def _threshold_crossed(point):
+    """Name of the threshold a density point crossed, None if there is none"""
+    if point["host_available_mib"] < CONFIG.density_min_free_memory:
+        return "memory"
+    if point["cpu_percent"] > CONFIG.density_max_cpu:
+        return "cpu"
+    if point["boot_seconds"] > CONFIG.density_max_boot_time:
+        return "boot_time"
+    return None
+
+
+@pytest.mark.performance
+def test_microvm_density(test_session_root_path):
+    """
+    Test microvm density:
+
+    1) Launch idle initrd vms (1 vcpu, 256MiB, no net) one after another,
+    and keep them running.
+    2) After each launch, get its boot time, the host available memory,
+    the host cpu usage since the previous launch, and the memory of the
+    new vmm without its guest memory (MemorySupervisor) and with it (RSS).
+    3) Stop at DENSITY_MAX_VMS, when a launch fails, or when available
+    memory, cpu usage or boot time crosses its DENSITY_* threshold.
+    4) Report the curve versus vm count, with the host memory used per vm,
+    to density.json in the session directory.
+    """
+    # pylint: disable=redefined-outer-name
+    vmconfig = CONFIG.get_microvm_by_tag("initrd")
+    vms = list()
+    points = list()
+    stopped_by = "max_vms"
+    cpu_usage = CpuUsage()
+    available_base = host_meminfo()["MemAvailable"]
+    try:
+        while len(vms) < CONFIG.density_max_vms:
+            test_vm = MicroVM(test_session_root_path, "microvm_density", str(uuid.uuid4()),
+                              vmconfig=vmconfig, vcpus=DENSITY_VCPUS, memsize=DENSITY_MEMSIZE)
+            test_vm.basic_config(vnetnums=0)
+            vms.append(test_vm)
+            begin = time.time()
+            try:
+                test_vm.launch()
+            # the density is reached when the host can not launch more
+            # pylint: disable=broad-except
+            except Exception as err:
+                logging.warning("density: launch of vm %d failed: %s", len(vms), err)
+                stopped_by = "launch_failed"
+                break
+            boot_seconds = time.time() - begin
+            available = host_meminfo()["MemAvailable"]
+            point = {"vms": len(vms),
+                     "boot_seconds": boot_seconds,
+                     "cpu_percent": cpu_usage.sample(),
+                     "host_available_mib": available / 1024,
+                     "host_used_mib_per_vm": (available_base - available) / 1024 / len(vms),
+                     "vmm_overhead_kib": MemorySupervisor(test_vm.pid).get_memory_usage(),
+                     "vmm_rss_kib": process_rss(test_vm.pid)}
+            logging.debug("density: %s", point)
+            points.append(point)
+            crossed = _threshold_crossed(point)
+            if crossed is not None:
+                stopped_by = crossed
+                break
+    finally:
+        teardown = fleet.teardown(vms)
+
+    assert points, "no vm launched"
+    overheads = [point["vmm_overhead_kib"] for point in points
+                 if point["vmm_overhead_kib"] is not None]
+    results = {"max_vms": len(points),
+               "stopped_by": stopped_by,
+               "host_used_mib_per_vm": points[-1]["host_used_mib_per_vm"],
+               "boot_seconds": sample_summary([point["boot_seconds"] for point in points]),
+               "vmm_overhead_kib": sample_summary(overheads) if overheads else None,
+               "teardown": teardown,
+               "curve": points}
+    logging.debug("density: %d vms, stopped by %s", len(points), stopped_by)
+    write_results("density", "initrd_%dvcpu_%dmib" % (DENSITY_VCPUS, DENSITY_MEMSIZE // MIB),
+                  results)
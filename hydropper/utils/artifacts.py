@@ -0,0 +1,164 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""content-addressed cache of helper tool builds"""
+
+import os
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from subprocess import run
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import CONFIG
+from utils.utils_logging import TestLog
+
+LOG = TestLog.get_global_log()
+
+
+class Artifact():
+    """
+    A helper tool built from fetched sources.
+
+    Args:
+        name: tool name, also the name of the built binary
+        fetch: shell command getting the sources in {src}
+        build: shell command run in {src}, writing the binary to {out}
+    """
+
+    def __init__(self, name, fetch, build):
+        self.name = name
+        self.fetch = fetch
+        self.build = build
+
+
+ARTIFACTS = {
+    "nc-vsock": Artifact(
+        "nc-vsock",
+        fetch="wget https://gitee.com/EulerRobot/nc-vsock/raw/master/nc-vsock.c -O {src}/nc-vsock.c",
+        build="gcc nc-vsock.c -o {out} -O3"),
+    "psyscall": Artifact(
+        "psyscall",
+        fetch="git clone --depth 1 https://gitee.com/EulerRobot/psyscall.git {src}",
+        build="make && cp psyscall {out}"),
+}
+
+
+def tree_hash(path, extra=""):
+    """sha256 of the files under path (not .git) and of extra"""
+    digest = hashlib.sha256(extra.encode())
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(name for name in dirs if name != ".git")
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode() + b"\0")
+            with open(file_path, "rb") as src_file:
+                digest.update(hashlib.sha256(src_file.read()).digest())
+    return digest.hexdigest()
+
+
+class ArtifactCache():
+    """
+    Build helper tools once, and reuse them from any later session.
+
+    The sources of a tool are fetched once into sources/<name>. The binary
+    is stored as bin/<hash>/<name>, hash covering the sources and the build
+    command, so a change of either builds it again. Processes sharing the
+    cache, such as xdist workers, build a tool only once.
+
+    Args:
+        root: cache directory
+        artifacts: {name: Artifact} the cache can build
+    """
+
+    def __init__(self, root=CONFIG.artifact_cache_dir, artifacts=None):
+        self.root = root
+        self.artifacts = ARTIFACTS if artifacts is None else artifacts
+        self.lock = threading.Lock()
+        self.builds = dict()
+        self.executor = None
+
+    @contextmanager
+    def _file_lock(self, name):
+        lock_dir = os.path.join(self.root, "locks")
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, name + ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def source(self, name):
+        """Directory of the sources of a tool, fetched if they are not cached"""
+        src = os.path.join(self.root, "sources", name)
+        if os.path.exists(src):
+            return src
+        os.makedirs(os.path.dirname(src), exist_ok=True)
+        tmp_src = tempfile.mkdtemp(prefix=name + ".", dir=os.path.dirname(src))
+        try:
+            run(self.artifacts[name].fetch.format(src=tmp_src), shell=True, check=True)
+            os.rename(tmp_src, src)
+        finally:
+            shutil.rmtree(tmp_src, ignore_errors=True)
+        return src
+
+    def build(self, name):
+        """
+        Path of the binary of a tool, built if it is not cached.
+
+        Raises:
+            CalledProcessError: fetching or building failed.
+        """
+        artifact = self.artifacts[name]
+        with self._file_lock(name):
+            src = self.source(name)
+            key = tree_hash(src, artifact.build)
+            out = os.path.join(self.root, "bin", key, name)
+            if os.path.exists(out):
+                LOG.debug("%s found in cache %s" % (name, out))
+                return out
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            # build in a copy, the cached sources stay clean for the hash
+            build_dir = tempfile.mkdtemp(prefix=name + ".", dir=os.path.dirname(out))
+            try:
+                shutil.rmtree(build_dir)
+                shutil.copytree(src, build_dir, symlinks=True)
+                tmp_out = out + ".tmp"
+                run(artifact.build.format(out=tmp_out), shell=True, check=True, cwd=build_dir)
+                os.rename(tmp_out, out)
+            finally:
+                shutil.rmtree(build_dir, ignore_errors=True)
+            LOG.debug("%s built in cache %s" % (name, out))
+            return out
+
+    def prebuild(self, names=None):
+        """Start building tools in parallel, in background"""
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(thread_name_prefix="artifact")
+            for name in (self.artifacts if names is None else names):
+                if name not in self.builds:
+                    self.builds[name] = self.executor.submit(self.build, name)
+
+    def get(self, name):
+        """Path of the binary of a tool, waiting for its prebuild if it runs"""
+        self.prebuild([name])
+        return self.builds[name].result()
+
+    def stop(self):
+        """Wait for the builds in progress"""
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
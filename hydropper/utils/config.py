@@ -20,6 +20,19 @@ from utils.decorators import Singleton
 CONFIG_FILE = "../config/config.ini"
 
 
+def xdist_worker():
+    """
+    Get the worker of this process when pytest-xdist runs the tests.
+
+    Returns:
+        (worker_index, worker_count), (0, 1) without xdist.
+    """
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "")
+    if not worker.startswith("gw"):
+        return 0, 1
+    return int(worker[2:]), int(os.environ.get("PYTEST_XDIST_WORKER_COUNT", "1"))
+
+
 class ParserConfig(Singleton):
     """Global settings class"""
 
@@ -30,6 +43,8 @@ class ParserConfig(Singleton):
         Args:
             cfg_file: set the global config file
         """
+        # Each xdist worker gets a disjoint slice of ips, cids, taps and ports
+        self.worker_index, self.worker_count = xdist_worker()
         self.conf = configparser.ConfigParser()
         _tempfile = os.path.join(os.path.dirname(__file__), cfg_file)
         self.conf.read(_tempfile)
@@ -67,7 +82,37 @@ class ParserConfig(Singleton):
         self.timeout_factor = int(self.get_option("env.params", "TIMEOUT_FACTOR", "1"))
         self.delete_test_session = bool(self.get_option("env.params", "DELETE_TEST_SESSION",
                                                         "false") == "true")
+        self.artifact_cache_dir = self.get_option("env.params", "ARTIFACT_CACHE_DIR",
+                                                  os.path.join(self.test_dir, "hydropper_artifacts"))
         self.concurrent_quantity = int(self.get_option("env.params", "CONCURRENT_QUANTITY", "10"))
+        self.warm_pool_size = int(self.get_option("env.params", "WARM_POOL_SIZE", "1"))
+        self.warm_pool_configs = [config.strip() for config in
+                                  self.get_option("env.params", "WARM_POOL_CONFIGS",
+                                                  "rootfs,initrd").split(",") if config.strip()]
+        self.warm_pool_freeze = bool(self.get_option("env.params", "WARM_POOL_FREEZE",
+                                                     "false") == "true")
+        self.ready_mode = self.get_option("env.params", "READY_MODE", "serial")
+        self.ready_vsock_port = int(self.get_option("env.params", "READY_VSOCK_PORT", "10240"))
+        self.guest_agent = bool(self.get_option("env.params", "GUEST_AGENT", "false") == "true")
+        self.guest_agent_port = int(self.get_option("env.params", "GUEST_AGENT_PORT", "10250"))
+        self.console_engine = self.get_option("env.params", "CONSOLE_ENGINE", "aexpect")
+        self.serial_capture = bool(self.get_option("env.params", "SERIAL_CAPTURE", "true") == "true")
+        self.console_ring_size = int(self.get_option("env.params", "CONSOLE_RING_SIZE",
+                                                     str(256 * 1024)))
+        self.serial_capture_buffer = int(self.get_option("env.params", "SERIAL_CAPTURE_BUFFER",
+                                                         str(4 * 1024 * 1024)))
+        self.serial_capture_max_bytes = int(self.get_option("env.params",
+                                                            "SERIAL_CAPTURE_MAX_BYTES",
+                                                            str(10 * 1024 * 1024)))
+        self.serial_capture_backups = int(self.get_option("env.params", "SERIAL_CAPTURE_BACKUPS",
+                                                          "10"))
+        self.serial_capture_compress = bool(self.get_option("env.params",
+                                                            "SERIAL_CAPTURE_COMPRESS",
+                                                            "false") == "true")
+        self.ssh_control_master = bool(self.get_option("env.params", "SSH_CONTROL_MASTER",
+                                                       "true") == "true")
+        self.console_queue_timeout = int(self.get_option("env.params", "CONSOLE_QUEUE_TIMEOUT",
+                                                         "120")) * self.timeout_factor
 
         # parser stratovirt config
         self.stratovirt_microvm_bin = self.get_option("stratovirt.params", "STRATOVIRT_MICROVM_BINARY", None)
@@ -80,6 +125,7 @@ class ParserConfig(Singleton):
         self.stratovirt_vmlinux = self.get_option("stratovirt.params", "STRATOVIRT_VMLINUX", None)
         self.stratovirt_rootfs = self.get_option("stratovirt.params", "STRATOVIRT_ROOTFS", None)
         self.stratovirt_initrd = self.get_option("stratovirt.params", "STRATOVIRT_INITRD", None)
+        self.rootfs_cow = bool(self.get_option("stratovirt.params", "ROOTFS_COW", "true") == "true")
         self.stratovirt_use_config_file = bool(self.get_option("stratovirt.params", "STRATOVIRT_USE_CONFIG_FILE",
                                                                "false") == "true")
         self.stratovirt_feature = self.get_option("stratovirt.params", "STRATOVIRT_FEATURE", "mmio")
@@ -88,6 +134,22 @@ class ParserConfig(Singleton):
         self.rust_san_check = bool(self.get_option("stratovirt.params", "RUST_SAN_CHECK",
                                                    "false") == "true")
 
+        # parser performance params
+        self.boottime_samples = int(self.get_option("performance.params", "BOOTTIME_SAMPLES", "10"))
+        self.boottime_baseline = self.get_option("performance.params", "BOOTTIME_BASELINE",
+                                                 "config/test_config/perf_baseline/microvm_boottime.json")
+        self.boottime_tolerance = float(self.get_option("performance.params", "BOOTTIME_TOLERANCE", "0.2"))
+        self.perf_update_baseline = bool(self.get_option("performance.params", "UPDATE_BASELINE",
+                                                         "false") == "true")
+        self.density_max_vms = int(self.get_option("performance.params", "DENSITY_MAX_VMS", "256"))
+        self.density_min_free_memory = int(self.get_option("performance.params",
+                                                           "DENSITY_MIN_FREE_MEMORY", "1024"))
+        self.density_max_cpu = float(self.get_option("performance.params", "DENSITY_MAX_CPU", "90"))
+        self.density_max_boot_time = float(self.get_option("performance.params",
+                                                           "DENSITY_MAX_BOOT_TIME", "10"))
+        self.churn_concurrency = int(self.get_option("performance.params", "CHURN_CONCURRENCY", "8"))
+        self.churn_duration = float(self.get_option("performance.params", "CHURN_DURATION", "60"))
+
 
         # parser network params
         self.bridge_name = self.get_option("network.params", "BRIDGE_NAME", "stratobr0")
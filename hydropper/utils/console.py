@@ -0,0 +1,475 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""native serial console engine"""
+
+import re
+import time
+import codecs
+import select
+import socket
+import selectors
+from aexpect.exceptions import ExpectError
+from aexpect.exceptions import ExpectTimeoutError
+from aexpect.exceptions import ExpectProcessTerminatedError
+from aexpect.exceptions import ShellError
+from aexpect.exceptions import ShellCmdError
+from aexpect.exceptions import ShellStatusError
+from aexpect.exceptions import ShellTimeoutError
+from aexpect.exceptions import ShellProcessTerminatedError
+from aexpect.utils import astring
+from utils.utils_logging import TestLog
+
+LOG = TestLog.get_global_log()
+RECV_SIZE = 64 * 1024
+# Seconds of quiet ending read_nonblocking() without internal_timeout
+QUIET_TIMEOUT = 0.1
+# Seconds of quiet draining the console before a command
+DRAIN_TIMEOUT = 0.01
+# Seconds of quiet confirming a line that looks like the prompt but is
+# not the prompt seen last, such as output ending with "$"
+PROMPT_QUIET = 0.5
+STATUS_TIMEOUT = 30
+RE_STATUS = re.compile(r"^\d+$")
+# status of a console whose socket was closed by the vm
+STATUS_CLOSED = -1
+
+
+def _last_nonempty_line(text):
+    """Last line of text with something else than spaces, scanning from the end"""
+    end = len(text)
+    while end > 0:
+        start = text.rfind("\n", 0, end) + 1
+        line = text[start:end]
+        if line.strip():
+            return line
+        end = start - 1
+    return ""
+
+
+class NativeConsole():
+    """
+    Serial console of a vm, talking to its unix socket directly.
+
+    It replaces aexpect.ShellSession over "nc -U": no helper process is
+    spawned, the socket is read without blocking as soon as selectors
+    tells data arrived, and prompts are matched with precompiled patterns
+    on the lines the new data touched only. It has the ShellSession
+    methods ConsoleManager and ConsoleSession use, and raises the same
+    aexpect exceptions. Line ends are returned as "\\n".
+
+    Args:
+        address: path of the console unix socket
+        prompt: pattern of the shell prompt
+        status_test_command: command printing the status of the last one
+        output_func: called with each line read, such as a log function
+        linesep: line separator sent by sendline()
+        encoding: encoding of the console
+    """
+
+    def __init__(self, address, prompt=r"[\#\$]", status_test_command="echo $?",
+                 output_func=None, linesep="\n", encoding="utf-8"):
+        self.address = address
+        self.prompt = prompt
+        self.status_test_command = status_test_command
+        self.output_func = output_func
+        self.linesep = linesep
+        self.encoding = encoding
+        self._decoder = codecs.getincrementaldecoder(encoding)("replace")
+        # a "\r" ending the data read may be the first half of "\r\n"
+        self._held = ""
+        self._patterns = dict()
+        # the prompt line printed after the last command, such as
+        # "[root@localhost ~]# "
+        self._prompt_text = None
+        # read from the socket, not given to a reader yet
+        self._pending = ""
+        # partial line kept for output_func
+        self._line = ""
+        self._eof = False
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(address)
+        except OSError:
+            self.sock.close()
+            raise
+        self.sock.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+
+    def __repr__(self):
+        return "native console <%s>" % self.address
+
+    def _compile(self, patterns):
+        """Compiled patterns, cached as a serial console reuses a few"""
+        key = tuple(patterns)
+        if key not in self._patterns:
+            self._patterns[key] = [re.compile(pattern) if pattern else None
+                                   for pattern in patterns]
+        return self._patterns[key]
+
+    def _decode(self, data):
+        text = self._held + self._decoder.decode(data)
+        self._held = ""
+        if text.endswith("\r"):
+            text, self._held = text[:-1], "\r"
+        text = text.replace("\r\n", "\n")
+        if self.output_func is not None:
+            lines = (self._line + text).split("\n")
+            self._line = lines.pop()
+            for line in lines:
+                self.output_func(line.rstrip("\r"))
+        return text
+
+    def _recv(self, timeout):
+        """
+        Wait up to timeout for data and read all there is.
+
+        Returns:
+            The text read, "" if timeout expired or the socket is closed.
+        """
+        if self._eof:
+            return ""
+        if not self.selector.select(timeout):
+            return ""
+        chunks = list()
+        while True:
+            try:
+                data = self.sock.recv(RECV_SIZE)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                data = b""
+            if not data:
+                self._eof = True
+                break
+            chunks.append(data)
+        return self._decode(b"".join(chunks))
+
+    def _take_pending(self):
+        pending, self._pending = self._pending, ""
+        return pending
+
+    def is_alive(self):
+        """Return True if the vm did not close the console"""
+        return self.sock is not None and not self._eof
+
+    def get_status(self):
+        """Status of a closed console, None while it is alive"""
+        return None if self.is_alive() else STATUS_CLOSED
+
+    def close(self):
+        """Close the console socket"""
+        if self.sock is None:
+            return
+        self.selector.close()
+        self.sock.close()
+        self.sock = None
+        if self.output_func is not None and self._line:
+            self.output_func(self._line)
+            self._line = ""
+
+    def set_status_test_command(self, status_test_command):
+        """Set the command printing the status of the last one"""
+        self.status_test_command = status_test_command
+
+    def set_prompt(self, prompt):
+        """Set the pattern of the shell prompt"""
+        self.prompt = prompt
+        self._prompt_text = None
+
+    def set_linesep(self, linesep):
+        """Set the line separator sent by sendline()"""
+        self.linesep = linesep
+
+    def send(self, cont=""):
+        """Send a string to the console"""
+        data = cont.encode(self.encoding)
+        while data:
+            try:
+                sent = self.sock.send(data)
+            except (BlockingIOError, InterruptedError):
+                select.select([], [self.sock], [], 1)
+                continue
+            except OSError:
+                LOG.warning("Failed to send '%s'", cont)
+                return
+            data = data[sent:]
+
+    def sendline(self, cont=""):
+        """Send a string followed by the line separator"""
+        self.send(cont + self.linesep)
+
+    def sendcontrol(self, char):
+        """Send a control character, such as "c" for ctrl-c"""
+        self.send(chr(ord(char.lower()) & 0x1f))
+
+    def send_ctrl(self, control_str=""):
+        """Send a control string, such as "^C" """
+        if control_str.startswith("^") and len(control_str) == 2:
+            self.sendcontrol(control_str[1])
+        else:
+            self.send(control_str)
+
+    def read_nonblocking(self, internal_timeout=None, timeout=None):
+        """
+        Read until there is nothing to read for internal_timeout seconds,
+        or until timeout expires.
+        """
+        quiet = QUIET_TIMEOUT if internal_timeout is None else internal_timeout
+        end_time = None if not timeout else time.monotonic() + timeout
+        output = self._take_pending()
+        while self.is_alive():
+            wait = quiet if end_time is None else min(quiet, max(0, end_time - time.monotonic()))
+            data = self._recv(wait)
+            if not data:
+                break
+            output += data
+            if end_time is not None and time.monotonic() > end_time:
+                break
+        return output
+
+    def _read_until(self, patterns, match, timeout, print_func):
+        """
+        Read until match(output, start of the new data) gives an index.
+
+        Returns:
+            A tuple (index, output).
+        """
+        output = self._take_pending()
+        scanned = 0
+        end_time = time.monotonic() + timeout
+        data = output
+        while True:
+            if data:
+                if print_func is not None:
+                    for line in data.splitlines():
+                        print_func(line)
+                index = match(output, scanned)
+                if index is not None:
+                    return index, output
+                # matches only start on the line the next data touches
+                scanned = output.rfind("\n") + 1
+            remaining = end_time - time.monotonic()
+            if not self.is_alive():
+                raise ExpectProcessTerminatedError(patterns, self.get_status(), output)
+            if remaining <= 0:
+                raise ExpectTimeoutError(patterns, output)
+            data = self._recv(remaining)
+            output += data
+
+    def read_until_output_matches(self, patterns, filter_func=lambda x: x, timeout=60.0,
+                                  internal_timeout=None, print_func=None):
+        """
+        Read until filter_func(output) matches one of patterns.
+
+        Returns:
+            A tuple (index of the pattern, output).
+        """
+        # pylint: disable=unused-argument
+        compiled = self._compile(patterns)
+
+        def _match(output, _):
+            text = filter_func(output)
+            for index, pattern in enumerate(compiled):
+                if pattern is not None and pattern.search(text):
+                    return index
+            return None
+        return self._read_until(patterns, _match, timeout, print_func)
+
+    def read_until_last_line_matches(self, patterns, timeout=60.0, internal_timeout=None,
+                                     print_func=None):
+        """
+        Read until the last non-empty line matches one of patterns.
+
+        Returns:
+            A tuple (index of the pattern, output).
+        """
+        # pylint: disable=unused-argument
+        compiled = self._compile(patterns)
+
+        def _match(output, _):
+            line = _last_nonempty_line(output)
+            for index, pattern in enumerate(compiled):
+                if pattern is not None and pattern.search(line):
+                    return index
+            return None
+        return self._read_until(patterns, _match, timeout, print_func)
+
+    def read_until_any_line_matches(self, patterns, timeout=60.0, internal_timeout=None,
+                                    print_func=None):
+        """
+        Read until any line matches one of patterns, the last pattern
+        first like aexpect.
+
+        Returns:
+            A tuple (index of the pattern, output).
+        """
+        # pylint: disable=unused-argument
+        compiled = self._compile(patterns)
+
+        def _match(output, scanned):
+            lines = output[scanned:].splitlines()
+            for index in reversed(range(len(compiled))):
+                if compiled[index] is None:
+                    continue
+                if any(compiled[index].search(line) for line in lines):
+                    return index
+            return None
+        return self._read_until(patterns, _match, timeout, print_func)
+
+    def read_up_to_prompt(self, timeout=60.0, internal_timeout=None, print_func=None):
+        """Read until the last non-empty line matches the prompt"""
+        return self.read_until_last_line_matches([self.prompt], timeout, internal_timeout,
+                                                 print_func)[1]
+
+    def _read_prompt(self, timeout, print_func):
+        """
+        Read the output of a command up to the prompt, the line printed
+        after the echo of the command.
+
+        The line ends the output at once if it ends with the prompt seen
+        after the last command. A line only matching the prompt pattern at
+        its end, such as output ending with "$" or a prompt after a cd,
+        ends it after PROMPT_QUIET seconds without more data, and becomes
+        the prompt seen.
+        """
+        prompt = self._compile([r"(?:%s)\s*$" % self.prompt])[0]
+        output = self._take_pending()
+        end_time = time.monotonic() + timeout
+        data = output
+        # (time, line) of a line looking like the prompt
+        candidate = None
+        while True:
+            if data:
+                if print_func is not None:
+                    for line in data.splitlines():
+                        print_func(line)
+                candidate = None
+                last = output.rfind("\n")
+                line = output[last + 1:] if last >= 0 else ""
+                if self._prompt_text and line.endswith(self._prompt_text):
+                    return output
+                if line.strip() and prompt.search(line):
+                    candidate = (time.monotonic(), line)
+            now = time.monotonic()
+            if candidate is not None and now - candidate[0] >= PROMPT_QUIET:
+                self._prompt_text = candidate[1]
+                return output
+            if not self.is_alive():
+                raise ExpectProcessTerminatedError([self.prompt], self.get_status(), output)
+            if now >= end_time:
+                raise ExpectTimeoutError([self.prompt], output)
+            wait = end_time - now
+            if candidate is not None:
+                wait = min(wait, candidate[0] + PROMPT_QUIET - now)
+            data = self._recv(wait)
+            output += data
+
+    @staticmethod
+    def remove_command_echo(cont, cmd):
+        """Remove the echo of cmd by the terminal"""
+        if cont and cont.splitlines()[0] == cmd:
+            cont = "".join(cont.splitlines(True)[1:])
+        return cont
+
+    @staticmethod
+    def remove_last_nonempty_line(cont):
+        """Remove the last non-empty line and the empty lines after it"""
+        return "".join(cont.rstrip().splitlines(True)[:-1])
+
+    def is_responsive(self, timeout=5.0):
+        """Return True if the console answers a new line"""
+        self.read_nonblocking(DRAIN_TIMEOUT, timeout)
+        self.sendline()
+        data = self._recv(timeout)
+        self._pending += data
+        return bool(data.strip())
+
+    def cmd_output(self, cmd, timeout=60, internal_timeout=None, print_func=None,
+                   safe=False, strip_console_codes=False):
+        """
+        Send a command and return its output.
+
+        Raises:
+            ShellTimeoutError: the prompt is not back in timeout seconds
+            ShellProcessTerminatedError: the console is closed
+        """
+        # pylint: disable=unused-argument
+        LOG.debug("Sending command: %s", cmd)
+        self.read_nonblocking(DRAIN_TIMEOUT, timeout)
+        self.sendline(cmd)
+        try:
+            out = self._read_prompt(timeout, print_func)
+        except ExpectTimeoutError as err:
+            if not safe:
+                raise ShellTimeoutError(cmd, self.remove_command_echo(err.output, cmd))
+            # kernel messages may hide the prompt, ask for it again
+            self.sendline()
+            try:
+                out = err.output + self._read_prompt(timeout, print_func)
+            except ExpectTimeoutError as again:
+                raise ShellTimeoutError(cmd, self.remove_command_echo(err.output + again.output,
+                                                                      cmd))
+        except ExpectProcessTerminatedError as err:
+            raise ShellProcessTerminatedError(cmd, err.status,
+                                              self.remove_command_echo(err.output, cmd))
+        except ExpectError as err:
+            raise ShellError(cmd, self.remove_command_echo(err.output, cmd))
+        if strip_console_codes:
+            out = astring.strip_console_codes(out)
+        return self.remove_last_nonempty_line(self.remove_command_echo(out, cmd))
+
+    def cmd_output_safe(self, cmd, timeout=60, strip_console_codes=False):
+        """cmd_output() sending a new line if the prompt is late"""
+        return self.cmd_output(cmd, timeout, safe=True, strip_console_codes=strip_console_codes)
+
+    def cmd_status_output(self, cmd, timeout=60, internal_timeout=None, print_func=None,
+                          safe=False):
+        """
+        Send a command and return its exit status and output.
+
+        Raises:
+            ShellStatusError: the status can not be read
+        """
+        out = self.cmd_output(cmd, timeout, internal_timeout, print_func, safe)
+        try:
+            status = self.cmd_output(self.status_test_command, STATUS_TIMEOUT,
+                                     internal_timeout, print_func, safe)
+        except ShellError:
+            raise ShellStatusError(cmd, out)
+        for line in astring.strip_console_codes(status).splitlines():
+            if RE_STATUS.match(line.strip()):
+                return int(line.strip()), out
+        raise ShellStatusError(cmd, out)
+
+    def cmd_status(self, cmd, timeout=60, internal_timeout=None, print_func=None, safe=False):
+        """Send a command and return its exit status"""
+        return self.cmd_status_output(cmd, timeout, internal_timeout, print_func, safe)[0]
+
+    def cmd(self, cmd, timeout=60, internal_timeout=None, print_func=None, ok_status=None,
+            ignore_all_errors=False):
+        """
+        Send a command and return its output.
+
+        Raises:
+            ShellCmdError: the exit status is not in ok_status, default [0]
+        """
+        ok_status = [0] if ok_status is None else ok_status
+        try:
+            status, output = self.cmd_status_output(cmd, timeout, internal_timeout, print_func)
+            if status not in ok_status:
+                raise ShellCmdError(cmd, status, output)
+            return output
+        except ShellError:
+            if ignore_all_errors:
+                return None
+            raise
@@ -0,0 +1,142 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""bounded console history of vms"""
+
+import os
+import re
+import time
+import threading
+from collections import deque
+from utils.config import CONFIG
+
+# bytes a line costs besides its text: timestamp, tuple and deque slot
+LINE_OVERHEAD = 64
+
+
+def format_line(timestamp, line):
+    """A history line as it is dumped, with its local time to the millisecond"""
+    return "%s.%03d %s" % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)),
+                           int(timestamp * 1000) % 1000, line)
+
+
+class ConsoleRing():
+    """
+    The last size bytes of console output of a vm, with the time each
+    line was read. Older lines are evicted, so the memory used is bounded
+    whatever the guest prints.
+
+    Args:
+        name: name of the vm, used in dump file names
+        size: bytes of history kept
+    """
+
+    def __init__(self, name, size=None):
+        self.name = name
+        self.size = CONFIG.console_ring_size if size is None else size
+        self.lock = threading.Lock()
+        self.lines = deque()
+        self.used = 0
+        self.evicted = 0
+        self.created = time.time()
+        self.last_time = None
+        # the vm is shut down, the history is kept until the next prune
+        self.stopped = False
+
+    def __len__(self):
+        return len(self.lines)
+
+    def append(self, line):
+        """Add a line read now, evicting the oldest ones over size"""
+        now = time.time()
+        cost = len(line) + LINE_OVERHEAD
+        with self.lock:
+            self.lines.append((now, line))
+            self.used += cost
+            self.last_time = now
+            while self.used > self.size and len(self.lines) > 1:
+                _, old = self.lines.popleft()
+                self.used -= len(old) + LINE_OVERHEAD
+                self.evicted += 1
+
+    def history(self, pattern=None, since=None, until=None):
+        """
+        Get the lines kept, oldest first.
+
+        Args:
+            pattern: regular expression searched in the lines, all lines if None
+            since: only lines read at or after this time (seconds since epoch)
+            until: only lines read at or before this time
+
+        Returns:
+            [(timestamp, line)]
+        """
+        regex = re.compile(pattern) if isinstance(pattern, str) else pattern
+        with self.lock:
+            lines = list(self.lines)
+        return [(timestamp, line) for timestamp, line in lines
+                if (since is None or timestamp >= since)
+                and (until is None or timestamp <= until)
+                and (regex is None or regex.search(line))]
+
+    def active_since(self, since):
+        """True if the ring was created or got a line at or after since"""
+        return self.created >= since or (self.last_time is not None and self.last_time >= since)
+
+    def dump(self, path):
+        """Write the history to path, return the number of lines written"""
+        lines = self.history()
+        with open(path, "w") as dump_file:
+            if self.evicted:
+                dump_file.write("[hydropper: %d older lines evicted]\n" % self.evicted)
+            for timestamp, line in lines:
+                dump_file.write(format_line(timestamp, line) + "\n")
+        return len(lines)
+
+
+class ConsoleRings():
+    """Rings of the vms launched and not yet pruned"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rings = dict()
+
+    def track(self, ring):
+        """Keep ring until it is stopped and pruned"""
+        with self.lock:
+            self.rings[id(ring)] = ring
+
+    def prune(self):
+        """Forget the rings of vms shut down"""
+        with self.lock:
+            for key in [key for key, ring in self.rings.items() if ring.stopped]:
+                del self.rings[key]
+
+    def dump(self, directory, since):
+        """
+        Dump the rings active since a time, such as the start of a failed test.
+
+        Returns:
+            The paths of the dump files.
+        """
+        with self.lock:
+            rings = [ring for ring in self.rings.values() if ring.active_since(since)]
+        paths = list()
+        for ring in rings:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            path = os.path.join(directory, "%s_console.log" % ring.name)
+            ring.dump(path)
+            paths.append(path)
+        return paths
+
+
+CONSOLE_RINGS = ConsoleRings()
@@ -0,0 +1,162 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""fake serial console of a logged in guest, used to test the harness without a hypervisor"""
+
+import time
+import socket
+import threading
+import subprocess
+import socketserver
+from utils import utils_common
+
+STATUS_TEST_COMMAND = "echo $?"
+
+
+class _ConsoleRequestHandler(socketserver.BaseRequestHandler):
+    """One console connection, a shell at its prompt"""
+
+    def setup(self):
+        self.fake = self.server.fake
+        self.status = 0
+        self.fake.add_client(self)
+
+    def finish(self):
+        self.fake.del_client(self)
+
+    def send(self, text):
+        """Send text like a tty: "\\n" becomes "\\r\\n", byte by byte if trickle is set"""
+        data = text.replace("\n", "\r\n").encode("utf-8")
+        if not self.fake.trickle:
+            self.request.sendall(data)
+            return
+        for index in range(len(data)):
+            self.request.sendall(data[index:index + 1])
+            time.sleep(0.0002)
+
+    def run(self, line):
+        """Run a line of the shell, streaming its output"""
+        if line == STATUS_TEST_COMMAND:
+            self.send("%d\n" % self.status)
+            return
+        proc = subprocess.Popen(["sh", "-c", line], stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        while True:
+            data = proc.stdout.read1(4096)
+            if not data:
+                break
+            self.send(data.decode("utf-8", "replace"))
+        proc.stdout.close()
+        self.status = proc.wait()
+
+    def handle(self):
+        buf = b""
+        while True:
+            try:
+                data = self.request.recv(4096)
+            except OSError:
+                return
+            if not data:
+                return
+            buf += data
+            try:
+                while b"\n" in buf:
+                    raw, buf = buf.split(b"\n", 1)
+                    line = raw.decode("utf-8", "replace").rstrip("\r")
+                    self.send(line + "\n")
+                    if line:
+                        with self.fake.state_lock:
+                            self.fake.commands += 1
+                        time.sleep(self.fake.delay)
+                        self.run(line)
+                    self.send(self.fake.prompt)
+            except OSError:
+                return
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class FakeConsoleServer():
+    """
+    A stand-in for the serial console socket of a vm.
+
+    Each connection is a shell at its prompt: lines sent are echoed, run
+    by a host sh and their output streamed back with tty line ends, then
+    the prompt is printed. The status test command prints the status of
+    the last line.
+
+    Args:
+        address: unix socket path
+        prompt: shell prompt printed after each line
+        delay: seconds to wait before running a line
+        trickle: send the output byte by byte, to split lines and prompts
+    """
+
+    def __init__(self, address, prompt="[root@localhost ~]# ", delay=0, trickle=False):
+        self.address = address
+        self.prompt = prompt
+        self.delay = delay
+        self.trickle = trickle
+        self.commands = 0
+        self.state_lock = threading.Lock()
+        self._clients = set()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """Listen and serve in a thread, return the socket path"""
+        utils_common.remove_existing_file(self.address)
+        self._server = _UnixServer(self.address, _ConsoleRequestHandler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="fake-console", daemon=True)
+        self._thread.start()
+        return self.address
+
+    def close_clients(self):
+        """Close all connections, like a vm exiting"""
+        with self.state_lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def stop(self):
+        """Stop serving and close all connections"""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self.close_clients()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        utils_common.remove_existing_file(self.address)
+
+    def add_client(self, client):
+        """Called by a new connection"""
+        with self.state_lock:
+            self._clients.add(client)
+
+    def del_client(self, client):
+        """Called by a closed connection"""
+        with self.state_lock:
+            self._clients.discard(client)
@@ -110,6 +110,8 @@ class NoConsoleError(ConsoleError):
 class ConsoleBusyError(ConsoleError):
     """Console Busy Error"""
     def __str__(self):
+        if self.args:
+            return "Console is in use (%s)" % self.args[0]
         return "Console is in use"
 
 # qmp error
@@ -131,3 +133,19 @@ class QMPTimeoutError(QMPError):
 
 class VMLifeError(Exception):
     """Vmlife error exception"""
+
+
+class BatchError(Exception):
+    """A command of a batch returned no status"""
+    def __init__(self, cmd, output):
+        Exception.__init__(self, cmd, output)
+        self.cmd = cmd
+        self.output = output
+
+    def __str__(self):
+        return ("Batch command %r returned no status    (output: %r)" %
+                (self.cmd, self.output))
+
+
+class GuestAgentError(Exception):
+    """Guest agent exception"""
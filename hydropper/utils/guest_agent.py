@@ -0,0 +1,216 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""client of the guest agent"""
+
+import time
+import json
+import base64
+import socket
+import struct
+import threading
+from utils.exception import GuestAgentError
+from utils.utils_logging import TestLog
+
+LOG = TestLog.get_global_log()
+HEADER = struct.Struct(">I")
+MAX_FRAME = 64 * 1024 * 1024
+# Seconds added to the exec timeout to wait for the status
+EXEC_MARGIN = 5
+
+
+class GuestAgent():
+    """
+    Talk to guest/hydropper-agent.py, length prefixed json over vsock.
+
+    Requests of a connection are answered in order, so a lock keeps one
+    request in flight. Use a GuestAgent per thread for parallel requests.
+
+    Args:
+        address: (cid, port) of the agent, or a unix socket path
+        name: name of the vm in logs
+        timeout: seconds to wait for an answer
+    """
+
+    def __init__(self, address, name="guest", timeout=30):
+        self.address = address
+        self.name = name
+        self.timeout = timeout
+        self.sock = None
+        self.lock = threading.Lock()
+        self.next_id = 0
+
+    def connect(self, timeout=None):
+        """
+        Connect to the agent, retrying until timeout as it may still be
+        starting in the guest.
+        """
+        deadline = time.time() + (self.timeout if timeout is None else timeout)
+        interval = 0.05
+        while True:
+            if isinstance(self.address, tuple):
+                sock = socket.socket(socket.AF_VSOCK, socket.SOCK_STREAM)
+            else:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(max(0.1, deadline - time.time()))
+                sock.connect(self.address)
+                break
+            except OSError as err:
+                sock.close()
+                if time.time() + interval > deadline:
+                    raise GuestAgentError("can not connect to the agent of %s at %s: %s"
+                                          % (self.name, self.address, err))
+                time.sleep(interval)
+                interval = min(interval * 2, 0.5)
+        sock.settimeout(self.timeout)
+        self.sock = sock
+        LOG.debug("connected to the agent of %s at %s" % (self.name, self.address))
+
+    def close(self):
+        """Close the connection"""
+        with self.lock:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+
+    def _recv_exact(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise GuestAgentError("agent of %s closed the connection" % self.name)
+            data.extend(chunk)
+        return bytes(data)
+
+    def _recv_frame(self):
+        size = HEADER.unpack(self._recv_exact(HEADER.size))[0]
+        if size > MAX_FRAME:
+            raise GuestAgentError("frame of %d bytes from %s is too large" % (size, self.name))
+        return json.loads(self._recv_exact(size).decode("utf-8"))
+
+    def request(self, op, on_stream=None, wait=None, **args):
+        """
+        Send a request and wait for its answer.
+
+        Args:
+            op: exec, read, write, stat or ping
+            on_stream: called with (stream, bytes) for each output chunk
+            wait: seconds to wait for the answer, default self.timeout
+            args: arguments of op
+
+        Returns:
+            The answer, a dict.
+
+        Raises:
+            OSError: the agent failed on a file or a command
+            GuestAgentError: the connection failed or the agent refused it
+        """
+        with self.lock:
+            if self.sock is None:
+                raise GuestAgentError("agent of %s is not connected" % self.name)
+            self.next_id += 1
+            req_id = self.next_id
+            args.update({"id": req_id, "op": op})
+            body = json.dumps(args).encode("utf-8")
+            try:
+                self.sock.settimeout(self.timeout if wait is None else wait)
+                self.sock.sendall(HEADER.pack(len(body)) + body)
+                while True:
+                    resp = self._recv_frame()
+                    if resp.get("id") != req_id:
+                        raise GuestAgentError("agent of %s answered %s to request %s"
+                                              % (self.name, resp.get("id"), req_id))
+                    if "stream" not in resp:
+                        break
+                    if on_stream is not None:
+                        on_stream(resp["stream"], base64.b64decode(resp["data"]))
+            except (OSError, ValueError) as err:
+                # the answer is lost, the next one would be out of step
+                self.sock.close()
+                self.sock = None
+                raise GuestAgentError("%s request to the agent of %s failed: %s"
+                                      % (op, self.name, err))
+        if "error" in resp:
+            if resp.get("errno") is not None:
+                raise OSError(resp["errno"], resp["error"])
+            raise GuestAgentError(resp["error"])
+        return resp
+
+    def ping(self):
+        """Return the agent version"""
+        return self.request("ping")["version"]
+
+    def execute(self, cmd, timeout=None, on_output=None):
+        """
+        Run cmd in a guest shell.
+
+        Args:
+            cmd: shell command
+            timeout: seconds before the agent kills cmd, default self.timeout
+            on_output: called with (stream, bytes) as cmd prints
+
+        Returns:
+            A tuple (status, stdout, stderr), bytes. status is negative
+            if cmd was killed, by a signal or the timeout.
+        """
+        outputs = {"stdout": bytearray(), "stderr": bytearray()}
+
+        def _stream(stream, data):
+            outputs[stream].extend(data)
+            if on_output is not None:
+                on_output(stream, data)
+
+        timeout = self.timeout if timeout is None else timeout
+        resp = self.request("exec", on_stream=_stream, wait=timeout + EXEC_MARGIN,
+                            cmd=cmd, timeout=timeout)
+        return resp["status"], bytes(outputs["stdout"]), bytes(outputs["stderr"])
+
+    def cmd_status_output(self, cmd, timeout=None):
+        """
+        Run cmd like the cmd_status_output of a shell session.
+
+        Returns:
+            A tuple (status, output), output is stdout then stderr, text
+        """
+        status, stdout, stderr = self.execute(cmd, timeout)
+        return status, (stdout + stderr).decode("utf-8", "replace")
+
+    def read_file(self, path):
+        """Read a guest file, as bytes"""
+        return base64.b64decode(self.request("read", path=path)["data"])
+
+    def read_text(self, path):
+        """Read a guest text file, such as a sysfs or procfs one"""
+        return self.read_file(path).decode("utf-8", "replace")
+
+    def write_file(self, path, data, mode=None, append=False):
+        """
+        Write data to a guest file.
+
+        Args:
+            data: bytes or text
+            mode: permission bits to set, such as 0o755
+            append: append to the file instead of replacing it
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return self.request("write", path=path, data=base64.b64encode(data).decode("ascii"),
+                            mode=mode, append=append)["size"]
+
+    def stat(self, path):
+        """
+        Stat a guest path, without following a symlink.
+
+        Returns:
+            {"type": "file", "mode": xx, "size": xx, "uid": xx, "gid": xx, "mtime": xx}
+        """
+        return self.request("stat", path=path)["stat"]
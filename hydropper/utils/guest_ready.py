@@ -0,0 +1,115 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""guest ready notifications over vsock"""
+
+import time
+import socket
+import threading
+from utils.config import CONFIG
+from utils.utils_logging import TestLog
+
+LOG = TestLog.get_global_log()
+# Kernel parameter giving the guest notifier the port to connect to
+READY_PORT_PARAM = "hydropper.ready_port"
+VMADDR_CID_ANY = getattr(socket, "VMADDR_CID_ANY", 0xffffffff)
+
+
+class GuestReadyListener():
+    """
+    Listen on a host vsock port for guests telling they have booted.
+
+    The guest notifier (see the guest directory) connects to the host,
+    cid 2, on the port given by the kernel command line. The peer of the
+    connection is the guest cid, so one listener serves all vms.
+
+    Args:
+        port: vsock port to listen on
+    """
+
+    def __init__(self, port=CONFIG.ready_vsock_port + CONFIG.worker_index):
+        self.port = port
+        self.cond = threading.Condition()
+        self.ready = dict()
+        self.sock = None
+
+    def start(self):
+        """Start listening if it is not, returns False if vsock is unavailable"""
+        with self.cond:
+            if self.sock is not None:
+                return True
+            try:
+                sock = socket.socket(socket.AF_VSOCK, socket.SOCK_STREAM)
+            except (AttributeError, OSError) as err:
+                LOG.warning("vsock is unavailable: %s" % err)
+                return False
+            try:
+                sock.bind((VMADDR_CID_ANY, self.port))
+                sock.listen(128)
+            except OSError as err:
+                LOG.warning("can not listen on vsock port %d: %s" % (self.port, err))
+                sock.close()
+                return False
+            self.sock = sock
+        threading.Thread(target=self._accept_loop, args=(sock,), name="guest-ready",
+                         daemon=True).start()
+        return True
+
+    def _accept_loop(self, sock):
+        while True:
+            try:
+                conn, (cid, _) = sock.accept()
+            except OSError:
+                # the listener is stopped
+                return
+            conn.close()
+            with self.cond:
+                self.ready[cid] = time.time()
+                self.cond.notify_all()
+            LOG.debug("guest cid %d is ready" % cid)
+
+    def wait(self, cid, since, timeout):
+        """
+        Wait for the guest of cid to tell it is ready.
+
+        Args:
+            cid: guest cid
+            since: time.time() from which a notification counts, so the
+            one of an earlier boot with the same cid is ignored
+            timeout: seconds to wait
+
+        Returns:
+            time.time() of the notification, None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while self.ready.get(cid, 0) < since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            return self.ready[cid]
+
+    def stop(self):
+        """Stop listening"""
+        with self.cond:
+            sock, self.sock = self.sock, None
+        if sock is None:
+            return
+        try:
+            # wakes up the accept loop
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+
+GUEST_READY = GuestReadyListener()
@@ -0,0 +1,293 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""asyncio qmp client"""
+
+import asyncio
+import itertools
+import json
+import time
+import threading
+from collections import OrderedDict
+from utils.decorators import Singleton
+from utils.utils_logging import TestLog
+from utils.utils_qmp import QMPEventDispatcher
+from utils.utils_qmp import QMP_LATENCY
+from utils.exception import QMPConnectError
+from utils.exception import QMPCapabilitiesError
+from utils.exception import QMPTimeoutError
+
+LOG = TestLog.get_global_log()
+# Largest single qmp message accepted by the stream reader
+QMP_STREAM_LIMIT = 16 * 1024 * 1024
+
+
+class QMPLoopThread(Singleton):
+    """An event loop running in a daemon thread, shared by sync callers"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+
+    def get_loop(self):
+        """Get the loop, start it on first use"""
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self.loop.run_forever,
+                                               name="qmp-loop", daemon=True)
+                self.thread.start()
+            return self.loop
+
+    def submit(self, coro):
+        """
+        Schedule a coroutine on the loop.
+
+        Returns:
+            A concurrent.futures.Future of the coroutine result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.get_loop())
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the loop and wait for its result"""
+        return self.submit(coro).result(timeout)
+
+
+class AsyncQMPClient():
+    """
+    QMP client with many commands in flight.
+
+    Every command carries an id. Replies are routed to the future of the
+    command with the same id; replies without an id are matched to the
+    oldest pending command, since the monitor answers in order. A command
+    given up at its timeout is no longer pending, its late reply is dropped.
+
+    The coroutines can be awaited directly from any event loop. The sync
+    helpers (command, pipeline, ...) run them on QMP_LOOP instead.
+    """
+
+    def __init__(self, address, name="hydropper"):
+        self.address = address
+        self.name = name
+        self.greeting = None
+        self.events = QMPEventDispatcher()
+        self._ids = itertools.count(1)
+        self._pending = OrderedDict()
+        # ids of commands given up at their timeout, their late replies are dropped
+        self._abandoned = set()
+        self._reader = None
+        self._writer = None
+        self._recv_task = None
+
+    def is_connected(self):
+        """Returns true if the monitor connection is alive"""
+        return self._writer is not None and self._recv_task is not None \
+            and not self._recv_task.done()
+
+    async def connect(self, negotiate=True):
+        """
+        Connect to the QMP Monitor and perform capabilities negotiation.
+
+        Returns:
+            QMP greeting
+
+        Raises:
+            QMPConnectError if the greeting is not received or QMP not in greetiong
+            QMPCapabilitiesError if fails to negotiate capabilities
+        """
+        try:
+            if isinstance(self.address, tuple):
+                self._reader, self._writer = await asyncio.open_connection(
+                    self.address[0], self.address[1], limit=QMP_STREAM_LIMIT)
+            else:
+                self._reader, self._writer = await asyncio.open_unix_connection(
+                    self.address, limit=QMP_STREAM_LIMIT)
+            line = await self._reader.readline()
+        except OSError as err:
+            raise QMPConnectError("Connect to %s failed: %s" % (self.address, err))
+        greeting = json.loads(line) if line.strip() else None
+        if greeting is None or "QMP" not in greeting:
+            raise QMPConnectError
+        self.greeting = greeting
+        self._recv_task = asyncio.ensure_future(self._recv_loop())
+        if negotiate:
+            resp = await self.execute('qmp_capabilities')
+            if not resp or "return" not in resp:
+                raise QMPCapabilitiesError
+        return greeting
+
+    async def _recv_loop(self):
+        """Read messages and route them to futures or the event dispatcher"""
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                resp = json.loads(line)
+                if 'event' in resp:
+                    LOG.debug("-> %s", resp)
+                    self.events.put(resp)
+                else:
+                    self._put_reply(resp)
+        except (OSError, ValueError) as err:
+            LOG.debug("qmp connection %s broken: %s" % (self.address, err))
+        finally:
+            for future, _, _ in self._pending.values():
+                if not future.done():
+                    future.set_exception(QMPConnectError("Monitor was closed"))
+            self._pending.clear()
+            self.events.close()
+
+    def _put_reply(self, resp):
+        cmd_id = resp.get('id')
+        if cmd_id is not None and cmd_id in self._abandoned:
+            self._abandoned.discard(cmd_id)
+            LOG.debug("drop late qmp reply %s" % resp)
+            return
+        if cmd_id is not None and cmd_id in self._pending:
+            future, name, sent = self._pending.pop(cmd_id)
+        elif self._pending:
+            _, (future, name, sent) = self._pending.popitem(last=False)
+        else:
+            LOG.warning("drop unexpected qmp reply %s" % resp)
+            return
+        QMP_LATENCY.record(self.name, name, time.time() - sent, "error" in resp)
+        if not future.done():
+            future.set_result(resp)
+
+    async def execute(self, name, args=None, cmd_id=None, timeout=None):
+        """
+        Send a QMP command and wait for its reply.
+
+        Args:
+            name: command name
+            args: command arguments
+            cmd_id: command id, generated if it's None
+            timeout: seconds to wait for the reply, None means forever
+
+        Raises:
+            QMPConnectError if the monitor is closed
+            QMPTimeoutError if the reply does not arrive in time
+        """
+        future = self.send(name, args, cmd_id)
+        await self._drain()
+        try:
+            resp = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self._abandon([future])
+            raise QMPTimeoutError("Timeout waiting for reply of %s" % name)
+        LOG.debug("-> %s", resp)
+        return resp
+
+    def send(self, name, args=None, cmd_id=None):
+        """
+        Queue a QMP command without waiting for the reply.
+
+        Returns:
+            An asyncio future of the reply.
+        """
+        if not self.is_connected():
+            raise QMPConnectError("Monitor was closed")
+        if cmd_id is None:
+            cmd_id = "%s-%d" % (self.name, next(self._ids))
+        qmp_cmd = {'execute': name}
+        if args:
+            qmp_cmd.update({'arguments': args})
+        qmp_cmd.update({'id': cmd_id})
+        future = asyncio.get_event_loop().create_future()
+        self._pending[cmd_id] = (future, name, time.time())
+        LOG.debug("<- %s", qmp_cmd)
+        self._writer.write(json.dumps(qmp_cmd).encode('utf-8'))
+        return future
+
+    def _abandon(self, futures):
+        """
+        Forget the commands of futures, so a later reply without an id is
+        not matched to them instead of the command it answers
+        """
+        for cmd_id, (future, _, _) in list(self._pending.items()):
+            if future in futures:
+                del self._pending[cmd_id]
+                self._abandoned.add(cmd_id)
+                future.cancel()
+
+    async def _drain(self):
+        try:
+            await self._writer.drain()
+        except OSError as err:
+            raise QMPConnectError("Error while sending to socket: %s" % err)
+
+    async def execute_many(self, commands, timeout=None):
+        """
+        Send several commands back to back and wait for all replies.
+
+        Args:
+            commands: list of (name, args) tuples
+
+        Returns:
+            List of replies in the order of commands.
+        """
+        futures = [self.send(name, args) for name, args in commands]
+        await self._drain()
+        try:
+            return await asyncio.wait_for(asyncio.gather(*futures), timeout)
+        except asyncio.TimeoutError:
+            self._abandon(futures)
+            raise QMPTimeoutError("Timeout waiting for replies of %s" %
+                                  [name for name, _ in commands])
+
+    async def wait_event(self, name=None, predicate=None, timeout=None):
+        """
+        Pop the oldest matching event, wait for it if there is none.
+
+        Raises:
+            QMPTimeoutError if no event arrives in time
+            QMPConnectError if the monitor is closed
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.events.wait, name, predicate, timeout)
+
+    async def close(self):
+        """Close the connection"""
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        if self._recv_task is not None:
+            await asyncio.wait([self._recv_task])
+
+    def command(self, name, args=None, cmd_id=None, timeout=None):
+        """Sync version of execute(), runs on QMP_LOOP"""
+        return QMP_LOOP.run(self.execute(name, args, cmd_id, timeout))
+
+    def pipeline(self, commands, timeout=None):
+        """Sync version of execute_many(), runs on QMP_LOOP"""
+        return QMP_LOOP.run(self.execute_many(commands, timeout))
+
+    def get_event(self, name=None, predicate=None, timeout=None):
+        """Sync version of wait_event(), it does not need the loop"""
+        return self.events.wait(name, predicate, timeout)
+
+    def connect_sync(self, negotiate=True):
+        """Sync version of connect(), runs on QMP_LOOP"""
+        return QMP_LOOP.run(self.connect(negotiate))
+
+    def close_sync(self):
+        """Sync version of close(), runs on QMP_LOOP"""
+        return QMP_LOOP.run(self.close())
+
+
+QMP_LOOP = QMPLoopThread()
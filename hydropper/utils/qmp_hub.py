@@ -0,0 +1,431 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""qmp hub, one thread drives the monitors of many vms"""
+
+import json
+import time
+import errno
+import socket
+import selectors
+import threading
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import wait as wait_futures
+from utils.utils_logging import TestLog
+from utils.utils_qmp import QMPStreamBuffer
+from utils.utils_qmp import QMPEventDispatcher
+from utils.utils_qmp import QMP_RECV_SIZE
+from utils.utils_qmp import QMP_LATENCY
+from utils.utils_stats import LatencyHistogram
+from utils.exception import QMPConnectError
+from utils.exception import QMPCapabilitiesError
+from utils.exception import QMPTimeoutError
+
+LOG = TestLog.get_global_log()
+QMP_CONNECT_TIMEOUT = 5
+
+
+class QMPHandle():
+    """
+    A vm monitor connection owned by a QMPHub.
+
+    It has the same command()/pipeline()/events interface as
+    AsyncQMPClient, so BaseVM can use it as its qmp client.
+    """
+
+    def __init__(self, hub, name, address):
+        self.hub = hub
+        self.name = name
+        self.address = address
+        self.sock = None
+        self.greeting = None
+        self.closed = False
+        self.events = QMPEventDispatcher()
+        self.ready = Future()
+        self.reader = QMPStreamBuffer()
+        self.outbuf = bytearray()
+        self.pending = deque()
+        self.latency = LatencyHistogram()
+
+    def __repr__(self):
+        return "qmp handle <%s>" % self.name
+
+    def send(self, name, args=None, cmd_id=None):
+        """
+        Queue a QMP command, it is sent by the hub thread.
+
+        Returns:
+            A concurrent.futures.Future of the reply.
+        """
+        qmp_cmd = {'execute': name}
+        if args:
+            qmp_cmd.update({'arguments': args})
+        if cmd_id:
+            qmp_cmd.update({'id': cmd_id})
+        future = Future()
+        with self.hub.lock:
+            if self.closed:
+                raise QMPConnectError("Monitor was closed")
+            LOG.debug("<- %s: %s", self.name, qmp_cmd)
+            self.outbuf.extend(json.dumps(qmp_cmd).encode('utf-8'))
+            self.pending.append((future, name, time.time()))
+            self.hub.want_write(self)
+        return future
+
+    def command(self, name, args=None, cmd_id=None, timeout=None):
+        """Send a QMP command and wait for its reply"""
+        future = self.send(name, args, cmd_id)
+        self.hub.run_until([future], timeout)
+        return future.result(0)
+
+    def pipeline(self, commands, timeout=None):
+        """Send several commands back to back and wait for all replies"""
+        futures = [self.send(name, args) for name, args in commands]
+        self.hub.run_until(futures, timeout)
+        return [future.result(0) for future in futures]
+
+    def wait_ready(self, timeout=QMP_CONNECT_TIMEOUT):
+        """Wait for the greeting and capabilities negotiation"""
+        self.hub.run_until([self.ready], timeout)
+        return self.ready.result(0)
+
+    def event_pump(self):
+        """Pump for events.wait(), None if the hub thread reads the events"""
+        if self.hub.threaded:
+            return None
+        return self.hub.pump
+
+    def close_sync(self):
+        """Close the connection"""
+        self.hub.unregister(self)
+
+    def latency_stats(self):
+        """Latency of all commands from send to reply, see LatencyHistogram.summary()"""
+        return self.latency.summary()
+
+
+class QMPHub():
+    """
+    Owns the monitor sockets of many vms and multiplexes them with a
+    selector (epoll on Linux).
+
+    The hub is driven either by its own thread (start()), or by the threads
+    that wait for replies or events: without a hub thread, command(),
+    pipeline(), run_until() and waits with event_pump() poll the hub
+    themselves, one thread at a time.
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.RLock()
+        self.handles = dict()
+        self._calls = deque()
+        self._writers = set()
+        self._thread = None
+        self._poller = None
+        self._poll_lock = threading.Lock()
+        self._running = False
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+    def __len__(self):
+        return len(self.handles)
+
+    @property
+    def threaded(self):
+        """True if the hub thread is running"""
+        return self._thread is not None
+
+    def _in_hub_thread(self):
+        owner = self._thread or self._poller
+        return owner is None or threading.current_thread() is owner
+
+    def _wakeup(self):
+        try:
+            self._wakeup_w.send(b'\0')
+        except BlockingIOError:
+            pass
+
+    def _call(self, func, *args):
+        """Run func in the hub thread, the selector is not thread safe"""
+        if self._in_hub_thread():
+            func(*args)
+            return
+        with self.lock:
+            self._calls.append((func, args))
+        self._wakeup()
+
+    def want_write(self, handle):
+        """Mark the handle has data to send, called with lock held"""
+        self._writers.add(handle)
+        if not self._in_hub_thread():
+            self._wakeup()
+
+    def register(self, name, address):
+        """
+        Connect to a vm monitor, and negotiate capabilities in the hub.
+
+        Args:
+            name: vm name, used in logs and latency reports
+            address: unix socket path or (host, port)
+
+        Returns:
+            QMPHandle, its ready future is done after negotiation.
+        """
+        handle = QMPHandle(self, name, address)
+        if isinstance(address, tuple):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(QMP_CONNECT_TIMEOUT)
+        try:
+            sock.connect(address)
+        except OSError as err:
+            sock.close()
+            raise QMPConnectError("Connect to %s failed: %s" % (address, err))
+        sock.setblocking(False)
+        handle.sock = sock
+        with self.lock:
+            self.handles[sock.fileno()] = handle
+        self._call(self.selector.register, sock, selectors.EVENT_READ, handle)
+        return handle
+
+    def unregister(self, handle):
+        """Close a vm monitor connection"""
+        with self.lock:
+            if handle.closed:
+                return
+            handle.closed = True
+        self._call(self._close_handle, handle)
+        if not self._in_hub_thread():
+            deadline = time.time() + QMP_CONNECT_TIMEOUT
+            while handle.sock.fileno() != -1 and time.time() < deadline:
+                time.sleep(0.001)
+
+    def _close_handle(self, handle, error=None):
+        if handle.sock.fileno() == -1:
+            return
+        with self.lock:
+            handle.closed = True
+            self._writers.discard(handle)
+            self.handles.pop(handle.sock.fileno(), None)
+            pending = list(handle.pending)
+            handle.pending.clear()
+        try:
+            self.selector.unregister(handle.sock)
+        except (KeyError, ValueError):
+            pass
+        handle.sock.close()
+        exc = error or QMPConnectError("Monitor was closed")
+        if not handle.ready.done():
+            handle.ready.set_exception(exc)
+        for future, _, _ in pending:
+            if not future.done():
+                future.set_exception(exc)
+        handle.events.close()
+
+    def _on_readable(self, handle):
+        while True:
+            try:
+                data = handle.sock.recv(QMP_RECV_SIZE)
+            except BlockingIOError:
+                return
+            except OSError as err:
+                self._close_handle(handle, QMPConnectError(str(err)))
+                return
+            if not data:
+                self._close_handle(handle)
+                return
+            try:
+                handle.reader.feed(data)
+            except ValueError as err:
+                self._close_handle(handle, QMPConnectError("Bad qmp message: %s" % err))
+                return
+            while handle.reader.messages:
+                self._dispatch(handle, handle.reader.pop())
+
+    def _dispatch(self, handle, resp):
+        if 'event' in resp:
+            LOG.debug("-> %s: %s", handle.name, resp)
+            handle.events.put(resp)
+            return
+        if handle.greeting is None:
+            if "QMP" not in resp:
+                self._close_handle(handle, QMPConnectError("Bad greeting %s" % resp))
+                return
+            handle.greeting = resp
+            negotiated = handle.send('qmp_capabilities')
+            negotiated.add_done_callback(lambda future: self._on_negotiated(handle, future))
+            return
+        with self.lock:
+            if not handle.pending:
+                LOG.warning("drop unexpected qmp reply %s from %s" % (resp, handle.name))
+                return
+            future, name, sent = handle.pending.popleft()
+        latency = time.time() - sent
+        handle.latency.record(latency, "error" in resp)
+        QMP_LATENCY.record(handle.name, name, latency, "error" in resp)
+        LOG.debug("-> %s: %s (%s, %.6fs)", handle.name, resp, name, latency)
+        future.set_result(resp)
+
+    @staticmethod
+    def _on_negotiated(handle, future):
+        if future.exception() is not None:
+            return
+        if "return" in future.result():
+            handle.ready.set_result(handle.greeting)
+        else:
+            handle.ready.set_exception(QMPCapabilitiesError())
+
+    def _flush(self, handle):
+        with self.lock:
+            if handle.closed:
+                return
+            try:
+                sent = handle.sock.send(handle.outbuf)
+            except BlockingIOError:
+                sent = 0
+            except OSError as err:
+                if err.errno != errno.EPIPE:
+                    LOG.warning("send to %s failed: %s" % (handle.name, err))
+                sent = -1
+            if sent > 0:
+                del handle.outbuf[:sent]
+            if handle.outbuf and sent >= 0:
+                events = selectors.EVENT_READ | selectors.EVENT_WRITE
+            else:
+                events = selectors.EVENT_READ
+                self._writers.discard(handle)
+        if sent < 0:
+            self._close_handle(handle)
+            return
+        self.selector.modify(handle.sock, events, handle)
+
+    def poll(self, timeout=None):
+        """
+        Run one selector iteration in the calling thread.
+
+        Args:
+            timeout: seconds to block, None means until something happens
+        """
+        with self.lock:
+            calls = list(self._calls)
+            self._calls.clear()
+            writers = list(self._writers)
+        for func, args in calls:
+            func(*args)
+        for handle in writers:
+            self._flush(handle)
+        for key, mask in self.selector.select(timeout):
+            if key.data is None:
+                try:
+                    while self._wakeup_r.recv(4096):
+                        pass
+                except BlockingIOError:
+                    pass
+                continue
+            if mask & selectors.EVENT_WRITE:
+                self._flush(key.data)
+            if mask & selectors.EVENT_READ and not key.data.closed:
+                self._on_readable(key.data)
+
+    def run_until(self, futures, timeout=None):
+        """
+        Wait until all futures are done, polling the hub if no hub thread runs.
+
+        Raises:
+            QMPTimeoutError if they are not done in time
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        if self._thread is not None and not self._in_hub_thread():
+            _, not_done = wait_futures(futures, timeout)
+            if not_done:
+                raise QMPTimeoutError("Timeout waiting for qmp replies")
+            return
+        while not all(future.done() for future in futures):
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                raise QMPTimeoutError("Timeout waiting for qmp replies")
+            if not self._poll_once(remaining):
+                # another thread drives the hub, it handles our replies too
+                wait_futures(futures, 0.01)
+
+    def _poll_once(self, timeout):
+        """Poll the hub unless another thread does, return True if polled"""
+        if not self._poll_lock.acquire(False):
+            return False
+        self._poller = threading.current_thread()
+        try:
+            self.poll(timeout)
+        finally:
+            self._poller = None
+            self._poll_lock.release()
+        return True
+
+    def pump(self, timeout=None):
+        """
+        Read events in the calling thread, for QMPEventDispatcher.wait()
+        when no hub thread runs.
+
+        Args:
+            timeout: seconds to block, None means until something happens
+        """
+        if self._thread is not None and not self._in_hub_thread():
+            time.sleep(0.01 if timeout is None else min(timeout, 0.01))
+            return
+        if not self._poll_once(timeout):
+            # another thread drives the hub, it puts our events too
+            time.sleep(0.01 if timeout is None else min(timeout, 0.01))
+
+    def broadcast(self, name, args=None, handles=None, timeout=None):
+        """
+        Send the same command to many vms and wait for all replies.
+
+        Returns:
+            {vm name: reply}
+        """
+        handles = list(self.handles.values()) if handles is None else handles
+        futures = [(handle, handle.send(name, args)) for handle in handles]
+        self.run_until([future for _, future in futures], timeout)
+        return {handle.name: future.result(0) for handle, future in futures}
+
+    def latency_report(self):
+        """Per vm latency stats, {vm name: QMPHandle.latency_stats()}"""
+        return {handle.name: handle.latency_stats()
+                for handle in list(self.handles.values())}
+
+    def start(self):
+        """Drive the hub from a dedicated thread"""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="qmp-hub", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            self.poll(1)
+
+    def stop(self):
+        """Stop the hub thread and close all connections"""
+        if self._thread is not None:
+            self._running = False
+            self._wakeup()
+            self._thread.join()
+            self._thread = None
+        for handle in list(self.handles.values()):
+            self._close_handle(handle)
+        self.selector.close()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
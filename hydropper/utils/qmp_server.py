@@ -0,0 +1,342 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""fake stratovirt qmp server, used to test the harness without a hypervisor"""
+
+import os
+import json
+import time
+import socket
+import threading
+import socketserver
+from utils.utils_logging import TestLog
+from utils import utils_common
+
+LOG = TestLog.get_global_log()
+GREETING = {"QMP": {"version": {"StratoVirt": {"micro": 0, "minor": 0, "major": 0},
+                                "package": "hydropper-fake"},
+                    "capabilities": []}}
+
+
+def _timestamp():
+    now = time.time()
+    return {"seconds": int(now), "microseconds": int((now - int(now)) * 1000000)}
+
+
+def _error(err_class, desc):
+    return {"error": {"class": err_class, "desc": desc}}
+
+
+class _QMPRequestHandler(socketserver.BaseRequestHandler):
+    """One monitor connection"""
+
+    def setup(self):
+        self.fake = self.server.fake
+        self.negotiated = False
+        self.send_lock = threading.Lock()
+        self.fake.add_client(self)
+
+    def finish(self):
+        self.fake.del_client(self)
+
+    def send_msg(self, msg):
+        """Send a json message, False if the client is gone"""
+        data = (json.dumps(msg) + "\r\n").encode('utf-8')
+        try:
+            with self.send_lock:
+                self.request.sendall(data)
+        except OSError:
+            return False
+        return True
+
+    def handle(self):
+        self.send_msg(GREETING)
+        decoder = json.JSONDecoder()
+        buf = ""
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            buf += data.decode('utf-8')
+            while True:
+                buf = buf.lstrip()
+                if not buf:
+                    break
+                try:
+                    qmp_cmd, end = decoder.raw_decode(buf)
+                except ValueError:
+                    break
+                buf = buf[end:]
+                if not self.execute(qmp_cmd):
+                    return
+
+    def execute(self, qmp_cmd):
+        """Run a command, return False if the connection must be closed"""
+        name = qmp_cmd.get("execute")
+        args = qmp_cmd.get("arguments", {})
+        delay = self.fake.delays.get(name, self.fake.delay)
+        if delay:
+            time.sleep(delay)
+        if name == "qmp_capabilities":
+            self.negotiated = True
+            resp, events = {"return": {}}, []
+        elif not self.negotiated:
+            resp, events = _error("CommandNotFound",
+                                  "Expecting capabilities negotiation with 'qmp_capabilities'"), []
+        else:
+            resp, events = self.fake.vm_command(name, args)
+        if "id" in qmp_cmd:
+            resp["id"] = qmp_cmd["id"]
+        if not self.send_msg(resp):
+            return False
+        for event in events:
+            self.send_msg(event)
+        if name == "quit" and "return" in resp:
+            self.fake.shutdown_requested = True
+            return False
+        return True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeQMPServer():
+    """
+    A stand-in for the StratoVirt monitor.
+
+    It speaks the QMP greeting and qmp_capabilities handshake, keeps a
+    small vm state (run status, vcpus, devices, balloon) to answer the
+    commands BaseVM issues, and emits the matching events (STOP, RESUME,
+    SHUTDOWN, DEVICE_DELETED, BALLOON_CHANGED). Reply delays and event
+    storms can be configured to load the client.
+
+    Args:
+        address: unix socket path or (host, port), port 0 picks a free port
+        vcpus: number of vcpus reported by query-cpus
+        delay: seconds to wait before every reply
+    """
+
+    def __init__(self, address, vcpus=4, delay=0):
+        self.address = address
+        self.vcpus = vcpus
+        self.delay = delay
+        self.delays = dict()
+        self.status = "running"
+        self.devices = dict()
+        self.netdevs = dict()
+        self.blockdevs = dict()
+        self.balloon = 0
+        self.commands = 0
+        self.events_sent = 0
+        self.shutdown_requested = False
+        self.state_lock = threading.Lock()
+        self._clients = set()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """Listen and serve in a thread, return the bound address"""
+        if isinstance(self.address, tuple):
+            self._server = _TCPServer(self.address, _QMPRequestHandler)
+            self.address = self._server.server_address[:2]
+        else:
+            utils_common.remove_existing_file(self.address)
+            self._server = _UnixServer(self.address, _QMPRequestHandler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="fake-qmp", daemon=True)
+        self._thread.start()
+        return self.address
+
+    def stop(self):
+        """Stop serving and close all connections"""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        for client in list(self._clients):
+            try:
+                client.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        if not isinstance(self.address, tuple):
+            utils_common.remove_existing_file(self.address)
+
+    def set_delay(self, delay, command=None):
+        """Set the reply delay of all commands or of one command"""
+        if command is None:
+            self.delay = delay
+        else:
+            self.delays[command] = delay
+
+    def add_client(self, client):
+        """Called by a new connection"""
+        with self.state_lock:
+            self._clients.add(client)
+
+    def del_client(self, client):
+        """Called by a closed connection"""
+        with self.state_lock:
+            self._clients.discard(client)
+
+    def wait_clients(self, count=1, timeout=5):
+        """Wait until count clients are connected"""
+        deadline = time.time() + timeout
+        while len(self._clients) < count:
+            if time.time() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def emit(self, name, data=None):
+        """Send an event to all negotiated clients"""
+        event = {"event": name, "timestamp": _timestamp()}
+        if data is not None:
+            event["data"] = data
+        for client in list(self._clients):
+            if client.negotiated and client.send_msg(event):
+                self.events_sent += 1
+
+    def inject_events(self, name, count, data=None, interval=0):
+        """
+        Send an event storm to all clients.
+
+        Args:
+            name: event name
+            count: number of events
+            data: event data, a callable(index) returns the data of each event
+            interval: seconds between two events
+        """
+        for index in range(count):
+            self.emit(name, data(index) if callable(data) else data)
+            if interval:
+                time.sleep(interval)
+
+    def inject_events_async(self, name, count, data=None, interval=0):
+        """Send an event storm from a thread, return the thread"""
+        storm = threading.Thread(target=self.inject_events,
+                                 args=(name, count, data, interval), daemon=True)
+        storm.start()
+        return storm
+
+    def vm_command(self, name, args):
+        """
+        Answer a command like StratoVirt does.
+
+        Returns:
+            (reply, events to send after the reply)
+        """
+        with self.state_lock:
+            self.commands += 1
+            handler = getattr(self, "_cmd_" + name.replace("-", "_"), None)
+            if handler is None:
+                return _error("CommandNotFound", "The command %s has not been found" % name), []
+            return handler(args)
+
+    def _event(self, name, data=None):
+        event = {"event": name, "timestamp": _timestamp()}
+        if data is not None:
+            event["data"] = data
+        self.events_sent += 1
+        return event
+
+    def _cmd_quit(self, _args):
+        return {"return": {}}, [self._event("SHUTDOWN", {"guest": False, "reason": "host-qmp-quit"})]
+
+    def _cmd_stop(self, _args):
+        if self.status != "running":
+            return _error("GenericError", "Failed to pause VM"), []
+        self.status = "paused"
+        return {"return": {}}, [self._event("STOP")]
+
+    def _cmd_cont(self, _args):
+        if self.status != "paused":
+            return _error("GenericError", "Failed to resume VM"), []
+        self.status = "running"
+        return {"return": {}}, [self._event("RESUME")]
+
+    def _cmd_query_status(self, _args):
+        return {"return": {"running": self.status == "running", "singlestep": False,
+                           "status": self.status}}, []
+
+    def _cmd_query_cpus(self, _args):
+        return {"return": [{"current": index == 0, "CPU": index, "arch": "x86",
+                            "props": {"core-id": 0, "socket-id": index, "thread-id": 0},
+                            "qom_path": "/machine/unattached/device[%d]" % index,
+                            "halted": False, "thread_id": os.getpid()}
+                           for index in range(self.vcpus)]}, []
+
+    def _cmd_query_hotpluggable_cpus(self, _args):
+        return {"return": [{"type": "host-x86-cpu", "vcpus-count": 1,
+                            "props": {"core-id": 0, "socket-id": index, "thread-id": 0},
+                            "qom-path": "/machine/unattached/device[%d]" % index}
+                           for index in range(self.vcpus)]}, []
+
+    def _cmd_blockdev_add(self, args):
+        node = args.get("node-name")
+        if node in self.blockdevs:
+            return _error("GenericError", "Duplicate node-name %s" % node), []
+        self.blockdevs[node] = args
+        return {"return": {}}, []
+
+    def _cmd_netdev_add(self, args):
+        netdev = args.get("id")
+        if netdev in self.netdevs:
+            return _error("GenericError", "Duplicate netdev id %s" % netdev), []
+        self.netdevs[netdev] = args
+        return {"return": {}}, []
+
+    def _cmd_netdev_del(self, args):
+        if self.netdevs.pop(args.get("id"), None) is None:
+            return _error("GenericError", "Netdev %s not found" % args.get("id")), []
+        return {"return": {}}, []
+
+    def _cmd_device_add(self, args):
+        devid = args.get("id")
+        if devid in self.devices:
+            return _error("GenericError", "Duplicate device id %s" % devid), []
+        if devid not in self.blockdevs and devid not in self.netdevs:
+            return _error("GenericError", "Backend of %s not found" % devid), []
+        self.devices[devid] = args
+        return {"return": {}}, []
+
+    def _cmd_device_del(self, args):
+        devid = args.get("id")
+        if self.devices.pop(devid, None) is None:
+            return _error("GenericError", "Device %s not found" % devid), []
+        self.blockdevs.pop(devid, None)
+        return {"return": {}}, [self._event("DEVICE_DELETED", {"device": devid,
+                                                               "path": devid})]
+
+    def _cmd_balloon(self, args):
+        self.balloon = args.get("value", 0)
+        return {"return": {}}, [self._event("BALLOON_CHANGED", {"actual": self.balloon})]
+
+    def _cmd_query_balloon(self, _args):
+        return {"return": {"actual": self.balloon}}, []
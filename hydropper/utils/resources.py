@@ -11,14 +11,36 @@
 # See the Mulan PSL v2 for more details.
 """global resources"""
 
+import os
+import fcntl
 import threading
 import random
+from contextlib import contextmanager
 from subprocess import run
 from subprocess import CalledProcessError
 from utils.config import CONFIG
 from utils.utils_network import generate_random_name, generate_random_mac
 from utils.decorators import Singleton
 
+# Serializes host setup (bridge, dnsmasq) between test processes
+HOST_LOCK_FILE = os.path.join(CONFIG.test_dir, "hydropper.lock")
+
+
+@contextmanager
+def host_lock():
+    """Hold the host lock, shared by all test processes"""
+    with open(HOST_LOCK_FILE, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def worker_slice(values, worker_index=CONFIG.worker_index, worker_count=CONFIG.worker_count):
+    """Values reserved for the current worker, disjoint from other workers"""
+    return list(values)[worker_index::worker_count]
+
 
 class NetworkResource(Singleton):
     """Network resource"""
@@ -35,7 +57,9 @@ class NetworkResource(Singleton):
         self.dhcp_lower_limit = dhcp_lower_limit
         self.dhcp_top_limit = dhcp_top_limit
         self.ipaddr = "%s.%s.1" % (self.ip_prefix, str(self.ip_3rd))
-        self.static_ip_range = list(range(static_ip_lower_limit, static_ip_top_limit))
+        self.static_ip_range = worker_slice(range(static_ip_lower_limit, static_ip_top_limit))
+        # tap names tell the worker, so workers never create the same tap
+        self.tap_prefix = "t" if CONFIG.worker_count == 1 else "t%x-" % CONFIG.worker_index
         self.netmasklen = netmasklen
         self.netmask = netmask
         self.lock = threading.Lock()
@@ -52,6 +76,11 @@ class NetworkResource(Singleton):
 
     def check_env(self):
         """Check dnsmasq process is running normal"""
+        # workers share the bridge and dnsmasq, only one sets them up
+        with host_lock():
+            return self._check_env()
+
+    def _check_env(self):
         # create bridge if it does not exist
         run("brctl show %s || brctl addbr %s" % (self.bridge, self.bridge), shell=True, check=True)
 
@@ -94,7 +123,7 @@ class NetworkResource(Singleton):
             {"name": tapname, "mac": mac}
         """
         self.check_env()
-        tapname = generate_random_name()
+        tapname = generate_random_name(self.tap_prefix)
 
         if generate_tap:
             self.create_tap(tapname)
@@ -108,20 +137,29 @@ class NetworkResource(Singleton):
                 self.cmd_dict["link_tap"] % (self.bridge, tapname, tapname)
         run(_cmd, shell=True, check=True)
 
-    def clean_tap(self, tapname): 
+    def clean_tap(self, tapname):
         """Clean tap device from host"""
-        if NetworkResource.tap_cmd == "tunctl":
-            _cmd = self.cmd_dict["unlink_tap"] % (tapname, self.bridge, tapname) + \
-                    "tunctl -d %s 2>/dev/null" % (tapname)
-        else:
-            _cmd = self.cmd_dict["unlink_tap"] % (tapname, self.bridge, tapname) + \
-                    "ip tuntap del %s mode tap 2>/dev/null" % (tapname)
-        run(_cmd, shell=True, check=False)
+        self.clean_taps([tapname])
+
+    def clean_taps(self, tapnames):
+        """Clean tap devices from host, with one shell for all of them"""
+        if not tapnames:
+            return
+        _cmds = list()
+        for tapname in tapnames:
+            if NetworkResource.tap_cmd == "tunctl":
+                _cmds.append(self.cmd_dict["unlink_tap"] % (tapname, self.bridge, tapname) + \
+                             "tunctl -d %s 2>/dev/null" % (tapname))
+            else:
+                _cmds.append(self.cmd_dict["unlink_tap"] % (tapname, self.bridge, tapname) + \
+                             "ip tuntap del %s mode tap 2>/dev/null" % (tapname))
+        run("; ".join(_cmds), shell=True, check=False)
         with self.lock:
-            if tapname in self.ip_resources:
-                static_index = int(str(self.ip_resources[tapname]["ipaddr"]).split(".")[-1])
-                self.static_ip_range.append(static_index)
-                del self.ip_resources[tapname]
+            for tapname in tapnames:
+                if tapname in self.ip_resources:
+                    static_index = int(str(self.ip_resources[tapname]["ipaddr"]).split(".")[-1])
+                    self.static_ip_range.append(static_index)
+                    del self.ip_resources[tapname]
 
     def alloc_ipaddr(self, tapname, index=0):
         """
@@ -161,14 +199,21 @@ class VsockResource(Singleton):
 
         return True
 
-    @staticmethod
-    def find_contextid():
-        """Find uniq context ID"""
+    def find_contextid(self):
+        """Find uniq context ID, in the range of the current worker"""
         first_cid = 3
         max_cid = 10000
-        rand_cid = random.choice(range(first_cid, max_cid))
+        with self.lock:
+            free_cids = set(worker_slice(range(first_cid, max_cid))) - self.used_cids
+            rand_cid = random.choice(sorted(free_cids))
+            self.used_cids.add(rand_cid)
         return rand_cid
 
+    def release_contextid(self, cid):
+        """Give back a context ID got by find_contextid"""
+        with self.lock:
+            self.used_cids.discard(cid)
+
 
 NETWORKS = NetworkResource()
 VSOCKS = VsockResource()
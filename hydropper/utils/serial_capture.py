@@ -0,0 +1,212 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""asynchronous capture of guest console output"""
+
+import os
+import gzip
+import shutil
+import threading
+from utils.config import CONFIG
+from utils.utils_logging import TestLog
+
+LOG = TestLog.get_global_log()
+# Seconds the writer waits to batch more lines
+FLUSH_INTERVAL = 0.2
+
+
+class SerialCapture():
+    """
+    Write the console output of vms to a file, off the reader thread.
+
+    write() only appends the line to a bounded buffer, a writer thread
+    writes the buffer raw in batches. When the buffer is full the line is
+    dropped and counted, the file gets a note of the dropped lines. The
+    file is rotated at max_bytes, rotated files are gzipped if compress
+    is set.
+
+    Args:
+        path: file the output is written to
+        buffer_size: bytes buffered at most
+        max_bytes: size rotating the file, 0 never rotates it
+        backup_count: rotated files kept
+        compress: gzip rotated files
+    """
+
+    _captures = dict()
+    _captures_lock = threading.Lock()
+
+    def __init__(self, path, buffer_size=None, max_bytes=None, backup_count=None,
+                 compress=None):
+        self.path = path
+        self.buffer_size = CONFIG.serial_capture_buffer if buffer_size is None else buffer_size
+        self.max_bytes = CONFIG.serial_capture_max_bytes if max_bytes is None else max_bytes
+        self.backup_count = CONFIG.serial_capture_backups if backup_count is None \
+            else backup_count
+        self.compress = CONFIG.serial_capture_compress if compress is None else compress
+        self.stats = {"lines": 0, "written_bytes": 0, "dropped_lines": 0,
+                      "dropped_bytes": 0, "rotations": 0}
+        self._cond = threading.Condition()
+        self._chunks = list()
+        self._size = 0
+        # lines dropped since the last note in the file
+        self._dropped = 0
+        self._flush_now = False
+        self._writing = False
+        self._closed = False
+        self._file = None
+        self._file_size = 0
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="serial-capture-%s" % os.path.basename(path))
+        self._thread.start()
+
+    @classmethod
+    def get(cls, name, root_path=None):
+        """Get the capture of vms named name, <root_path>/<name>_serial.log"""
+        root_path = CONFIG.test_session_root_path if root_path is None else root_path
+        path = os.path.join(root_path, name + "_serial.log")
+        with cls._captures_lock:
+            capture = cls._captures.get(path)
+            if capture is None or capture.closed:
+                capture = cls(path)
+                cls._captures[path] = capture
+            return capture
+
+    @classmethod
+    def close_all(cls):
+        """Write what is buffered and stop all captures"""
+        with cls._captures_lock:
+            captures = list(cls._captures.values())
+            cls._captures.clear()
+        for capture in captures:
+            capture.close()
+
+    @property
+    def closed(self):
+        """True once close() is called"""
+        return self._closed
+
+    def write(self, line):
+        """Buffer a line of output, it is dropped if the buffer is full"""
+        data = (line + "\n").encode("utf-8", "replace")
+        with self._cond:
+            if self._closed:
+                return
+            if self._size + len(data) > self.buffer_size:
+                self._dropped += 1
+                self.stats["dropped_lines"] += 1
+                self.stats["dropped_bytes"] += len(data)
+                self._flush_now = True
+                self._cond.notify_all()
+                return
+            self._chunks.append(data)
+            self._size += len(data)
+            self.stats["lines"] += 1
+            if len(self._chunks) == 1 or self._size > self.buffer_size // 2:
+                self._cond.notify_all()
+
+    # output_func of a session, such as the former serial log handle
+    debug = write
+
+    def flush(self, timeout=None):
+        """
+        Write what is buffered.
+
+        Returns:
+            True if it is written, False if timeout expired.
+        """
+        with self._cond:
+            self._flush_now = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._chunks and not self._writing
+                                       and not self._dropped, timeout)
+
+    def close(self, timeout=10):
+        """Write what is buffered and stop the writer"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _take(self):
+        """Wait for lines and take them, None when closed"""
+        with self._cond:
+            while not self._chunks and not self._dropped and not self._closed:
+                self._cond.wait()
+            if not self._closed and not self._flush_now and self._size <= self.buffer_size // 2:
+                self._cond.wait_for(lambda: self._closed or self._flush_now
+                                    or self._size > self.buffer_size // 2, FLUSH_INTERVAL)
+            if not self._chunks and not self._dropped:
+                return None
+            chunks = self._chunks
+            if self._dropped:
+                chunks.append(("[hydropper: %d lines of console output dropped]\n"
+                               % self._dropped).encode("utf-8"))
+            self._chunks = list()
+            self._size = 0
+            self._dropped = 0
+            self._flush_now = False
+            self._writing = True
+            return b"".join(chunks)
+
+    def _run(self):
+        while True:
+            data = self._take()
+            if data is None:
+                break
+            try:
+                self._write(data)
+            # the capture must not kill its thread, the lines are lost
+            # pylint: disable=broad-except
+            except Exception as err:
+                LOG.warning("serial capture %s failed: %s" % (self.path, err))
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, data):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+            self._file_size = self._file.tell()
+        self._file.write(data)
+        self._file.flush()
+        self._file_size += len(data)
+        with self._cond:
+            self.stats["written_bytes"] += len(data)
+        if self.max_bytes and self._file_size >= self.max_bytes:
+            self._rotate()
+
+    def _backup(self, index):
+        return "%s.%d%s" % (self.path, index, ".gz" if self.compress else "")
+
+    def _rotate(self):
+        """Move the file to .1, .1 to .2 and so on, the oldest is removed"""
+        self._file.close()
+        self._file = None
+        if self.backup_count <= 0:
+            os.remove(self.path)
+        else:
+            for index in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(self._backup(index)):
+                    os.replace(self._backup(index), self._backup(index + 1))
+            if self.compress:
+                with open(self.path, "rb") as src, gzip.open(self._backup(1), "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self._backup(1))
+        with self._cond:
+            self.stats["rotations"] += 1
@@ -13,8 +13,11 @@
 
 import threading
 import time
+from collections import deque
 import aexpect
+from utils.config import CONFIG
 from utils.utils_logging import TestLog
+from utils.utils_stats import LatencyRecorder
 from utils.exception import ConsoleBusyError
 from utils.exception import NoConsoleError
 from utils.exception import LoginAuthenticationError
@@ -22,32 +25,113 @@ from utils.exception import LoginTimeoutError
 from utils.exception import LoginProcessTerminatedError
 
 LOG = TestLog.get_global_log()
+# Time spent waiting for a console, by (console name, function)
+CONSOLE_WAIT = LatencyRecorder()
+
+
+class FairLock():
+    """
+    A lock granted in the order it is asked for.
+
+    Threads waiting for it queue up, so a thread sending commands in a
+    loop can not starve the others.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._waiters = deque()
+        self._locked = False
+
+    def acquire(self, timeout=None):
+        """
+        Wait for the lock behind the threads which asked for it before.
+
+        Args:
+            timeout: seconds to wait, None waits forever
+
+        Returns:
+            True if the lock is taken, False if timeout expired.
+        """
+        ticket = object()
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            self._waiters.append(ticket)
+            while self._locked or self._waiters[0] is not ticket:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    self._waiters.remove(ticket)
+                    # the next one may be at the head now
+                    self._cond.notify_all()
+                    return False
+                self._cond.wait(remaining)
+            self._waiters.popleft()
+            self._locked = True
+            return True
+
+    def release(self):
+        """Give the lock to the first waiter"""
+        with self._cond:
+            if not self._locked:
+                raise RuntimeError("release unlocked lock")
+            self._locked = False
+            self._cond.notify_all()
+
+    def locked(self):
+        """Return True if the lock is taken"""
+        return self._locked
+
+    def waiting(self):
+        """Number of threads waiting for the lock"""
+        with self._cond:
+            return len(self._waiters)
+
 
 def lock(function):
     """
-    Get the ConsoleManager lock, run the function, then release the lock.
+    Wait for the ConsoleManager lock, run the function, then release the lock.
+
+    Callers are served in order. ConsoleBusyError is raised if the lock
+    is not got in console_manager.queue_timeout seconds.
 
     Args:
         function: Function to package.
     """
     def package(*args, **kwargs):
         console_manager = args[0]
-        if console_manager.console_lock.acquire_lock(False) is False:
-            raise ConsoleBusyError
+        operation = args[1] if function.__name__ == "get_func" else function.__name__
+        begin = time.time()
+        got = console_manager.console_lock.acquire(console_manager.queue_timeout)
+        CONSOLE_WAIT.record(console_manager.name, operation, time.time() - begin, not got)
+        if not got:
+            raise ConsoleBusyError("%s: %s waited more than %ss" %
+                                   (console_manager.name, operation,
+                                    console_manager.queue_timeout))
         try:
             return function(*args, **kwargs)
         finally:
-            console_manager.console_lock.release_lock()
+            console_manager.console_lock.release()
     return package
 
 
 class ConsoleManager():
-    """A class for console session communication pipeline."""
+    """
+    A class for console session communication pipeline.
 
-    def __init__(self):
+    Threads share the console: their calls are queued and run one by one
+    on it, in the order they are made.
+
+    Args:
+        name: name of the console in CONSOLE_WAIT
+        queue_timeout: seconds a call waits for the console
+    """
+
+    def __init__(self, name="console", queue_timeout=None):
         self._console = None
+        self.name = name
         self.status_test_command = None
-        self.console_lock = threading.Lock()
+        self.console_lock = FairLock()
+        self.queue_timeout = CONFIG.console_queue_timeout if queue_timeout is None \
+            else queue_timeout
 
     @lock
     def login_session(self, status_test_command, prompt, username, password, timeout):
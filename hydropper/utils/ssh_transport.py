@@ -0,0 +1,169 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""persistent ssh connections to guests"""
+
+import os
+import time
+import shlex
+import fcntl
+import subprocess
+from utils.exception import SSHError
+from utils.utils_logging import TestLog
+
+LOG = TestLog.get_global_log()
+SSH_BIN = "ssh"
+SCP_BIN = "scp"
+SSH_KEYGEN_BIN = "ssh-keygen"
+KEY_NAME = "id_hydropper"
+MASTER_TIMEOUT = 30
+
+
+def session_key(key_dir):
+    """
+    Get the key pair the harness logs into guests with, generated once
+    in key_dir and shared by all vms and workers.
+
+    Returns:
+        A tuple (private key path, public key text).
+    """
+    key_path = os.path.join(key_dir, KEY_NAME)
+    if not os.path.exists(key_dir):
+        os.makedirs(key_dir)
+    with open(key_path + ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not os.path.exists(key_path + ".pub"):
+            subprocess.run([SSH_KEYGEN_BIN, "-q", "-t", "ed25519", "-N", "", "-C", "hydropper",
+                            "-f", key_path], check=True, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.STDOUT)
+    with open(key_path + ".pub", "r") as pub_file:
+        return key_path, pub_file.read().strip()
+
+
+class SSHTransport():
+    """
+    A ControlMaster connection to a guest, multiplexing all ssh sessions,
+    commands and scp copies of a vm.
+
+    The master logs in once with the session key, then each session,
+    command or copy only opens a channel on it. The host key of the guest
+    is checked against known_hosts if it is given.
+
+    Args:
+        host: guest ip
+        username: guest user, the key is in its authorized_keys
+        key_path: private key of the session
+        control_path: unix socket of the master
+        known_hosts: file with the guest host key, None skips the check
+        port: guest ssh port
+    """
+
+    def __init__(self, host, username, key_path, control_path, known_hosts=None, port=22):
+        self.host = host
+        self.username = username
+        self.key_path = key_path
+        self.control_path = control_path
+        self.known_hosts = known_hosts
+        self.port = port
+        self.started = False
+
+    def options(self):
+        """Options shared by the master, the sessions and scp"""
+        if self.known_hosts is not None:
+            host_keys = ["-o", "UserKnownHostsFile=%s" % self.known_hosts,
+                         "-o", "StrictHostKeyChecking=yes"]
+        else:
+            host_keys = ["-o", "UserKnownHostsFile=/dev/null",
+                         "-o", "StrictHostKeyChecking=no"]
+        return host_keys + ["-o", "ControlPath=%s" % self.control_path,
+                            "-o", "IdentityFile=%s" % self.key_path,
+                            "-o", "IdentitiesOnly=yes",
+                            "-o", "BatchMode=yes",
+                            "-o", "LogLevel=ERROR"]
+
+    def _ssh(self, *args):
+        return [SSH_BIN] + self.options() + ["-p", str(self.port)] + list(args) + \
+            ["%s@%s" % (self.username, self.host)]
+
+    def start(self, timeout=MASTER_TIMEOUT):
+        """
+        Log in and keep the master in background.
+
+        Raises:
+            SSHError: the master can not log in before timeout
+        """
+        if self.started:
+            return
+        cmd = self._ssh("-o", "ControlMaster=yes", "-o", "ControlPersist=yes",
+                        "-o", "ConnectTimeout=%d" % timeout, "-f", "-N")
+        begin = time.time()
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    timeout=timeout, check=False)
+        except subprocess.TimeoutExpired as err:
+            raise SSHError("ssh master to %s timed out" % self.host, err.output)
+        if result.returncode != 0 or not self.check():
+            raise SSHError("ssh master to %s failed" % self.host,
+                           result.stdout.decode("utf-8", "replace"))
+        self.started = True
+        LOG.debug("ssh master to %s started in %.3fs" % (self.host, time.time() - begin))
+
+    def check(self):
+        """True if the master is running"""
+        result = subprocess.run(self._ssh("-O", "check"), stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, check=False)
+        return result.returncode == 0
+
+    def stop(self):
+        """Stop the master, the sessions on it are closed"""
+        if not self.started:
+            return
+        self.started = False
+        subprocess.run(self._ssh("-O", "exit"), stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=False)
+
+    def shell_command(self):
+        """Command line of an interactive session on the master, for aexpect"""
+        return " ".join(shlex.quote(arg) for arg in self._ssh("-tt"))
+
+    def run(self, cmd, timeout=60):
+        """
+        Run cmd in the guest on a new channel.
+
+        Returns:
+            A tuple (status, output), output is stdout then stderr.
+        """
+        try:
+            result = subprocess.run(self._ssh() + [cmd], stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    timeout=timeout, check=False)
+        except subprocess.TimeoutExpired as err:
+            raise SSHError("'%s' timed out in %s" % (cmd, self.host), err.output)
+        return result.returncode, result.stdout.decode("utf-8", "replace")
+
+    def scp(self, local_path, remote_path, timeout=600):
+        """
+        Copy local_path to the guest over the master.
+
+        Raises:
+            SSHError: the copy failed
+        """
+        cmd = [SCP_BIN, "-r"] + self.options() + \
+            ["-P", str(self.port), local_path,
+             "%s@[%s]:%s" % (self.username, self.host, remote_path)]
+        try:
+            result = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, timeout=timeout, check=False)
+        except subprocess.TimeoutExpired as err:
+            raise SSHError("scp of %s to %s timed out" % (local_path, self.host), err.output)
+        if result.returncode != 0:
+            raise SSHError("scp of %s to %s failed" % (local_path, self.host),
+                           result.stdout.decode("utf-8", "replace"))
@@ -0,0 +1,100 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""run many guest commands in one round trip"""
+
+import re
+import uuid
+from utils.exception import BatchError
+
+# A script is sent as one line, keep it well below the 4096 bytes
+# line limit of a canonical tty. Longer batches are split.
+MAX_SCRIPT_LEN = 3000
+
+
+def _wrap(marker, index, cmd):
+    """
+    Print delimiters and the exit status around cmd. printf joins the
+    marker with the index, so the echo of the typed line never matches.
+    """
+    return ("printf '\\n%%s:%d:begin\\n' %s; ( %s ) </dev/null 2>&1; "
+            "printf '\\n%%s:%d:end:%%d\\n' %s $?" % (index, marker, cmd, index, marker))
+
+
+def build_scripts(cmds, marker):
+    """
+    Join cmds in shell lines of at most MAX_SCRIPT_LEN bytes, unless a
+    single cmd is longer. Each cmd runs in a subshell, so a cd or an exit
+    does not change the next ones.
+
+    Args:
+        cmds: list of shell commands, one line each
+        marker: delimiter of the outputs
+
+    Returns:
+        [(script, [index of its cmds])]
+    """
+    scripts = list()
+    parts, indexes, length = list(), list(), 0
+    for index, cmd in enumerate(cmds):
+        if "\n" in cmd:
+            raise ValueError("batch command %r has more than one line" % cmd)
+        part = _wrap(marker, index, cmd)
+        if parts and length + len(part) + 2 > MAX_SCRIPT_LEN:
+            scripts.append(("; ".join(parts), indexes))
+            parts, indexes, length = list(), list(), 0
+        parts.append(part)
+        indexes.append(index)
+        length += len(part) + 2
+    if parts:
+        scripts.append(("; ".join(parts), indexes))
+    return scripts
+
+
+def parse_output(output, marker):
+    """
+    Split the output of scripts by their delimiters.
+
+    Returns:
+        {index: (status, output)}
+    """
+    output = output.replace("\r\n", "\n")
+    pattern = re.compile(r"%s:(\d+):begin\n(.*?)\n%s:\1:end:(\d+)" % (marker, marker), re.S)
+    return {int(match.group(1)): (int(match.group(3)), match.group(2))
+            for match in pattern.finditer(output)}
+
+
+def run_batch(run, cmds):
+    """
+    Run cmds in the guest with one round trip per script.
+
+    Args:
+        run: function running a shell line in the guest and returning
+             its output, such as cmd_output of a session
+        cmds: list of shell commands
+
+    Returns:
+        A list of (status, output) of each cmd, in order.
+
+    Raises:
+        BatchError: the status of a cmd is not in the output, the script
+        was cut by a timeout or the shell exited.
+    """
+    marker = "HB%s" % uuid.uuid4().hex[:12]
+    results = list()
+    for script, indexes in build_scripts(cmds, marker):
+        output = run(script)
+        parsed = parse_output(output, marker)
+        for index in indexes:
+            if index not in parsed:
+                raise BatchError(cmds[index], output)
+            results.append(parsed[index])
+    return results
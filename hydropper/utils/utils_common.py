@@ -11,9 +11,11 @@
 # See the Mulan PSL v2 for more details.
 """Some common functions"""
 import os
+import time
 import errno
 import ctypes
 import shutil
+import threading
 from utils.utils_logging import TestLog
 
 LOG = TestLog.get_global_log()
@@ -47,3 +49,63 @@ def remove_existing_dir(dirpath):
         if err.errno == errno.ENOENT:
             return
         raise
+
+def run_stages(stages, times=None):
+    """
+    Run dependent stages, each one in its own thread as soon as the
+    stages it needs are done.
+
+    Args:
+        stages: {name: (function, names of the stages it needs)}
+        times: dict filled with {name: (start, end)} of each stage done
+
+    Returns:
+        times
+
+    Raises:
+        The error of the first failed stage, in the order of stages, once
+        no stage is running. Stages needing a failed stage are skipped.
+    """
+    times = dict() if times is None else times
+    cond = threading.Condition()
+    states = dict()
+    errors = dict()
+
+    def _run(name, func):
+        start = time.time()
+        try:
+            func()
+        # the error is raised again in the caller thread
+        # pylint: disable=broad-except
+        except Exception as err:
+            with cond:
+                errors[name] = err
+                states[name] = "failed"
+                cond.notify_all()
+            return
+        with cond:
+            times[name] = (start, time.time())
+            states[name] = "done"
+            cond.notify_all()
+
+    with cond:
+        while True:
+            for name, (func, needs) in stages.items():
+                if name in states:
+                    continue
+                needed = [states.get(need) for need in needs if need in stages]
+                if "failed" in needed or "skipped" in needed:
+                    LOG.debug("stage %s skipped, a stage it needs failed" % name)
+                    states[name] = "skipped"
+                elif all(state == "done" for state in needed):
+                    states[name] = "running"
+                    threading.Thread(target=_run, args=(name, func), name="stage-%s" % name,
+                                     daemon=True).start()
+            if "running" not in states.values() and len(states) == len(stages):
+                break
+            cond.wait()
+
+    for name in stages:
+        if name in errors:
+            raise errors[name]
+    return times
@@ -0,0 +1,74 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""copy-on-write disk images"""
+
+import os
+import errno
+import fcntl
+from utils.utils_logging import TestLog
+
+LOG = TestLog.get_global_log()
+# ioctl sharing the extents of a file with another one (btrfs, xfs reflink=1)
+FICLONE = 0x40049409
+COPY_CHUNK = 64 * 1024 * 1024
+
+
+def _copy_range(src_fd, dst_fd, offset, length):
+    """Copy length bytes at offset, in the kernel if possible"""
+    while length > 0:
+        chunk = min(length, COPY_CHUNK)
+        try:
+            copied = os.copy_file_range(src_fd, dst_fd, chunk, offset, offset)
+        except (AttributeError, OSError):
+            copied = os.pwrite(dst_fd, os.pread(src_fd, chunk, offset), offset)
+        if copied == 0:
+            return
+        offset += copied
+        length -= copied
+
+
+def _sparse_copy(src_fd, dst_fd, size):
+    """Copy the data extents of src only, holes stay holes in dst"""
+    offset = 0
+    while offset < size:
+        try:
+            data = os.lseek(src_fd, offset, os.SEEK_DATA)
+        except OSError as err:
+            if err.errno == errno.ENXIO:
+                # only a hole is left
+                break
+            raise
+        hole = os.lseek(src_fd, data, os.SEEK_HOLE)
+        _copy_range(src_fd, dst_fd, data, hole - data)
+        offset = hole
+    os.ftruncate(dst_fd, size)
+
+
+def clone_image(src, dst):
+    """
+    Create dst as a writable copy of the disk image src.
+
+    The extents are shared with a reflink where the filesystem supports
+    it, so the clone costs no time and no space until the guest writes.
+    Otherwise the data is copied, skipping the holes of the image.
+
+    Returns:
+        "reflink" or "sparse", how dst was created.
+    """
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+            return "reflink"
+        except OSError as err:
+            LOG.debug("reflink of %s unavailable (%s), sparse copy" % (src, err))
+        _sparse_copy(src_file.fileno(), dst_file.fileno(), os.fstat(src_file.fileno()).st_size)
+    return "sparse"
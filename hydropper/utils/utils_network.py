@@ -15,15 +15,15 @@ import random
 import socket
 from subprocess import run
 
-def generate_random_name():
-    """Generate a random name for tap"""
+def generate_random_name(prefix='t'):
+    """Generate a random name for tap, prefix is at most 4 characters"""
     _code_list = []
     for i in range(10):
         _code_list.append(str(i))
     for i in range(97, 123):
         _code_list.append(chr(i))
 
-    ret = 't'
+    ret = prefix
     _prefix = random.sample(_code_list, 7)
     ret += ''.join(_prefix)
     _postfix = random.sample(_code_list, 2)
@@ -0,0 +1,139 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""performance results and baselines"""
+
+import os
+import json
+from utils.config import CONFIG
+from utils.utils_logging import TestLog
+
+LOG = TestLog.get_global_log()
+
+
+def write_results(name, case, results):
+    """
+    Add the results of a case to <name>.json in the session directory.
+
+    Returns:
+        The result file path.
+    """
+    path = os.path.join(CONFIG.test_session_root_path, name + ".json")
+    saved = dict()
+    if os.path.exists(path):
+        with open(path, "r") as result_file:
+            saved = json.load(result_file)
+    saved[case] = results
+    with open(path, "w") as result_file:
+        json.dump(saved, result_file, indent=2, sort_keys=True)
+    return path
+
+
+def host_meminfo():
+    """Get the host /proc/meminfo as {field: KiB}"""
+    meminfo = dict()
+    with open("/proc/meminfo", "r") as meminfo_file:
+        for line in meminfo_file:
+            field, value = line.split(":", 1)
+            meminfo[field] = int(value.split()[0])
+    return meminfo
+
+
+def process_rss(pid):
+    """Resident KiB of a process, None if it has exited"""
+    try:
+        with open("/proc/%d/status" % pid, "r") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class CpuUsage():
+    """Host cpu usage between two calls of sample(), from /proc/stat"""
+
+    def __init__(self):
+        self.last = self._read()
+
+    @staticmethod
+    def _read():
+        with open("/proc/stat", "r") as stat_file:
+            times = [int(value) for value in stat_file.readline().split()[1:]]
+        # idle and iowait
+        idle = times[3] + times[4]
+        return sum(times) - idle, sum(times)
+
+    def sample(self):
+        """Percent of busy cpu time since the previous sample"""
+        busy, total = self._read()
+        last_busy, last_total = self.last
+        self.last = (busy, total)
+        if total == last_total:
+            return 0.0
+        return 100.0 * (busy - last_busy) / (total - last_total)
+
+
+class PerfBaseline():
+    """
+    Stored results of a benchmark, {case: {metric: summary}}.
+
+    Args:
+        path: json file of the baseline
+        tolerance: allowed relative increase, 0.2 means 20%
+    """
+
+    def __init__(self, path, tolerance):
+        self.path = path
+        self.tolerance = tolerance
+
+    def load(self):
+        """Get the stored results, empty if there are none"""
+        if not os.path.exists(self.path):
+            return dict()
+        with open(self.path, "r") as baseline_file:
+            return json.load(baseline_file)
+
+    def check(self, case, results, stat="mean"):
+        """
+        Compare results of a case with the baseline.
+
+        Args:
+            case: case name
+            results: {metric: summary}, summary is a dict with stat in it
+            stat: the statistic compared, lower is better
+
+        Returns:
+            List of regression messages, empty if there is none.
+        """
+        baseline = self.load().get(case)
+        if baseline is None:
+            LOG.debug("no baseline of %s in %s" % (case, self.path))
+            return []
+        regressions = list()
+        for metric, summary in results.items():
+            if metric not in baseline:
+                continue
+            limit = baseline[metric][stat] * (1 + self.tolerance)
+            if summary[stat] > limit:
+                regressions.append("%s %s %s %.4f > %.4f (baseline %.4f + %d%%)" %
+                                   (case, metric, stat, summary[stat], limit,
+                                    baseline[metric][stat], self.tolerance * 100))
+        return regressions
+
+    def update(self, case, results):
+        """Store results of a case as its new baseline"""
+        stored = self.load()
+        stored[case] = results
+        with open(self.path, "w") as baseline_file:
+            json.dump(stored, baseline_file, indent=2, sort_keys=True)
+        LOG.info("baseline of %s updated in %s" % (case, self.path))
@@ -0,0 +1,235 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""track vm processes with procfs and pidfd"""
+
+import os
+import time
+import select
+import signal
+from utils.utils_logging import TestLog
+from utils.utils_wait import pidfd_open
+from utils.utils_wait import wait_path_exists
+from utils.utils_wait import wait_process_exit
+
+LOG = TestLog.get_global_log()
+PIDFILE_TIMEOUT = 5
+# Scans of /proc until two of them find the same process
+SETTLE_SCANS = 10
+
+
+def scan_cmdlines(bin_path=None):
+    """
+    Read the command line of all processes in one pass of /proc.
+
+    Args:
+        bin_path: only keep processes with bin_path in their arguments
+
+    Returns:
+        {pid: [arg, ...]}
+    """
+    cmdlines = dict()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/%s/cmdline" % entry, "rb") as cmdline_file:
+                data = cmdline_file.read()
+        except OSError:
+            # the process has gone
+            continue
+        if not data:
+            # kernel thread or zombie
+            continue
+        args = os.fsdecode(data).rstrip("\0").split("\0")
+        if bin_path is None or bin_path in args:
+            cmdlines[int(entry)] = args
+    return cmdlines
+
+
+def _ppid(pid):
+    try:
+        with open("/proc/%d/stat" % pid, "r") as stat_file:
+            stat = stat_file.read()
+    except OSError:
+        return None
+    # the command name may contain spaces, it ends with the last ')'
+    return int(stat[stat.rindex(")") + 2:].split()[1])
+
+
+def find_pid(bin_path, key):
+    """
+    Find the process running bin_path with key in its command line.
+
+    A daemonizing process forks itself, and a wrapper may run bin_path as
+    its child: the process is the one without a matching child, the
+    oldest if there are many.
+
+    Returns:
+        pid, or None if no process matches.
+    """
+    matched = [pid for pid, args in scan_cmdlines(bin_path).items()
+               if any(key in arg for arg in args)]
+    parents = set(_ppid(pid) for pid in matched)
+    leaves = [pid for pid in matched if pid not in parents]
+    return min(leaves) if leaves else None
+
+
+def find_settled_pid(bin_path, key, scans=SETTLE_SCANS):
+    """
+    Find the process like find_pid(), scan again until two scans agree,
+    so the short-lived intermediate process of a daemonize is skipped.
+    """
+    pid = find_pid(bin_path, key)
+    for _ in range(scans):
+        time.sleep(0.001)
+        again = find_pid(bin_path, key)
+        if again == pid:
+            break
+        pid = again
+    return pid
+
+
+def read_pidfile(pidfile, timeout=PIDFILE_TIMEOUT):
+    """
+    Wait for a pidfile and read the pid in it.
+
+    Returns:
+        pid, or None if the file is not written in time.
+    """
+    deadline = time.monotonic() + timeout
+    if not wait_path_exists(pidfile, timeout):
+        return None
+    while True:
+        try:
+            with open(pidfile, "r") as pidf:
+                content = pidf.read().strip()
+            if content:
+                return int(content)
+        except (OSError, ValueError):
+            pass
+        # the file is created before the pid is written
+        if time.monotonic() > deadline:
+            return None
+        time.sleep(0.001)
+
+
+class ProcessTracker():
+    """
+    Follow a process by a pidfd.
+
+    The pidfd refers to the process itself, not to its pid number, so
+    is_running() and wait() stay correct even if the pid is reused, and
+    they work for daemonized processes that are not our children.
+
+    It never reaps the process: the exit code of a child stays for its
+    Popen, and a daemonized process is reaped by init, so its exit code
+    can not be known.
+
+    Args:
+        pid: process id
+        match: (bin_path, key) the process was found by. If the process
+        exits while another one matches, that one is followed instead,
+        it was forked by a daemonize.
+    """
+
+    def __init__(self, pid, match=None):
+        self.pid = None
+        self.pidfd = None
+        self.exited = False
+        self.match = match
+        self._open(pid)
+
+    def _open(self, pid):
+        self.close()
+        self.pid = pid
+        self.exited = False
+        try:
+            self.pidfd = pidfd_open(pid)
+        except ProcessLookupError:
+            self.exited = True
+        except OSError as err:
+            LOG.debug("pidfd unavailable (%s), track pid %d by /proc" % (err, pid))
+
+    def _on_exit(self):
+        """The process exited, follow its successor if there is one"""
+        self.exited = True
+        if self.match is None:
+            return
+        successor = find_pid(*self.match)
+        if successor is not None and successor != self.pid:
+            LOG.debug("pid %d exited, follow pid %d" % (self.pid, successor))
+            self._open(successor)
+
+    def __repr__(self):
+        return "ProcessTracker(pid=%s, running=%s)" % (self.pid, self.is_running())
+
+    @classmethod
+    def from_pidfile(cls, pidfile, timeout=PIDFILE_TIMEOUT):
+        """Track the process written in pidfile, None if there is none"""
+        pid = read_pidfile(pidfile, timeout)
+        return None if pid is None else cls(pid)
+
+    @classmethod
+    def from_cmdline(cls, bin_path, key):
+        """Track the process running bin_path with key in its arguments, None if there is none"""
+        pid = find_settled_pid(bin_path, key)
+        return None if pid is None else cls(pid, match=(bin_path, key))
+
+    def _poll_exit(self):
+        if self.pidfd is not None:
+            poller = select.poll()
+            poller.register(self.pidfd, select.POLLIN)
+            return bool(poller.poll(0))
+        return not os.path.exists("/proc/%d" % self.pid)
+
+    def is_running(self):
+        """Returns true if the process has not exited"""
+        while not self.exited and self._poll_exit():
+            self._on_exit()
+        return not self.exited
+
+    def wait(self, timeout=None):
+        """
+        Wait for the process to exit.
+
+        Args:
+            timeout: seconds to wait, None means forever
+
+        Returns:
+            True if the process exited.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.exited:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            if self.pidfd is None:
+                exited = wait_process_exit(self.pid, float("inf") if remaining is None else remaining)
+            else:
+                poller = select.poll()
+                poller.register(self.pidfd, select.POLLIN)
+                exited = bool(poller.poll(None if remaining is None else remaining * 1000))
+            if not exited:
+                return False
+            self._on_exit()
+        return True
+
+    def send_signal(self, sig=signal.SIGKILL):
+        """Send a signal to the process, not to a process that reused its pid"""
+        if self.pidfd is not None and hasattr(signal, "pidfd_send_signal"):
+            signal.pidfd_send_signal(self.pidfd, sig)
+        else:
+            os.kill(self.pid, sig)
+
+    def close(self):
+        """Release the pidfd"""
+        if self.pidfd is not None:
+            os.close(self.pidfd)
+            self.pidfd = None
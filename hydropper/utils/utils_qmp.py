@@ -12,7 +12,284 @@
 """Some qmp fuctions"""
 
 import re
+import json
+import time
+import itertools
+import threading
+from collections import deque
 from utils.exception import QMPError
+from utils.exception import QMPConnectError
+from utils.exception import QMPTimeoutError
+from utils.utils_stats import LatencyRecorder
+
+QMP_RECV_SIZE = 65536
+# Events kept for each event name before the oldest one is dropped
+QMP_EVENT_QUEUE_LEN = 256
+# Latency of every qmp command, indexed by (vm name, command)
+QMP_LATENCY = LatencyRecorder()
+
+
+class QMPStreamBuffer():
+    """
+    Incremental framer for the newline delimited QMP json stream.
+
+    Received bytes are appended to a persistent buffer, and every complete
+    line is parsed and queued exactly once. A partial line stays in the
+    buffer until the rest of it arrives, and bytes that have been scanned
+    already are not searched for a delimiter again.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._scanned = 0
+        self.messages = deque()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def feed(self, data):
+        """
+        Append raw socket data and queue all complete messages.
+
+        Args:
+            data: bytes received from the monitor socket
+
+        Returns:
+            The number of messages queued by this call.
+
+        Raises:
+            ValueError: a line is not json. Bad lines are dropped and every
+            other complete message is queued, then the first error is raised.
+        """
+        self._buf.extend(data)
+        count = 0
+        start = 0
+        error = None
+        view = memoryview(self._buf)
+        try:
+            while True:
+                end = self._buf.find(b'\n', max(start, self._scanned))
+                if end < 0:
+                    break
+                line = view[start:end].tobytes()
+                start = end + 1
+                if not line.strip():
+                    continue
+                try:
+                    self.messages.append(json.loads(line))
+                except ValueError as err:
+                    error = error or err
+                    continue
+                count += 1
+        finally:
+            view.release()
+        if start:
+            del self._buf[:start]
+        self._scanned = len(self._buf)
+        if error is not None:
+            raise error
+        return count
+
+    def pop(self):
+        """Pop the oldest queued message, or None if there is none"""
+        if self.messages:
+            return self.messages.popleft()
+        return None
+
+    def pending_bytes(self):
+        """Bytes of an incomplete message still held in the buffer"""
+        return len(self._buf)
+
+    def clear(self):
+        """Drop queued messages and any partial data"""
+        self._buf.clear()
+        self._scanned = 0
+        self.messages.clear()
+
+
+def match_event(match):
+    """
+    Build an event predicate from a match dict, such as
+    {'data': {'guest': False, 'reason': 'host-qmp-quit'}}.
+    An event matches if any key of match has the same value in it.
+    """
+    if not match:
+        return None
+
+    def _predicate(event):
+        for key in match:
+            if key in event and match[key] == event[key]:
+                return True
+        return False
+    return _predicate
+
+
+class _EventWaiter():
+    """A registered event_wait() call"""
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+        self.event = None
+
+    def offer(self, event):
+        """Take the event if it matches and nothing is taken yet"""
+        if self.event is None and (self.predicate is None or self.predicate(event)):
+            self.event = event
+            return True
+        return False
+
+
+class QMPEventDispatcher():
+    """
+    QMP events indexed by event name.
+
+    Every event name has its own bounded deque, so waiting for one name
+    never scans events of other names, and an event storm only evicts
+    the oldest events of the same name. Threads blocked in wait() are
+    registered as waiters and are handed a matching event directly when
+    it is put.
+
+    Events can be put by a reader thread (wait() then blocks on a
+    condition variable), or by a pump callable that wait() calls itself
+    to read from a blocking socket.
+    """
+
+    def __init__(self, maxlen=QMP_EVENT_QUEUE_LEN):
+        self.maxlen = maxlen
+        self.received = 0
+        self.dropped = 0
+        self.overflows = dict()
+        self.closed = False
+        self._queues = dict()
+        self._waiters = dict()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def put(self, event):
+        """Hand an event to a waiter, or queue it under its name"""
+        name = event.get('event')
+        with self._cond:
+            self.received += 1
+            for key in (name, None):
+                for waiter in self._waiters.get(key, ()):
+                    if waiter.offer(event):
+                        self._cond.notify_all()
+                        return
+            queue = self._queues.get(name)
+            if queue is None:
+                queue = self._queues[name] = deque(maxlen=self.maxlen)
+            if len(queue) == self.maxlen:
+                self.dropped += 1
+                self.overflows[name] = self.overflows.get(name, 0) + 1
+            queue.append((next(self._seq), event))
+            self._cond.notify_all()
+
+    def close(self):
+        """Wake up all waiters, the connection is gone"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def _take(self, name, predicate):
+        """Remove and return the oldest queued event that matches"""
+        if name is None:
+            candidates = [queue for queue in self._queues.values() if queue]
+            candidates.sort(key=lambda queue: queue[0][0])
+        else:
+            candidates = [self._queues.get(name, ())]
+        for queue in candidates:
+            for index, (_, event) in enumerate(queue):
+                if predicate is None or predicate(event):
+                    del queue[index]
+                    return event
+        return None
+
+    def pop(self, name=None, predicate=None):
+        """
+        Pop the oldest queued event without waiting.
+
+        Args:
+            name: event name, None means any name
+            predicate: callable to filter events, None means any event
+
+        Returns:
+            The event, or None.
+        """
+        with self._cond:
+            return self._take(name, predicate)
+
+    def wait(self, name=None, predicate=None, timeout=None, pump=None):
+        """
+        Pop the oldest matching event, wait for it if it's not queued.
+
+        Args:
+            name: event name, None means any name
+            predicate: callable to filter events, None means any event
+            timeout: seconds to wait, None means forever
+            pump: callable(timeout) that reads more events and puts them
+
+        Raises:
+            QMPTimeoutError if no event matches in time
+            QMPConnectError if the connection is closed
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        waiter = _EventWaiter(predicate)
+        with self._cond:
+            event = self._take(name, predicate)
+            if event is not None:
+                return event
+            self._waiters.setdefault(name, []).append(waiter)
+        try:
+            while True:
+                remaining = None if deadline is None else deadline - time.time()
+                if pump is not None:
+                    if remaining is not None and remaining <= 0:
+                        break
+                    pump(remaining)
+                    if waiter.event is not None:
+                        return waiter.event
+                    continue
+                with self._cond:
+                    self._cond.wait_for(lambda: waiter.event is not None or self.closed,
+                                        remaining)
+                    if waiter.event is not None:
+                        return waiter.event
+                    if self.closed:
+                        raise QMPConnectError("Error while receiving from socket")
+                    if deadline is not None and time.time() >= deadline:
+                        break
+        finally:
+            with self._cond:
+                self._waiters[name].remove(waiter)
+                if not self._waiters[name]:
+                    del self._waiters[name]
+        if waiter.event is not None:
+            return waiter.event
+        raise QMPTimeoutError("Timeout waiting for event %s" % (name or ""))
+
+    def snapshot(self):
+        """Return all queued events in arrival order, without removing them"""
+        with self._cond:
+            items = [item for queue in self._queues.values() for item in queue]
+        return [event for _, event in sorted(items, key=lambda item: item[0])]
+
+    def clear(self):
+        """Drop all queued events"""
+        with self._cond:
+            self._queues.clear()
+
+    def stats(self):
+        """Counters of received, queued and dropped events"""
+        with self._cond:
+            return {"received": self.received,
+                    "queued": sum(len(queue) for queue in self._queues.values()),
+                    "dropped": self.dropped,
+                    "overflows": dict(self.overflows)}
+
 
 def dictpath(dictionary, path):
     """Traverse a path in a nested dict"""
@@ -0,0 +1,222 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""Some statistics functions"""
+
+import threading
+
+# Sub buckets per power of two. Values from SUB_BUCKETS up fall in the upper
+# half of them, so a bucket spans at most 1 / HALF_SUB_BUCKETS (1.56%) of
+# its lowest value.
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+# Values are recorded in microseconds
+UNITS_PER_SECOND = 1000000
+
+
+def _bucket_index(value):
+    """Map a non negative integer to its log-linear bucket"""
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + (value >> shift) - HALF_SUB_BUCKETS
+
+
+def _bucket_value(index):
+    """Highest integer of a bucket"""
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index - SUB_BUCKETS) // HALF_SUB_BUCKETS + 1
+    sub = (index - SUB_BUCKETS) % HALF_SUB_BUCKETS + HALF_SUB_BUCKETS
+    return ((sub + 1) << shift) - 1
+
+
+class LatencyHistogram():
+    """
+    HDR style latency histogram.
+
+    Buckets are linear inside each power of two, so a percentile is off
+    by at most 1 / HALF_SUB_BUCKETS (1.56%) of its value at any magnitude,
+    while the memory used grows only with the log of the range. Values
+    below SUB_BUCKETS microseconds, min, max, sum and count are exact.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = dict()
+        self.count = 0
+        self.errors = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def __len__(self):
+        return self.count
+
+    def record(self, seconds, error=False):
+        """
+        Record one latency.
+
+        Args:
+            seconds: the latency
+            error: the operation failed, it is counted in errors as well
+        """
+        value = max(0, int(seconds * UNITS_PER_SECOND))
+        index = _bucket_index(value)
+        with self.lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += value
+            if error:
+                self.errors += 1
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def merge(self, other):
+        """Add the values of another histogram to this one"""
+        with other.lock:
+            counts = dict(other.counts)
+            count, errors, total = other.count, other.errors, other.total
+            vmin, vmax = other.min, other.max
+        if not count:
+            return
+        with self.lock:
+            for index, num in counts.items():
+                self.counts[index] = self.counts.get(index, 0) + num
+            self.count += count
+            self.errors += errors
+            self.total += total
+            self.min = vmin if self.min is None else min(self.min, vmin)
+            self.max = vmax if self.max is None else max(self.max, vmax)
+
+    def percentile(self, percent):
+        """
+        Get the latency in seconds below which percent of values fall.
+
+        Args:
+            percent: 0 - 100
+        """
+        with self.lock:
+            if not self.count:
+                return 0.0
+            target = max(1, int(round(self.count * percent / 100.0)))
+            seen = 0
+            for index in sorted(self.counts):
+                seen += self.counts[index]
+                if seen >= target:
+                    value = min(_bucket_value(index), self.max)
+                    return value / UNITS_PER_SECOND
+            return self.max / UNITS_PER_SECOND
+
+    def summary(self):
+        """
+        Summarize the histogram.
+
+        Returns:
+            {"count": xx, "errors": xx, "min": xx, "mean": xx, "p50": xx,
+             "p90": xx, "p99": xx, "max": xx}, latencies in seconds
+        """
+        if not self.count:
+            return {"count": 0, "errors": 0, "min": 0.0, "mean": 0.0,
+                    "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+        return {"count": self.count,
+                "errors": self.errors,
+                "min": self.min / UNITS_PER_SECOND,
+                "mean": self.total / self.count / UNITS_PER_SECOND,
+                "p50": self.percentile(50),
+                "p90": self.percentile(90),
+                "p99": self.percentile(99),
+                "max": self.max / UNITS_PER_SECOND}
+
+
+class LatencyRecorder():
+    """Latency histograms indexed by (owner, operation), such as (vm, qmp command)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = dict()
+
+    def record(self, owner, operation, seconds, error=False):
+        """Record one latency of operation done by owner"""
+        key = (owner, operation)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(seconds, error)
+
+    def reset(self):
+        """
+        Drop all histograms.
+
+        Returns:
+            The dropped histograms.
+        """
+        with self.lock:
+            histograms = self.histograms
+            self.histograms = dict()
+        return histograms
+
+    def summary(self, histograms=None):
+        """
+        Summarize histograms, by default the recorded ones.
+
+        Returns:
+            {owner: {operation: LatencyHistogram.summary()}}
+        """
+        if histograms is None:
+            with self.lock:
+                histograms = dict(self.histograms)
+        result = dict()
+        for (owner, operation), histogram in sorted(histograms.items()):
+            result.setdefault(owner, dict())[operation] = histogram.summary()
+        return result
+
+    @staticmethod
+    def merge_by_operation(histograms):
+        """Merge the histograms of all owners, {operation: LatencyHistogram}"""
+        result = dict()
+        for (_, operation), histogram in histograms.items():
+            if operation not in result:
+                result[operation] = LatencyHistogram()
+            result[operation].merge(histogram)
+        return result
+
+
+def sample_summary(samples):
+    """
+    Summarize a list of samples, percentiles are interpolated.
+
+    Returns:
+        {"count": xx, "mean": xx, "stdev": xx, "min": xx, "p50": xx,
+         "p90": xx, "p99": xx, "max": xx}
+    """
+    if not samples:
+        return {"count": 0, "mean": 0.0, "stdev": 0.0, "min": 0.0,
+                "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    count = len(ordered)
+    mean = sum(ordered) / count
+    stdev = (sum((value - mean) ** 2 for value in ordered) / (count - 1)) ** 0.5 \
+        if count > 1 else 0.0
+
+    def _percentile(percent):
+        rank = (count - 1) * percent / 100.0
+        low = int(rank)
+        high = min(low + 1, count - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+    return {"count": count, "mean": mean, "stdev": stdev, "min": ordered[0],
+            "p50": _percentile(50), "p90": _percentile(90), "p99": _percentile(99),
+            "max": ordered[-1]}
@@ -0,0 +1,181 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""event driven waits for files and processes"""
+
+import os
+import time
+import errno
+import select
+import ctypes
+import ctypes.util
+from utils.utils_logging import TestLog
+from utils.utils_stats import LatencyRecorder
+
+LOG = TestLog.get_global_log()
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+NR_PIDFD_OPEN = 434
+# Polling interval bounds of the fallback waits, in seconds
+POLL_MIN_INTERVAL = 0.001
+POLL_MAX_INTERVAL = 0.05
+# Time to ready and time to exit of vms, by (vm name, stage)
+VM_LIFECYCLE = LatencyRecorder()
+
+try:
+    _LIBC = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+except OSError:
+    _LIBC = None
+
+
+def _poll_until(condition, deadline):
+    """Check condition with a growing interval until it is true or deadline"""
+    interval = POLL_MIN_INTERVAL
+    while not condition():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, POLL_MAX_INTERVAL)
+    return True
+
+
+def _wait_readable(fd, deadline):
+    """Wait until fd is readable or deadline"""
+    poller = select.poll()
+    poller.register(fd, select.POLLIN)
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return False
+    return bool(poller.poll(remaining * 1000))
+
+
+def _inotify_watch(directory):
+    """
+    Watch entries created in directory.
+
+    Returns:
+        A non-blocking inotify fd.
+
+    Raises:
+        OSError if inotify is not available
+    """
+    if _LIBC is None:
+        raise OSError(errno.ENOSYS, "libc is not available")
+    inotify_fd = _LIBC.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if inotify_fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    if _LIBC.inotify_add_watch(inotify_fd, os.fsencode(directory), IN_CREATE | IN_MOVED_TO) < 0:
+        err = ctypes.get_errno()
+        os.close(inotify_fd)
+        raise OSError(err, "inotify_add_watch %s failed" % directory)
+    return inotify_fd
+
+
+def _drain(fd):
+    try:
+        while os.read(fd, 65536):
+            pass
+    except BlockingIOError:
+        pass
+
+
+def wait_path_exists(path, timeout):
+    """
+    Wait until a path, such as a console or monitor socket, is created.
+
+    The parent directory is watched with inotify, so the caller wakes up
+    as soon as the entry appears. Without inotify it falls back to polling.
+
+    Args:
+        path: file path
+        timeout: seconds to wait
+
+    Returns:
+        True if path exists, False if timeout.
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        inotify_fd = _inotify_watch(os.path.dirname(os.path.abspath(path)))
+    except OSError as err:
+        LOG.debug("inotify unavailable (%s), polling %s" % (err, path))
+        return _poll_until(lambda: os.path.exists(path), deadline)
+
+    try:
+        # The watch is set before this check, so no creation is missed.
+        while not os.path.exists(path):
+            if not _wait_readable(inotify_fd, deadline):
+                return os.path.exists(path)
+            _drain(inotify_fd)
+        return True
+    finally:
+        os.close(inotify_fd)
+
+
+def pidfd_open(pid):
+    """
+    Get a pidfd which becomes readable when process pid exits.
+
+    Raises:
+        ProcessLookupError if pid does not exist
+        OSError if pidfd is not supported
+    """
+    if hasattr(os, "pidfd_open"):
+        return os.pidfd_open(pid)
+    if _LIBC is None:
+        raise OSError(errno.ENOSYS, "libc is not available")
+    pidfd = _LIBC.syscall(NR_PIDFD_OPEN, pid, 0)
+    if pidfd < 0:
+        err = ctypes.get_errno()
+        if err == errno.ESRCH:
+            raise ProcessLookupError(err, "no such process %d" % pid)
+        raise OSError(err, "pidfd_open failed")
+    return pidfd
+
+
+def _process_exited(pid):
+    """True if pid is gone or a zombie, an unreaped child keeps its /proc entry"""
+    try:
+        with open("/proc/%d/stat" % pid, "r") as stat_file:
+            stat = stat_file.read()
+    except OSError:
+        return True
+    # the state follows the command name, which may hold spaces and parentheses
+    fields = stat[stat.rfind(")") + 1:].split()
+    return not fields or fields[0] in ("Z", "X")
+
+
+def wait_process_exit(pid, timeout):
+    """
+    Wait until process pid exits.
+
+    A pidfd is polled, so any process (not only children) is watched
+    without polling. Without pidfd (linux < 5.3) it falls back to
+    polling /proc/<pid>/stat, a zombie counts as exited.
+
+    Returns:
+        True if the process exited, False if timeout.
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        pidfd = pidfd_open(pid)
+    except ProcessLookupError:
+        return True
+    except OSError as err:
+        LOG.debug("pidfd unavailable (%s), polling pid %d" % (err, pid))
+        return _poll_until(lambda: _process_exited(pid), deadline)
+
+    try:
+        return _wait_readable(pidfd, deadline)
+    finally:
+        os.close(pidfd)
@@ -18,17 +18,39 @@ import json
 import logging
 import socket
 import errno
+import copy
+from collections import deque
 import aexpect
 from aexpect.exceptions import ExpectError
-from retrying import retry
 from utils.config import CONFIG
 from utils import utils_common
 from utils import utils_network
 from utils import remote
+from utils import utils_batch
+from utils.utils_qmp import QMPStreamBuffer
+from utils.utils_qmp import QMP_RECV_SIZE
+from utils.utils_qmp import QMPEventDispatcher
+from utils.utils_qmp import match_event
+from utils.utils_qmp import QMP_LATENCY
+from utils.qmp_client import AsyncQMPClient
+from utils.utils_wait import VM_LIFECYCLE
+from utils.utils_wait import wait_path_exists
+from utils.utils_wait import wait_process_exit
+from utils.utils_process import ProcessTracker
+from utils.utils_process import find_pid
 from utils.utils_logging import TestLog
 from utils.session import ConsoleManager
+from utils.console import NativeConsole
+from utils.serial_capture import SerialCapture
+from utils.console_ring import ConsoleRing
+from utils.console_ring import CONSOLE_RINGS
 from utils.resources import NETWORKS
 from utils.resources import VSOCKS
+from utils.guest_ready import GUEST_READY
+from utils.guest_ready import READY_PORT_PARAM
+from utils.guest_agent import GuestAgent
+from utils.ssh_transport import SSHTransport
+from utils.ssh_transport import session_key
 from utils.exception import VMLifeError
 from utils.exception import QMPError
 from utils.exception import QMPConnectError
@@ -36,11 +58,19 @@ from utils.exception import QMPCapabilitiesError
 from utils.exception import QMPTimeoutError
 from utils.exception import SSHError
 from utils.exception import LoginTimeoutError
+from utils.exception import GuestAgentError
 
 LOG = TestLog.get_global_log()
 LOGIN_TIMEOUT = 10
 LOGIN_WAIT_TIMEOUT = 60 * CONFIG.timeout_factor
 SERIAL_TIMEOUT = 0.5 if CONFIG.timeout_factor > 1 else None
+BATCH_TIMEOUT = 60 * CONFIG.timeout_factor
+QMP_PIPELINE_WINDOW = 64
+CONSOLE_CREATE_TIMEOUT = 10
+PID_EXIT_TIMEOUT = 30
+# Bounds of terminate(): seconds given to quit, then to SIGTERM
+QUIT_TIMEOUT = 5
+TERM_TIMEOUT = 3
 
 
 class BaseVM:
@@ -59,24 +89,27 @@ class BaseVM:
             args = []
         self.__qmp = None
         self.__qmp_set = True
+        self._qmp_client = None
+        self._qmp_connected = False
         # Copy args in case ew modify them.
         self._args = list(args)
         self._console_address = None
         self._console_device_index = None
         self._console_device_type = None
         self._console_set = True
-        self._events = []
         self._launched = False
+        self._launch_time = None
         self._machine = machine
         self._monitor_address = mon_sock
         self._name = name
         self._popen = None
         self._remove_files = list()
+        self._shutdown_time = None
         self._vm_monitor = None
         self.bin_path = bin_path
         self.config_json = config
         self.configdict = json.load(fp=open(self.config_json, "r"))
-        self.console_manager = ConsoleManager()
+        self.console_manager = ConsoleManager(name)
         self.daemon = daemon
         self.dump_guest_core = dump_guest_core
         self.env = dict()
@@ -89,18 +122,41 @@ class BaseVM:
         self.init_args = args
         self.interfaces = []
         self.ipalloc_type = ipalloc
+        self.ready_mode = CONFIG.ready_mode
+        self._ready_by_vsock = False
+        # add a vsock device for the guest agent
+        self.use_agent = CONFIG.guest_agent
+        self._guest_agent = None
+        self.lifecycle = dict()
+        # {stage: {"start": seconds after bring-up began, "duration": seconds}}
+        self.bringup = dict()
         self.logpath = '/var/log/stratovirt'
         self.mem_share = mem_share
         self.mon_sock = mon_sock
+        self.process = None
         self.pid = None
         self.pidfile = None
+        self.qmp_async = False
+        self.qmp_hub = None
         self.root_path = root_path
         self._sock_dir = self.root_path
         self.seccomp = True
         self.serial_console = None
-        self.serial_log = TestLog.get_log_handle(self._name + "_serial")
-        self.serial_session = None
+        # full console output on disk, if SERIAL_CAPTURE is set
+        self.serial_log = SerialCapture.get(self._name) if CONFIG.serial_capture else None
+        # the last CONSOLE_RING_SIZE bytes of console output, dumped if a test fails
+        self.console_ring = ConsoleRing("%s_%s" % (self._name, uuid[:8]))
+        self._serial_session = None
+        # the serial console logs in on first use, the guest is ready
+        self._serial_pending = False
         self.ssh_session = None
+        # ssh master of the vm, see ssh_transport
+        self._ssh_transport = None
+        # the master could not log in, ssh falls back to password logins
+        self._ssh_fallback = False
+        # "<type> <key>" host keys of the guest, None until enable_ssh_login
+        # authorizes the session key
+        self._ssh_host_keys = None
         self.taps = list()
         self.vhost_type = None
         self.vmid = uuid
@@ -120,13 +176,50 @@ class BaseVM:
     def __enter__(self):
         return self
 
+    @property
+    def name(self):
+        """Name of the vm"""
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        self._name = value
+
+    @property
+    def pid(self):
+        """Pid of the vm process, it follows the process across a daemonize"""
+        if self.process is not None:
+            return self.process.pid
+        return self._pid
+
+    @pid.setter
+    def pid(self, value):
+        self._pid = value
+
+    @property
+    def launch_time(self):
+        """Host time when the vm process was started by launch()"""
+        return self._launch_time
+
     def get_pid(self):
-        """Get pid from ps"""
-        _cmd = "ps -ef | grep %s | grep %s | " \
-               "awk '{print $2}' | head -1" % (self.bin_path, self.vmid)
-        output = subprocess.getoutput(_cmd)
-        LOG.debug("get output %s" % output.strip())
-        return int(output.strip())
+        """Get pid from /proc, by the command line with bin_path and vmid"""
+        pid = find_pid(self.bin_path, self.vmid)
+        LOG.debug("get pid %s" % pid)
+        return pid
+
+    def _track_daemon(self):
+        """
+        Track the daemonized vm process, from its pidfile if it has one,
+        or else from its command line.
+        """
+        process = None
+        if self.withpid:
+            process = ProcessTracker.from_pidfile(self.pidfile)
+        if process is None:
+            process = ProcessTracker.from_cmdline(self.bin_path, self.vmid)
+        if process is None and not self.error_test:
+            raise VMLifeError("vm %s process is not found after daemonize" % self._name)
+        return process
 
     def get_pid_from_file(self):
         """Get pid from file"""
@@ -144,25 +237,23 @@ class BaseVM:
         if not self._launched:
             return
 
+        self._shutdown_time = time.time()
         self._pre_shutdown()
-        if self.daemon or self.is_running():
-            if self.__qmp:
+        if self.is_running():
+            if self.__qmp or self._qmp_client:
                 try:
                     if not has_quit:
                         self.cmd('quit')
                         self.event_wait(name='SHUTDOWN', timeout=10,
                                         match={'data': {'guest': False, 'reason': 'host-qmp-quit'}})
-                # Kill popen no matter what exception occurs
+                # Kill the vm no matter what exception occurs
                 # pylint: disable=broad-except
                 except Exception:
                     logging.error('match failed!')
-                    self._popen.kill()
+                    self.send_signal(9)
             else:
-                self._popen.kill()
-        if not self.daemon:
-            self._popen.wait()
-        else:
-            self.wait_pid_exit()
+                self.send_signal(9)
+        self._wait_exit()
         self._post_shutdown()
         self._launched = False
 
@@ -171,12 +262,10 @@ class BaseVM:
         if not self._launched:
             return
 
+        self._shutdown_time = time.time()
         self._pre_shutdown()
-        subprocess.run("kill -%d %s" % (signal, self.pid), shell=True, check=True)
-        if not self.daemon:
-            self._popen.wait()
-        else:
-            self.wait_pid_exit()
+        self.send_signal(signal)
+        self._wait_exit()
         self._post_shutdown()
         self._launched = False
 
@@ -185,8 +274,9 @@ class BaseVM:
         if not self._launched:
             return
 
+        self._shutdown_time = time.time()
         self._pre_shutdown()
-        if self.daemon or self.is_running():
+        if self.is_running():
             if self.serial_session:
                 try:
                     self.serial_session.run_func("cmd_output", "reboot")
@@ -197,12 +287,27 @@ class BaseVM:
                     pass
             else:
                 return
+        self._wait_exit()
+        self._post_shutdown()
+        self._launched = False
+
+    def send_signal(self, signum):
+        """Send a signal to the vm process, nothing to do if it has exited"""
+        try:
+            if self.process is not None:
+                self.process.send_signal(signum)
+            else:
+                os.kill(self.pid, signum)
+        except ProcessLookupError:
+            LOG.debug("vm %s process %s has exited" % (self._name, self.pid))
+
+    def _wait_exit(self):
+        """Wait for the vm process to exit after a shutdown request"""
         if not self.daemon:
             self._popen.wait()
+            self._record_lifecycle("exit", self._shutdown_time)
         else:
             self.wait_pid_exit()
-        self._post_shutdown()
-        self._launched = False
 
     def _post_shutdown(self):
         """Post shutdown"""
@@ -215,22 +320,46 @@ class BaseVM:
                 command = ''
             LOG.warning(msg, exitcode, command)
 
-        if self.__qmp:
+        if self.__qmp or self._qmp_client:
             self.close_sock()
 
-        if self.serial_session:
-            self.serial_session.run_func("close")
+        self._serial_pending = False
+        if self._serial_session:
+            self._serial_session.run_func("close")
 
         if self.ssh_session:
             self.ssh_session.close()
 
+        if self._ssh_transport is not None:
+            self._ssh_transport.stop()
+            if self._ssh_transport.known_hosts is not None:
+                utils_common.remove_existing_file(self._ssh_transport.known_hosts)
+            self._ssh_transport = None
+        self._ssh_fallback = False
+        self._ssh_host_keys = None
+
+        self.console_ring.stopped = True
+        if self.serial_log is not None:
+            self.serial_log.flush(0)
+
+        if self._guest_agent is not None:
+            self._guest_agent.close()
+            self._guest_agent = None
+
         for _file in self._remove_files:
             utils_common.remove_existing_file(_file)
 
         if self.withpid:
             subprocess.run("rm -rf %s" % self.pidfile, shell=True, check=True)
 
+        if self.process is not None:
+            self.pid = self.process.pid
+            self.process.close()
+            self.process = None
+
     def _pre_launch(self):
+        self.console_ring.stopped = False
+        CONSOLE_RINGS.track(self.console_ring)
         if self.__qmp_set:
             if self._monitor_address is not None:
                 self._vm_monitor = self._monitor_address
@@ -241,32 +370,114 @@ class BaseVM:
                                                 self._name + "_" + self.vmid + ".sock")
                 self._remove_files.append(self._vm_monitor)
 
+        self._ready_by_vsock = self.ready_mode == "vsock" and self._has_boot_args() \
+            and GUEST_READY.start() and VSOCKS.init_vsock()
+        if self._ready_by_vsock and self.vsocknums == 0:
+            self.vsocknums = 1
+        if self.use_agent and self.vsocknums == 0 and VSOCKS.init_vsock():
+            self.vsocknums = 1
         self.parser_config_to_args()
 
+    def _has_boot_args(self):
+        """
+        True if the config has kernel boot args, the guest notifier
+        finds the ready port in them
+        """
+        if self.configdict is not None and \
+                "boot_args" in self.configdict.get("boot-source", {}):
+            return True
+        LOG.warning("vm %s has no boot_args to pass %s, wait for serial login instead "
+                    "of vsock ready" % (self._name, READY_PORT_PARAM))
+        return False
+
+    def console_output(self, line):
+        """Keep a line of console output in the ring and the capture file"""
+        self.console_ring.append(line)
+        if self.serial_log is not None:
+            self.serial_log.write(line)
+
+    def console_history(self, pattern=None, since=None, until=None):
+        """
+        Search the console output kept in the ring.
+
+        Args:
+            pattern: regular expression searched in the lines, all lines if None
+            since: only lines read at or after this time (seconds since epoch)
+            until: only lines read at or before this time
+
+        Returns:
+            [(timestamp, line)], oldest first
+        """
+        return self.console_ring.history(pattern, since, until)
+
     def create_serial_control(self):
         """Create serial control"""
         self._wait_console_create()
-        self.serial_console = aexpect.ShellSession(
-            "/usr/bin/nc -U %s" % self._console_address,
-            auto_close=False,
-            output_func=self.serial_log.debug,
-            prompt=r"[\#\$]",
-            status_test_command="echo $?"
-        )
+        if CONFIG.console_engine == "native":
+            self.serial_console = NativeConsole(
+                self._console_address,
+                output_func=self.console_output,
+                prompt=r"[\#\$]",
+                status_test_command="echo $?"
+            )
+        else:
+            self.serial_console = aexpect.ShellSession(
+                "/usr/bin/nc -U %s" % self._console_address,
+                auto_close=False,
+                output_func=self.console_output,
+                prompt=r"[\#\$]",
+                status_test_command="echo $?"
+            )
         self.console_manager.config_console(self.serial_console)
 
-    def create_ssh_session(self):
-        """Create ssh session"""
-        user_known_hosts_file = '/dev/null'
-        port = 22
+    @property
+    def ssh_transport(self):
+        """
+        SSHTransport of the vm, started on first use. None if SSH_CONTROL_MASTER
+        is not set or the master can not log in with the session key.
+        """
+        if self._ssh_transport is not None or self._ssh_fallback:
+            return self._ssh_transport
+        if not CONFIG.ssh_control_master or self._ssh_host_keys is None:
+            return None
         _, output = self.serial_cmd("ping -c 2 %s" % NETWORKS.ipaddr)
         LOG.debug("check ping result %s" % output)
+        # host keys are not checked if they could not be read
+        known_hosts = None
+        if self._ssh_host_keys:
+            known_hosts = os.path.join(self._sock_dir, "ssh-%s.known_hosts" % self.vmid[:8])
+            with open(known_hosts, "w") as known_hosts_file:
+                for host_key in self._ssh_host_keys:
+                    known_hosts_file.write("%s %s\n" % (self.guest_ip, host_key))
+        transport = SSHTransport(self.guest_ip, CONFIG.vm_username,
+                                 session_key(CONFIG.test_session_root_path)[0],
+                                 os.path.join(self._sock_dir, "ssh-%s.ctl" % self.vmid[:8]),
+                                 known_hosts=known_hosts)
+        try:
+            transport.start()
+        except SSHError as err:
+            LOG.warning("ssh master of %s failed, using password logins: %s" % (self._name, err))
+            if known_hosts is not None:
+                utils_common.remove_existing_file(known_hosts)
+            self._ssh_fallback = True
+            return None
+        self._ssh_transport = transport
+        return transport
+
+    def create_ssh_session(self):
+        """Create ssh session, a channel of the ssh master if it is running"""
+        transport = self.ssh_transport
+        if transport is not None:
+            command = transport.shell_command()
+        else:
+            _, output = self.serial_cmd("ping -c 2 %s" % NETWORKS.ipaddr)
+            LOG.debug("check ping result %s" % output)
+            command = "ssh %s -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no " \
+                      "-p 22" % self.guest_ip
         ssh_session = aexpect.ShellSession(
-            "ssh %s -o UserKnownHostsFile=%s -o StrictHostKeyChecking=no -p %s" % (
-                self.guest_ip, user_known_hosts_file, port
-            ),
+            command,
             auto_close=False,
-            output_func=self.serial_log.debug,
+            output_func=self.console_output,
             prompt=r"[\#\$]",
             status_test_command="echo $?"
         )
@@ -282,6 +493,28 @@ class BaseVM:
 
         return ssh_session
 
+    def ssh_cmd(self, cmd, timeout=60):
+        """
+        Run a cmd in vm via ssh, on a channel of the ssh master if it is running
+
+        Args:
+            cmd: cmd run in vm
+            timeout: seconds to wait for cmd
+
+        Returns:
+            A tuple (status, output) where status is the exit status
+            and output is the stdout then stderr of cmd
+        """
+        LOG.debug("Attempting to run cmd '%s' in vm by ssh" % cmd)
+        transport = self.ssh_transport
+        if transport is not None:
+            return transport.run(cmd, timeout)
+        ssh_session = self.create_ssh_session()
+        try:
+            return ssh_session.cmd_status_output(cmd, timeout=timeout)
+        finally:
+            ssh_session.close()
+
     def scp_file(self, local_file, dest_file):
         """
         Send file to guest
@@ -290,17 +523,46 @@ class BaseVM:
             local_file: local file in host
             dest_file: dest file in guest
         """
+        transport = self.ssh_transport
+        if transport is not None:
+            transport.scp(local_file, dest_file, timeout=60.0)
+            return
         remote.scp_to_remote(self.guest_ip, 22, CONFIG.vm_username,
                              CONFIG.vm_password, local_file, dest_file,
-                             output_func=self.serial_log.debug, timeout=60.0)
+                             output_func=self.console_output, timeout=60.0)
 
     def launch(self):
         """Start a vm and establish a qmp connection"""
+        self._launch_process()
+        if not self.error_test:
+            self._post_launch()
+
+    def launch_frozen(self):
+        """
+        Start a vm with its vcpus paused (-S) and establish a qmp connection.
+        The guest does not run until thaw(), so the vm can wait in a pool.
+        """
+        self.freeze = True
+        self._launch_process()
+        self._launched = True
+        self._connect_qmp()
+
+    def thaw(self):
+        """Resume a vm started by launch_frozen() and finish its launch"""
+        self.freeze = False
+        self._launch_time = time.time()
+        self.qmp_command("cont")
+        self._post_launch()
+
+    def _launch_process(self):
+        """Start the vm process and track it"""
         del self._args
         self._args = list(self.init_args)
         self._pre_launch()
         self.full_command = (self.wrapper + [self.bin_path] + self._base_args() + self._args)
         LOG.debug(self.full_command)
+        self._launch_time = time.time()
+        self._shutdown_time = None
         if not self.env.keys():
             self._popen = subprocess.Popen(self.full_command,
                                            stdin=subprocess.PIPE,
@@ -320,70 +582,185 @@ class BaseVM:
 
         if self.daemon:
             self._popen.wait()
-            self.pid = self.get_pid()
+            self.process = self._track_daemon()
         else:
-            self.pid = self._popen.pid
-        if not self.error_test:
-            self._post_launch()
+            self.process = ProcessTracker(self._popen.pid)
+        self.pid = self.process.pid if self.process is not None else None
 
     def post_launch_serial(self):
         """Create a serial and wait for active"""
-        if self._console_set:
+        if self._ready_by_vsock and self.vsock_cid:
+            self._wait_guest_ready()
+            self._serial_pending = self._console_set
+        elif self._console_set:
             self.create_serial_control()
             self._wait_for_active()
         else:
-            time.sleep(2)
+            self._wait_monitor_create()
+
+    @property
+    def serial_session(self):
+        """Serial console session, logged in on first use if the guest told it is ready"""
+        if self._serial_pending:
+            self._serial_pending = False
+            self.create_serial_control()
+            self._wait_for_active()
+        return self._serial_session
+
+    @serial_session.setter
+    def serial_session(self, session):
+        self._serial_pending = False
+        self._serial_session = session
+
+    def _wait_guest_ready(self, timeout=LOGIN_WAIT_TIMEOUT):
+        """Wait for the guest notifier to connect over vsock"""
+        deadline = time.time() + timeout
+        while self.is_running():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            if GUEST_READY.wait(self.vsock_cid[0], self._launch_time, min(remaining, 1)):
+                self._record_lifecycle("guest_ready", self._launch_time)
+                return
+        raise LoginTimeoutError("guest %s is not ready in %ss" % (self._name, timeout))
+
+    @property
+    def qmp_address(self):
+        """Address of the qmp monitor, a unix socket path or (host, port)"""
+        if isinstance(self.mon_sock, tuple) or self._vm_monitor is None:
+            return self.mon_sock
+        return self._vm_monitor
 
     def post_launch_qmp(self):
-        """Set a QMPMonitorProtocol"""
-        if isinstance(self.mon_sock, tuple):
-            self.qmp_monitor_protocol(self.mon_sock)
+        """
+        Set a QMPMonitorProtocol, or use a qmp client instead of it:
+        a QMPHandle if qmp_hub is set, an AsyncQMPClient if qmp_async is set.
+        """
+        if self.qmp_hub is not None:
+            self._qmp_client = self.qmp_hub.register(self._name, self.qmp_address)
+            self._qmp_client.wait_ready()
+        elif self.qmp_async:
+            self._qmp_client = AsyncQMPClient(self.qmp_address, name=self._name)
+            self._qmp_client.connect_sync()
         else:
-            self.qmp_monitor_protocol(self._vm_monitor)
-        if self.__qmp:
-            self.connect()
+            self.qmp_monitor_protocol(self.qmp_address)
+            if self.__qmp:
+                self.connect()
+        self._qmp_connected = True
 
     def post_launch_vnet(self):
         """Nothing is needed at present"""
         pass
 
+    def _connect_qmp(self):
+        """Wait for the monitor and connect to it, the guest is not needed"""
+        self._wait_monitor_create()
+        self.post_launch_qmp()
+
+    def _post_launch_network(self):
+        self.post_launch_vnet()
+        self.config_network(self.ipalloc_type)
+
+    def _post_launch_ssh(self):
+        if self.ssh_session:
+            self.ssh_session.close()
+        self.ssh_session = self.create_ssh_session()
+
+    def _post_launch_stages(self):
+        """
+        Stages of the bring-up, {name: (function, stages it needs)}.
+        Qmp is connected while the guest boots to its serial login.
+        """
+        stages = {"serial": (self.post_launch_serial, ())}
+        if not self._qmp_connected:
+            stages["qmp"] = (self._connect_qmp, ())
+        if self.vnetnums > 0:
+            stages["network"] = (self._post_launch_network, ("serial",))
+            stages["ssh"] = (self._post_launch_ssh, ("network",))
+        return stages
+
     def _post_launch(self):
         self._launched = True
         if self.incoming:
             return
 
-        self.post_launch_serial()
-        self.post_launch_qmp()
-        if self.vnetnums > 0:
-            self.post_launch_vnet()
-            self.config_network(self.ipalloc_type)
-            if self.ssh_session:
-                self.ssh_session.close()
-            self.ssh_session = self.create_ssh_session()
-
-    @retry(wait_fixed=200, stop_max_attempt_number=50)
-    def _wait_console_create(self):
-        os.stat(self._console_address)
-
-    @retry(wait_fixed=1000, stop_max_attempt_number=30)
-    def wait_pid_exit(self):
+        begin = time.time()
+        times = dict()
+        self.bringup = dict()
+        try:
+            utils_common.run_stages(self._post_launch_stages(), times)
+        finally:
+            for stage, (start, end) in times.items():
+                self.bringup[stage] = {"start": start - begin, "duration": end - start}
+                VM_LIFECYCLE.record(self._name, "stage_" + stage, end - start)
+            LOG.debug("vm %s bring-up stages: %s" % (self._name, self.bringup))
+
+    def _record_lifecycle(self, stage, since):
+        """Record the seconds from since to now as the time of a lifecycle stage"""
+        if since is None:
+            return
+        elapsed = time.time() - since
+        self.lifecycle[stage] = elapsed
+        VM_LIFECYCLE.record(self._name, stage, elapsed)
+        LOG.debug("vm %s %s in %.3fs" % (self._name, stage, elapsed))
+
+    def _wait_console_create(self, timeout=CONSOLE_CREATE_TIMEOUT):
+        """Wait for the console socket, raise VMLifeError if it is not created"""
+        if not wait_path_exists(self._console_address, timeout):
+            raise VMLifeError("console %s is not created in %ss" % (self._console_address, timeout))
+        self._record_lifecycle("console_ready", self._launch_time)
+
+    def _wait_monitor_create(self, timeout=CONSOLE_CREATE_TIMEOUT):
+        """Wait for the unix monitor socket, there is nothing to watch for a tcp one"""
+        if not self.__qmp_set or isinstance(self.qmp_address, tuple):
+            time.sleep(2)
+            return
+        if not wait_path_exists(self.qmp_address, timeout):
+            raise VMLifeError("monitor %s is not created in %ss" % (self.qmp_address, timeout))
+        self._record_lifecycle("monitor_ready", self._launch_time)
+
+    def wait_pid_exit(self, timeout=PID_EXIT_TIMEOUT):
         """Wait vm pid when vm exit"""
         LOG.debug("===== check pid %s exit" % self.pid)
-        if os.path.exists("/proc/%d" % self.pid):
+        since = self._shutdown_time or time.time()
+        if self.process is not None:
+            exited = self.process.wait(timeout)
+        else:
+            exited = wait_process_exit(self.pid, timeout)
+        if not exited:
             raise VMLifeError("check pid exit failed, vm shutdown/destroy failed!")
+        self._record_lifecycle("exit", since)
 
     def _wait_for_active(self):
         """Wait vm for active"""
         self.serial_session = self.wait_for_serial_login()
+        self._record_lifecycle("login_ready", self._launch_time)
 
     def enable_ssh_login(self):
-        """enabling ssh login"""
+        """
+        Enable ssh login, authorize the session key and read the guest
+        host keys for the ssh master
+        """
         self.serial_session.run_func("cmd_output", 'systemctl stop NetworkManager')
         self.serial_session.run_func("cmd_output", 'systemctl stop firewalld')
         # enable ssh login
-        _cmd = "sed -i \"s/^PermitRootLogin.*/PermitRootLogin yes/g\" /etc/ssh/sshd_config"
-        self.serial_cmd(_cmd)
-        self.serial_cmd("systemctl restart sshd")
+        cmds = ["sed -i \"s/^PermitRootLogin.*/PermitRootLogin yes/g\" /etc/ssh/sshd_config",
+                "systemctl restart sshd"]
+        if CONFIG.ssh_control_master:
+            _, pubkey = session_key(CONFIG.test_session_root_path)
+            cmds += ["mkdir -p -m 700 ~/.ssh",
+                     "grep -qxF '%s' ~/.ssh/authorized_keys 2>/dev/null || "
+                     "echo '%s' >> ~/.ssh/authorized_keys" % (pubkey, pubkey),
+                     "chmod 600 ~/.ssh/authorized_keys",
+                     "cat /etc/ssh/ssh_host_*_key.pub"]
+        results = self.serial_batch(cmds)
+        for _cmd, (status, output) in zip(cmds, results):
+            if status != 0:
+                LOG.debug("'%s' failed in vm: %s" % (_cmd, output))
+        if CONFIG.ssh_control_master and results[3][0] == 0:
+            status, output = results[-1]
+            self._ssh_host_keys = [" ".join(line.split()[:2]) for line in output.splitlines()
+                                   if status == 0 and len(line.split()) >= 2]
 
     def add_ip_dhcp(self, index):
         """Add client IP through DHCP"""
@@ -397,17 +774,16 @@ class BaseVM:
 
     def add_ip_static(self, index):
         """Add client IP through static"""
-        _cmd = "ip addr show %s | grep inet | awk '{print $2}' | xargs -i -n1 ip addr del {} dev %s" % (
-                self.interfaces[index], self.interfaces[index])
-        self.serial_console.cmd_output(_cmd)
-        _cmd = "ip link set %s up" % self.interfaces[index]
-        self.serial_console.cmd_output(_cmd)
         ipinfo = NETWORKS.alloc_ipaddr(self.taps[index]["name"], index=index)
-        _cmd = "ip addr add %s/%s dev %s" % (ipinfo["ipaddr"],
-                                             ipinfo["netmasklen"], self.interfaces[index])
-        self.serial_console.cmd_output(_cmd)
-        _cmd = "ip route add default gw %s" % ipinfo["gateway"]
-        self.serial_console.cmd_output(_cmd)
+        cmds = ["ip addr show %s | grep inet | awk '{print $2}' | xargs -i -n1 ip addr del {} dev %s" % (
+                    self.interfaces[index], self.interfaces[index]),
+                "ip link set %s up" % self.interfaces[index],
+                "ip addr add %s/%s dev %s" % (ipinfo["ipaddr"],
+                                              ipinfo["netmasklen"], self.interfaces[index]),
+                "ip route add default gw %s" % ipinfo["gateway"]]
+        for _cmd, (status, output) in zip(cmds, self.serial_batch(cmds)):
+            if status != 0:
+                LOG.debug("'%s' failed in vm: %s" % (_cmd, output))
         self.guest_ips.append(ipinfo["ipaddr"])
         if index == 0:
             self.guest_ip = ipinfo["ipaddr"]
@@ -434,8 +810,71 @@ class BaseVM:
             LOG.warning("got exception %s, try to destroy vm" % err)
             self.destroy()
 
-        for tap in self.taps:
-            NETWORKS.clean_tap(tap["name"])
+        self.release_host_resources()
+
+    def terminate(self, quit_timeout=QUIT_TIMEOUT, term_timeout=TERM_TIMEOUT, clean_taps=True):
+        """
+        Stop the vm in a bounded time: send quit, then SIGTERM, then SIGKILL,
+        each one given its timeout to make the process exit.
+
+        Args:
+            clean_taps: remove the taps of the vm, a fleet removes them in bulk
+
+        Returns:
+            "quit", "term" or "kill", what stopped the vm. None if it was
+            not launched.
+
+        Raises:
+            VMLifeError: the process is still running after SIGKILL.
+        """
+        if not self._launched:
+            return None
+
+        self._shutdown_time = time.time()
+        self._pre_shutdown()
+        stopped_by = "quit"
+        quit_deadline = time.time() + quit_timeout
+        if self.is_running() and (self.__qmp or self._qmp_client):
+            try:
+                # a hung monitor must not delay the signals
+                self.cmd('quit', timeout=quit_timeout)
+            # signals stop the vm no matter what exception occurs
+            # pylint: disable=broad-except
+            except Exception as err:
+                LOG.debug("vm %s quit failed: %s" % (self._name, err))
+        if not self._wait_process(max(0, quit_deadline - time.time())):
+            stopped_by = "term"
+            self.send_signal(15)
+            if not self._wait_process(term_timeout):
+                stopped_by = "kill"
+                self.send_signal(9)
+                if not self._wait_process(PID_EXIT_TIMEOUT):
+                    raise VMLifeError("vm %s is still running after SIGKILL" % self._name)
+        self._record_lifecycle("exit", self._shutdown_time)
+        self._post_shutdown()
+        self._launched = False
+        self.release_host_resources(clean_taps)
+        return stopped_by
+
+    def _wait_process(self, timeout):
+        """Wait for the vm process to exit, returns False on timeout"""
+        if not self.daemon:
+            try:
+                self._popen.wait(timeout)
+            except subprocess.TimeoutExpired:
+                return False
+            return True
+        if self.process is not None:
+            return self.process.wait(timeout)
+        return wait_process_exit(self.pid, timeout)
+
+    def release_host_resources(self, clean_taps=True):
+        """Give back the taps and vsock cids of the vm"""
+        if clean_taps:
+            NETWORKS.clean_taps([tap["name"] for tap in self.taps])
+        for cid in self.vsock_cid:
+            VSOCKS.release_contextid(cid)
+        self.vsock_cid = list()
 
     def _machine_args(self, args):
         if self._machine == "microvm":
@@ -528,11 +967,16 @@ class BaseVM:
 
     def is_running(self):
         """Returns true if the VM is running."""
+        if self.process is not None:
+            return self.process.is_running()
         return self._popen is not None and self._popen.poll() is None
 
     def exitcode(self):
-        """Returns the exit code if possible, or None."""
-        if self._popen is None:
+        """
+        Returns the exit code if possible, or None.
+        A daemonized vm is reaped by init, its exit code is unknown.
+        """
+        if self._popen is None or self.daemon:
             return None
         return self._popen.poll()
 
@@ -574,12 +1018,17 @@ class BaseVM:
         if self.configdict is None:
             return
 
+        configdict = self.configdict
+        if self._ready_by_vsock:
+            # tell the guest notifier where to connect
+            configdict = copy.deepcopy(configdict)
+            configdict["boot-source"]["boot_args"] += " %s=%d" % (READY_PORT_PARAM,
+                                                                   GUEST_READY.port)
         if self.with_json:
             with open(self.config_json, "w") as fpdest:
-                json.dump(self.configdict, fpdest)
+                json.dump(configdict, fpdest)
             self.add_args('-config', self.config_json)
         else:
-            configdict = self.configdict
             if "boot-source" in configdict:
                 if "kernel_image_path" in configdict["boot-source"]:
                     self.add_args('-kernel', configdict["boot-source"]["kernel_image_path"])
@@ -676,7 +1125,7 @@ class BaseVM:
         LOG.debug("Attempting to log into '%s' via serial console "
                   "(timeout %ds)", self._name, timeout)
         end_time = time.time() + timeout
-        while time.time() < end_time and (self.daemon or self.is_running()):
+        while time.time() < end_time and self.is_running():
             try:
                 session = self.serial_login(internal_timeout,
                                             username,
@@ -721,6 +1170,63 @@ class BaseVM:
         LOG.debug("Attempting to run cmd '%s' in vm" % cmd)
         return self.serial_session.run_func("cmd_status_output", cmd, internal_timeout=SERIAL_TIMEOUT)
 
+    @property
+    def guest_agent(self):
+        """GuestAgent of the vm, connected on first use"""
+        if self._guest_agent is None:
+            if not self.vsock_cid:
+                raise GuestAgentError("vm %s has no vsock device for the agent" % self._name)
+            agent = GuestAgent((self.vsock_cid[0], CONFIG.guest_agent_port), name=self._name)
+            agent.connect(LOGIN_WAIT_TIMEOUT)
+            self._guest_agent = agent
+        return self._guest_agent
+
+    def agent_cmd(self, cmd, timeout=None):
+        """
+        Run a cmd in vm via the guest agent, like serial_cmd
+
+        Args:
+            cmd: cmd run in vm
+            timeout: seconds before the cmd is killed
+
+        Returns:
+            A tuple (status, output) where status is the exit status
+            and output is the stdout then stderr of cmd
+        """
+        LOG.debug("Attempting to run cmd '%s' in vm by agent" % cmd)
+        return self.guest_agent.cmd_status_output(cmd, timeout)
+
+    def serial_batch(self, cmds, timeout=BATCH_TIMEOUT):
+        """
+        Run cmds in vm via serial console session, in one round trip
+
+        Args:
+            cmds: list of cmds run in vm, one line each
+            timeout: seconds to wait for all the cmds
+
+        Returns:
+            A list of (status, output) of each cmd, in order
+        """
+        LOG.debug("Attempting to run cmds %s in vm" % cmds)
+        return utils_batch.run_batch(
+            lambda script: self.serial_session.run_func("cmd_output", script, timeout=timeout,
+                                                        internal_timeout=SERIAL_TIMEOUT), cmds)
+
+    def ssh_batch(self, cmds, timeout=BATCH_TIMEOUT):
+        """
+        Run cmds in vm via ssh session, in one round trip
+
+        Args:
+            cmds: list of cmds run in vm, one line each
+            timeout: seconds to wait for all the cmds
+
+        Returns:
+            A list of (status, output) of each cmd, in order
+        """
+        LOG.debug("Attempting to run cmds %s in vm by ssh" % cmds)
+        return utils_batch.run_batch(
+            lambda script: self.ssh_session.cmd_output(script, timeout=timeout), cmds)
+
     def get_guest_hwinfo(self):
         """
         Get guest hwinfo via ssh_session
@@ -737,15 +1243,19 @@ class BaseVM:
         """
         retdict = {"cpu": {}, "mem": {}, "virtio": {}}
         if self.ssh_session is not None:
-            vcpu_count = int(self.ssh_session.cmd_output("grep -c processor /proc/cpuinfo"))
-            memsize = int(self.ssh_session.cmd_output("grep MemTotal /proc/meminfo | awk '{print $2}'"))
+            # ignore virtio_rng device now
+            devs = ["virtio_blk", "virtio_net", "virtio_console"]
+            cmds = ["grep -c processor /proc/cpuinfo",
+                    "grep MemTotal /proc/meminfo | awk '{print $2}'"]
+            cmds.extend("test -d %s && ls %s | grep virtio" % (devdir, devdir) for devdir in
+                        ["/sys/bus/virtio/drivers/%s" % dev for dev in devs])
+            outputs = [output for _, output in self.ssh_batch(cmds)]
+            vcpu_count = int(outputs[0])
+            memsize = int(outputs[1])
             retdict["cpu"] = {"vcpu_count": vcpu_count, "maxvcpu": vcpu_count}
             retdict["mem"] = {"memsize": memsize, "maxmem": memsize}
-            # ignore virtio_rng device now
-            for dev in ["virtio_blk", "virtio_net", "virtio_console"]:
-                devdir = "/sys/bus/virtio/drivers/%s" % dev
-                _cmd = "test -d %s && ls %s | grep virtio" % (devdir, devdir)
-                virtiodevs = self.ssh_session.cmd_output(_cmd).strip().split()
+            for dev, output in zip(devs, outputs[2:]):
+                virtiodevs = output.strip().split()
                 for virtiodev in virtiodevs:
                     _tempdev = {"name": virtiodev}
                     if dev not in retdict["virtio"]:
@@ -805,18 +1315,19 @@ class BaseVM:
         """Hotplug a disk to vm"""
         LOG.debug("hotplug disk %s to vm" % diskpath)
         devid = "drive-%d" % index
-        resp = self.qmp_command("blockdev-add", node_name="drive-%d" % index,
-                                file={"driver": "file", "filename": diskpath})
+        resps = self.qmp_pipeline([
+            ("blockdev-add", {"node_name": devid,
+                              "file": {"driver": "file", "filename": diskpath}}),
+            ("device_add", {"id": devid, "driver": "virtio-blk-mmio", "addr": str(hex(index))})])
 
-        LOG.debug("blockdev-add return %s" % resp)
+        LOG.debug("blockdev-add return %s" % resps[0])
         if check:
-            assert "error" not in resp
-        resp = self.device_add(id=devid, driver="virtio-blk-mmio", addr=str(hex(index)))
-        LOG.debug("device_add return %s" % resp)
+            assert "error" not in resps[0]
+        LOG.debug("device_add return %s" % resps[1])
         if check:
-            assert "error" not in resp
+            assert "error" not in resps[1]
 
-        return resp
+        return resps[1]
 
     def del_disk(self, index=1, check=True):
         """Unplug a disk"""
@@ -832,11 +1343,13 @@ class BaseVM:
         LOG.debug("hotplug tapinfo is %s" % tapinfo)
         self.taps.append(tapinfo)
         tapname = tapinfo["name"]
-        resp = self.netdev_add(id=tapname, ifname=tapname)
+        resps = self.qmp_pipeline([
+            ("netdev_add", {"id": tapname, "ifname": tapname}),
+            ("device_add", {"id": tapname, "driver": "virtio-net-mmio", "addr": "0x1"})])
         if check:
-            assert "error" not in resp
-        LOG.debug("netdev_add return %s" % resp)
-        resp = self.device_add(id=tapname, driver="virtio-net-mmio", addr="0x1")
+            assert "error" not in resps[0]
+        LOG.debug("netdev_add return %s" % resps[0])
+        resp = resps[1]
         if check:
             assert "error" not in resp
         if config_addr:
@@ -882,9 +1395,14 @@ class BaseVM:
 
     def qmp_monitor_protocol(self, address):
         """Set QMPMonitorProtocol"""
-        self.__qmp = {'events': [],
+        self.__qmp = {'events': QMPEventDispatcher(),
+                      'replies': deque(),
+                      # replies of commands given up at their timeout, dropped
+                      'abandoned': 0,
+                      'reader': QMPStreamBuffer(),
                       'address': address,
-                      'sock': socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                      'sock': socket.socket(socket.AF_INET if isinstance(address, tuple)
+                                            else socket.AF_UNIX, socket.SOCK_STREAM)
                       }
 
     def enable_qmp_set(self):
@@ -902,30 +1420,109 @@ class BaseVM:
         self.__qmp = None
         self.__qmp_set = False
 
-    def __sock_recv(self, only_event=False):
-        """Get data from socket"""
-        recv = self.__qmp['sock'].recv(1024).decode('utf-8').split('\n')
-        if recv and not recv[-1]:
-            recv.pop()
-        resp = None
-        while recv:
-            resp = json.loads(recv.pop(0))
-            if 'event' not in resp:
-                return resp
-            self.logger.debug("-> %s", resp)
-            self.__qmp['events'].append(resp)
-            if only_event:
-                return resp
-        return resp
+    def __route_messages(self):
+        """Move framed messages to the event dispatcher or the reply queue"""
+        reader = self.__qmp['reader']
+        while reader.messages:
+            resp = reader.pop()
+            if 'event' in resp:
+                self.logger.debug("-> %s", resp)
+                self.__qmp['events'].put(resp)
+            elif self.__qmp['abandoned']:
+                self.__qmp['abandoned'] -= 1
+                self.logger.debug("drop late reply %s", resp)
+            else:
+                self.__qmp['replies'].append(resp)
+
+    def __sock_read(self):
+        """Read once from socket, return False if the monitor closed it"""
+        data = self.__qmp['sock'].recv(QMP_RECV_SIZE)
+        if not data:
+            return False
+        try:
+            self.__qmp['reader'].feed(data)
+        finally:
+            # the good messages are routed even if a line is not json
+            self.__route_messages()
+        return True
+
+    def __sock_recv(self, timeout=None):
+        """
+        Get data from socket until a command reply is available.
+
+        Every complete message is kept: events read meanwhile go to the
+        event dispatcher and replies are queued in arrival order.
+
+        Args:
+            timeout: seconds to wait for the reply, None means forever
+
+        Returns:
+            The reply, or None if the monitor closed the connection.
+
+        Raises:
+            QMPTimeoutError: no reply in timeout seconds
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        sock = self.__qmp['sock']
+        try:
+            while not self.__qmp['replies']:
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise socket.timeout()
+                    sock.settimeout(remaining)
+                if not self.__sock_read():
+                    return None
+        except socket.timeout:
+            raise QMPTimeoutError("Timeout waiting for qmp reply")
+        finally:
+            if deadline is not None and sock.fileno() != -1:
+                sock.settimeout(None)
+        return self.__qmp['replies'].popleft()
+
+    def __pump_events(self, timeout):
+        """Read from socket until a new event arrives, the dispatcher pump"""
+        events = self.__qmp['events']
+        received = events.received
+        sock = self.__qmp['sock']
+        sock.settimeout(timeout)
+        try:
+            while events.received == received:
+                if not self.__sock_read():
+                    raise QMPConnectError("Error while receiving from socket")
+        except socket.timeout:
+            raise QMPTimeoutError("Timeout waiting for event")
+        except OSError:
+            raise QMPConnectError("Error while receiving from socket")
+        finally:
+            if sock.fileno() != -1:
+                sock.settimeout(None)
+
+    def __event_pump(self):
+        """Pump for the event dispatcher, None if a reader task feeds it"""
+        if self.qmp_hub is not None and self._qmp_client is not None:
+            return self._qmp_client.event_pump()
+        if self._qmp_client is not None:
+            return None
+        return self.__pump_events
+
+    @property
+    def qmp_events(self):
+        """QMPEventDispatcher of the current qmp connection"""
+        if self._qmp_client is not None:
+            return self._qmp_client.events
+        return self.__qmp['events']
 
     def get_events(self, wait=False, only_event=False):
         """
         Get new events or event from socket.
-        Push them to __qmp['events']
+        Events are kept in the qmp_events dispatcher.
 
         Args:
             wait (bool): block until an event is available.
             wait (float): If wait is a float, treat it as a timeout value.
+            only_event: pop and return the oldest event, else return the
+            list of pending events (an event that is waited is popped).
 
         Raises:
             QMPTimeoutError: If a timeout float is provided and the timeout
@@ -933,27 +1530,18 @@ class BaseVM:
             QMPConnectError: If wait is True but no events could be retrieved
             or if some other error occurred.
         """
-
-        # Wait for new events, if needed.
+        events = self.qmp_events
         # if wait is 0.0, this means "no wait" and is also implicitly false.
-        if not self.__qmp['events'] and wait:
-            if isinstance(wait, float):
-                self.__qmp['sock'].settimeout(wait)
-            try:
-                ret = self.__sock_recv(only_event=True)
-            except socket.timeout:
-                raise QMPTimeoutError("Timeout waiting for event")
-            except:
-                raise QMPConnectError("Error while receiving from socket")
-            if ret is None:
-                raise QMPConnectError("Error while receiving from socket")
-            self.__qmp['sock'].settimeout(None)
-
-        if self.__qmp['events']:
+        if wait and (only_event or not len(events)):
+            timeout = wait if isinstance(wait, float) else None
+            event = events.wait(timeout=timeout, pump=self.__event_pump())
             if only_event:
-                return self.__qmp['events'].pop(0)
-            return self.__qmp['events']
-        return None
+                return event
+            return [event] + events.snapshot()
+
+        if only_event:
+            return events.pop()
+        return events.snapshot() or None
 
     def connect(self):
         """
@@ -979,17 +1567,12 @@ class BaseVM:
 
     def qmp_reconnect(self):
         """Reconnect qmp when sock is dead"""
-        if self.__qmp:
+        if self.__qmp or self._qmp_client:
             self.close_sock()
 
-        if isinstance(self.mon_sock, tuple):
-            self.qmp_monitor_protocol(self.mon_sock)
-        else:
-            self.qmp_monitor_protocol(self._vm_monitor)
-        if self.__qmp:
-            self.connect()
+        self.post_launch_qmp()
 
-    def cmd(self, name, args=None, cmd_id=None):
+    def cmd(self, name, args=None, cmd_id=None, timeout=None):
         """
         Build a QMP command and send it to the monitor.
 
@@ -997,7 +1580,33 @@ class BaseVM:
             name: command name
             args: command arguments
             cmd_id: command id
+            timeout: seconds to wait for the reply, None means forever.
+            The reply of a command given up is dropped when it arrives.
+
+        Raises:
+            QMPTimeoutError: no reply in timeout seconds
         """
+        if self._qmp_client is not None:
+            try:
+                return self._qmp_client.command(name, args, cmd_id, timeout=timeout)
+            except QMPConnectError:
+                return None
+
+        sent = time.time()
+        if not self.__sock_send(name, args, cmd_id):
+            return None
+        try:
+            resp = self.__sock_recv(timeout)
+        except QMPTimeoutError:
+            self.__qmp['abandoned'] += 1
+            QMP_LATENCY.record(self._name, name, time.time() - sent, True)
+            raise
+        QMP_LATENCY.record(self._name, name, time.time() - sent, resp is None or "error" in resp)
+        self.logger.debug("-> %s", resp)
+        return resp
+
+    def __sock_send(self, name, args=None, cmd_id=None):
+        """Send a QMP command, return False if the monitor is closed"""
         qmp_cmd = {'execute': name}
         if args:
             qmp_cmd.update({'arguments': args})
@@ -1009,11 +1618,9 @@ class BaseVM:
             self.__qmp['sock'].sendall(json.dumps(qmp_cmd).encode('utf-8'))
         except OSError as err:
             if err.errno == errno.EPIPE:
-                return None
+                return False
             raise err
-        resp = self.__sock_recv()
-        self.logger.debug("-> %s", resp)
-        return resp
+        return True
 
     def error_cmd(self, cmd, **kwds):
         """Build and send a QMP command to the monitor, report errors if any"""
@@ -1024,11 +1631,15 @@ class BaseVM:
 
     def clear_events(self):
         """Clear current list of pending events."""
-        self.__qmp['events'] = []
+        self.qmp_events.clear()
 
     def close_sock(self):
         """Close the socket and socket file."""
-        if self.__qmp['sock']:
+        self._qmp_connected = False
+        if self._qmp_client is not None:
+            self._qmp_client.close_sync()
+            self._qmp_client = None
+        if self.__qmp and self.__qmp['sock']:
             self.__qmp['sock'].close()
 
     def settimeout(self, timeout):
@@ -1039,21 +1650,66 @@ class BaseVM:
         """Check if the socket family is AF_UNIX."""
         return socket.AF_UNIX == self.__qmp['sock'].family
 
-    def qmp_command(self, cmd, **args):
-        """Run qmp command"""
+    @staticmethod
+    def _qmp_args(args):
+        """Replace '_' with '-' in the argument names"""
         qmp_dict = dict()
         for key, value in args.items():
             if key.find("_") != -1:
                 qmp_dict[key.replace('_', '-')] = value
             else:
                 qmp_dict[key] = value
+        return qmp_dict
 
-        rep = self.cmd(cmd, args=qmp_dict)
+    def qmp_command(self, cmd, cmd_id=None, **args):
+        """Run qmp command"""
+        rep = self.cmd(cmd, args=self._qmp_args(args), cmd_id=cmd_id)
         if rep is None:
             raise QMPError("Monitor was closed")
 
         return rep
 
+    def qmp_pipeline(self, commands):
+        """
+        Send several qmp commands back to back, then collect the replies.
+
+        Args:
+            commands: list of (cmd, args) tuples, args is a dict with the
+            same keys as the keyword arguments of qmp_command()
+
+        Returns:
+            List of replies in the order of commands.
+        """
+        commands = [(cmd, self._qmp_args(args or {})) for cmd, args in commands]
+        if self._qmp_client is not None:
+            try:
+                return self._qmp_client.pipeline(commands)
+            except QMPConnectError:
+                raise QMPError("Monitor was closed")
+
+        # Keep at most QMP_PIPELINE_WINDOW commands in flight, or both sides
+        # may block on full socket buffers with a long list of commands.
+        inflight = deque()
+        resps = list()
+        for cmd, args in commands:
+            if len(inflight) >= QMP_PIPELINE_WINDOW:
+                resps.append(self.__pipeline_recv(*inflight.popleft()))
+            inflight.append((cmd, time.time()))
+            if not self.__sock_send(cmd, args):
+                raise QMPError("Monitor was closed")
+        while inflight:
+            resps.append(self.__pipeline_recv(*inflight.popleft()))
+        return resps
+
+    def __pipeline_recv(self, cmd, sent):
+        """Get the reply of a pipelined command and record its latency"""
+        resp = self.__sock_recv()
+        QMP_LATENCY.record(self._name, cmd, time.time() - sent, resp is None or "error" in resp)
+        if resp is None:
+            raise QMPError("Monitor was closed")
+        self.logger.debug("-> %s", resp)
+        return resp
+
     def qmp_event_acquire(self, wait=False, return_list=False):
         """
         Get qmp event or events.
@@ -1063,31 +1719,22 @@ class BaseVM:
             events. Else, return a qmp event.
         """
         if not return_list:
-            if not self._events:
-                return self.get_events(wait=wait, only_event=True)
-            return self._events.pop(0)
-        event_list = self.get_events(wait=wait)
-        event_list.extend(self._events)
-        self._events.clear()
+            return self.get_events(wait=wait, only_event=True)
+        event_list = self.get_events(wait=wait) or list()
         self.clear_events()
         return event_list
 
     def event_wait(self, name, timeout=60.0, match=None):
         """
         Wait for an qmp event to match expection event.
+        Other events stay queued in qmp_events.
 
         Args:
             match: qmp match event, such as
             {'data':{'guest':False,'reason':'host-qmp-quit'}}
+
+        Raises:
+            QMPTimeoutError: no matching event within timeout seconds.
         """
-        while True:
-            event = self.get_events(wait=timeout, only_event=True)
-            try:
-                if event['event'] == name:
-                    for key in match:
-                        if key in event and match[key] == event[key]:
-                            return event
-            except TypeError:
-                if event['event'] == name:
-                    return event
-            self._events.append(event)
+        return self.qmp_events.wait(name, predicate=match_event(match),
+                                    timeout=timeout, pump=self.__event_pump())
@@ -0,0 +1,83 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""concurrent teardown of many vms"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from virt.basevm import QUIT_TIMEOUT
+from virt.basevm import TERM_TIMEOUT
+from utils.resources import NETWORKS
+from utils.utils_stats import sample_summary
+from utils.utils_logging import TestLog
+
+LOG = TestLog.get_global_log()
+TEARDOWN_WORKERS = 64
+
+
+def _terminate(testvm, quit_timeout, term_timeout):
+    begin = time.time()
+    try:
+        stopped_by = testvm.terminate(quit_timeout, term_timeout, clean_taps=False)
+    # the error is raised again once all vms are stopped
+    # pylint: disable=broad-except
+    except Exception as err:
+        LOG.warning("teardown of vm %s failed: %s, destroy it" % (testvm.name, err))
+        try:
+            testvm.destroy()
+        # pylint: disable=broad-except
+        except Exception:
+            pass
+        return "failed", time.time() - begin, err
+    return stopped_by, time.time() - begin, None
+
+
+def teardown(vms, quit_timeout=QUIT_TIMEOUT, term_timeout=TERM_TIMEOUT):
+    """
+    Stop vms concurrently, each one in a bounded time.
+
+    Every vm gets quit, then SIGTERM after quit_timeout, then SIGKILL
+    after term_timeout (see BaseVM.terminate). Their taps are removed
+    together once all vms are stopped.
+
+    Returns:
+        {"count": n, "quit": n, "term": n, "kill": n, "failed": n,
+        "seconds": summary of the teardown time of the vms}
+
+    Raises:
+        The error of the first vm that failed to stop.
+    """
+    report = {"count": len(vms), "quit": 0, "term": 0, "kill": 0, "failed": 0}
+    if not vms:
+        return report
+    begin = time.time()
+    with ThreadPoolExecutor(max_workers=min(len(vms), TEARDOWN_WORKERS),
+                            thread_name_prefix="teardown") as executor:
+        results = list(executor.map(lambda testvm: _terminate(testvm, quit_timeout, term_timeout),
+                                    vms))
+    NETWORKS.clean_taps([tap["name"] for testvm in vms for tap in testvm.taps])
+
+    errors = list()
+    latencies = list()
+    for stopped_by, seconds, err in results:
+        if stopped_by is None:
+            # not launched
+            continue
+        report[stopped_by] += 1
+        latencies.append(seconds)
+        if err is not None:
+            errors.append(err)
+    if latencies:
+        report["seconds"] = sample_summary(latencies)
+    LOG.debug("teardown of %d vms in %.3fs: %s" % (len(vms), time.time() - begin, report))
+    if errors:
+        raise errors[0]
+    return report
@@ -13,11 +13,16 @@
 
 import os
 import json
+import time
 import logging
 from virt.basevm import BaseVM
+from utils import utils_common
 from utils.config import CONFIG
+from utils.utils_disk import clone_image
 from monitor.mem_usage_supervise import MemorySupervisor
 
+# Tcp monitor port of worker 0, each xdist worker uses the next one
+MONITOR_TCP_PORT = 32542
 LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
 logging.basicConfig(filename="/var/log/pytest.log", level=logging.DEBUG, format=LOG_FORMAT)
 
@@ -33,7 +38,7 @@ class MicroVM(BaseVM):
         if "unix" in socktype:
             sock_path = os.path.join(root_path, self.name + "_" + self.vmid + ".sock")
         else:
-            sock_path = ("127.0.0.1", 32542)
+            sock_path = ("127.0.0.1", MONITOR_TCP_PORT + CONFIG.worker_index)
         self.vmconfig_template_file = vmconfig
         self.vm_json_file = None
         self.vmlinux = vmlinux
@@ -45,6 +50,8 @@ class MicroVM(BaseVM):
         self.memsize = memsize
         self.maxmem = maxmem
         self.inited = False
+        # writable copy-on-write clone of rootfs, created at first launch
+        self.rootfs_clone = None
         self.init_vmjson(root_path)
         self._args = list()
         super(MicroVM, self).__init__(root_path=root_path,
@@ -76,11 +83,40 @@ class MicroVM(BaseVM):
             self.memory_check.update_pid(0)
             self.memory_check.disable()
 
-    def kill(self):
+    def _stop_memory_check(self):
         if CONFIG.memory_usage_check:
             self.memory_check.set_state("stop")
-            self.memory_check.join()
+            if self.memory_check.is_alive():
+                self.memory_check.join()
+
+    def _pre_launch(self):
+        if self.rootfs_clone is not None and not os.path.exists(self.rootfs_clone):
+            begin = time.time()
+            how = clone_image(self.rootfs, self.rootfs_clone)
+            logging.debug("rootfs of %s cloned by %s in %.3fs", self.name, how, time.time() - begin)
+        super(MicroVM, self)._pre_launch()
+
+    def _remove_rootfs_clone(self):
+        if self.rootfs_clone is not None:
+            utils_common.remove_existing_file(self.rootfs_clone)
+
+    def kill(self):
+        self._stop_memory_check()
         super(MicroVM, self).kill()
+        self._remove_rootfs_clone()
+
+    def terminate(self, *args, **kwargs):
+        self._stop_memory_check()
+        stopped_by = super(MicroVM, self).terminate(*args, **kwargs)
+        self._remove_rootfs_clone()
+        return stopped_by
+
+    def _vm_rootfs(self, root_path, drive):
+        """Disk of the rootfs drive: a clone of rootfs per vm, unless it is read only"""
+        if not CONFIG.rootfs_cow or drive.get("read_only") or not self.rootfs:
+            return self.rootfs
+        self.rootfs_clone = os.path.join(root_path, self.name + "_" + self.vmid + "-rootfs.img")
+        return self.rootfs_clone
 
     def init_vmjson(self, root_path):
         """Generate a temp vm json file"""
@@ -92,7 +128,8 @@ class MicroVM(BaseVM):
                 if "initrd" in _vm_json["boot-source"]:
                     _vm_json["boot-source"]["initrd"] = self.initrd
             if "drive" in _vm_json:
-                _vm_json["drive"][0]["path_on_host"] = self.rootfs
+                _vm_json["drive"][0]["path_on_host"] = self._vm_rootfs(root_path,
+                                                                       _vm_json["drive"][0])
             if "machine-config" in _vm_json:
                 _vm_json["machine-config"]["vcpu_count"] = int(self.vcpus)
                 _vm_json["machine-config"]["mem_size"] = self.memsize
@@ -0,0 +1,182 @@
+# Copyright (c) 2021 Huawei Technologies Co.,Ltd. All rights reserved.
+#
+# StratoVirt is licensed under Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan
+# PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#         http:#license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY
+# KIND, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+# See the Mulan PSL v2 for more details.
+"""warm pool of pre-launched microvms"""
+
+import time
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from virt.microvm import MicroVM
+from virt import fleet
+from utils.config import CONFIG
+from utils.utils_logging import TestLog
+
+LOG = TestLog.get_global_log()
+# Configs a pool can launch. Without ROOTFS_COW all rootfs vms write the
+# same disk, so they wait frozen: the guest does not touch it before thaw().
+POOL_CONFIGS = {
+    "rootfs": {"vmconfig": CONFIG.get_default_microvm_vmconfig(), "freeze": not CONFIG.rootfs_cow},
+    "initrd": {"vmconfig": CONFIG.get_microvm_by_tag("initrd"), "freeze": False},
+}
+
+
+class _PoolEntry():
+    """A vm launching or launched in background"""
+
+    def __init__(self, testvm, frozen):
+        self.testvm = testvm
+        self.frozen = frozen
+        self.cost = 0.0
+        self.error = None
+        self.done = threading.Event()
+
+
+class WarmPool():
+    """
+    Keep microvms launched in background, so tests get them ready.
+
+    Each config keeps `size` vms launched or launching. acquire() takes
+    the oldest one, waits for it if it is still launching, and starts a
+    new one in its place. A vm is never given back: release() kills it.
+
+    Args:
+        root_path: session path of the vms
+        configs: names in POOL_CONFIGS
+        size: vms kept per config
+        freeze: launch all vms frozen, not only rootfs ones
+    """
+
+    def __init__(self, root_path, configs=None, size=None, freeze=None):
+        self.root_path = root_path
+        self.configs = list(CONFIG.warm_pool_configs if configs is None else configs)
+        self.size = CONFIG.warm_pool_size if size is None else size
+        self.freeze = CONFIG.warm_pool_freeze if freeze is None else freeze
+        self.lock = threading.Lock()
+        self.entries = {config: deque() for config in self.configs}
+        self.stats = {"hits": 0, "misses": 0, "failures": 0, "saved_seconds": 0.0,
+                      "wait_seconds": 0.0}
+        self.executor = None
+        self.closed = False
+
+    def start(self):
+        """Start launching vms of every config"""
+        if self.size <= 0:
+            return
+        self.executor = ThreadPoolExecutor(max_workers=self.size * len(self.configs),
+                                           thread_name_prefix="warm-pool")
+        for config in self.configs:
+            for _ in range(self.size):
+                self._refill(config)
+
+    def _new_vm(self, config):
+        return MicroVM(self.root_path, "microvm_pool_%s" % config, str(uuid.uuid4()),
+                       vmconfig=POOL_CONFIGS[config]["vmconfig"])
+
+    def _refill(self, config):
+        frozen = self.freeze or POOL_CONFIGS[config]["freeze"]
+        entry = _PoolEntry(self._new_vm(config), frozen)
+        with self.lock:
+            if self.closed:
+                return
+            self.entries[config].append(entry)
+        self.executor.submit(self._launch, entry)
+
+    @staticmethod
+    def _launch(entry):
+        begin = time.time()
+        try:
+            if entry.frozen:
+                entry.testvm.launch_frozen()
+            else:
+                entry.testvm.launch()
+        # the error is raised again by acquire()
+        # pylint: disable=broad-except
+        except Exception as err:
+            LOG.warning("warm pool launch of %s failed: %s" % (entry.testvm.name, err))
+            entry.error = err
+        entry.cost = time.time() - begin
+        entry.done.set()
+
+    def acquire(self, config):
+        """
+        Get a launched vm of config, logged in like after launch().
+
+        A vm is launched in the foreground if the pool is empty or its
+        vm failed to launch.
+        """
+        entry = None
+        with self.lock:
+            if self.entries.get(config):
+                entry = self.entries[config].popleft()
+        if entry is None:
+            return self._cold_launch(config)
+        self._refill(config)
+
+        begin = time.time()
+        hit = entry.done.is_set()
+        entry.done.wait()
+        waited = time.time() - begin
+        if entry.error is not None:
+            entry.testvm.kill()
+            with self.lock:
+                self.stats["failures"] += 1
+            return self._cold_launch(config)
+        if entry.frozen:
+            try:
+                entry.testvm.thaw()
+            # the vm is killed whatever failed, then the error is raised again
+            # pylint: disable=broad-except
+            except Exception:
+                entry.testvm.kill()
+                raise
+        with self.lock:
+            self.stats["hits" if hit else "misses"] += 1
+            self.stats["wait_seconds"] += waited
+            self.stats["saved_seconds"] += max(0.0, entry.cost - waited)
+        return entry.testvm
+
+    def _cold_launch(self, config):
+        testvm = self._new_vm(config)
+        with self.lock:
+            self.stats["misses"] += 1
+        try:
+            testvm.launch()
+        # the vm is killed whatever failed, then the error is raised again
+        # pylint: disable=broad-except
+        except Exception:
+            testvm.kill()
+            raise
+        return testvm
+
+    @staticmethod
+    def release(testvm):
+        """A used vm is dirty, kill it"""
+        testvm.kill()
+
+    def stop(self):
+        """Stop refilling and kill the vms left in the pool"""
+        with self.lock:
+            self.closed = True
+            entries = [entry for config in self.configs for entry in self.entries[config]]
+            for config in self.configs:
+                self.entries[config].clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        fleet.teardown([entry.testvm for entry in entries])
+
+    def report(self):
+        """Pool statistics: hits, misses, failures, saved and wait seconds"""
+        with self.lock:
+            report = dict(self.stats)
+        report.update({"size": self.size, "configs": self.configs, "freeze": self.freeze})
+        return report